@@ -1,10 +1,11 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 from enum import Enum
 
 class RequestType(str, Enum):
     metadata = "metadata"
     file = "file"
+    point = "point"
 
 class AudioSearchResult(BaseModel):
     """Model cho kết quả tìm kiếm audio"""
@@ -16,7 +17,14 @@ class AudioSearchResult(BaseModel):
     samples: int = Field(..., description="Tổng số mẫu âm thanh")
     duration: float = Field(..., description="Thời lượng file (giây)")
     subtype: str = Field(..., description="Định dạng phụ (ví dụ: PCM_16)")
+    category: Optional[str] = Field(None, description="Category (thư mục con của dataset, ví dụ: Bassoon)")
+    group_id: Optional[int] = Field(None, description="ID của point chính trong nhóm bản gần trùng lặp")
     similarity: float = Field(..., description="Điểm số tương đồng")
+    rerank_score: Optional[float] = Field(None, description="Điểm re-rank (None nếu không được re-rank)")
+    fingerprint_score: Optional[float] = Field(None, description="Tỉ lệ landmark của truy vấn khớp với file, chỉ có "
+                                                                 "khi khớp fingerprint landmark")
+    match_offset: Optional[float] = Field(None, description="Vị trí (giây) của đoạn truy vấn trong file, chỉ có khi "
+                                                            "khớp fingerprint landmark")
 
 class SearchResponse(BaseModel):
     """Model cho response API tìm kiếm"""
@@ -25,6 +33,19 @@ class SearchResponse(BaseModel):
     query_string: str = Field(..., description="Chuỗi query")
     temp_file_name: Optional[str] = Field(None, description="Tên file tạm của file truy vấn")
     results: List[AudioSearchResult] = Field(..., description="Danh sách kết quả tìm kiếm")
+    offset: int = Field(0, description="Vị trí bắt đầu của trang kết quả")
+    limit: Optional[int] = Field(None, description="Số kết quả tối đa của trang")
+    score_threshold: Optional[float] = Field(None, description="Ngưỡng độ tương đồng tối thiểu")
+    next_offset: Optional[int] = Field(None, description="Offset của trang tiếp theo, None nếu đã hết kết quả")
+    filters: Optional[Dict[str, Any]] = Field(None, description="Bộ lọc payload đã áp dụng (dùng lại khi phân trang)")
+    vector_version: Optional[str] = Field(None, description="Phiên bản vector đặc trưng đã truy vấn")
+    search_params: Optional[Dict[str, Any]] = Field(None, description="Tham số tìm kiếm HNSW đã áp dụng: hnsw_ef, exact "
+                                                                      "(dùng lại khi phân trang)")
+    rerank: bool = Field(False, description="Các kết quả đầu đã được re-rank bằng chuỗi đặc trưng theo frame")
+    match_type: Optional[str] = Field(None, description="Cách tìm ra kết quả: fingerprint (các file khớp chính xác "
+                                                        "landmark đứng đầu, tiếp theo là kết quả theo vector), vector "
+                                                        "(độ tương đồng vector) hoặc graph (đồ thị láng giềng tính "
+                                                        "trước)")
 
 class DatabaseInfo(BaseModel):
     """Model cho thông tin về database"""
@@ -1,24 +1,73 @@
+import asyncio
+import json
 import logging
 import os
 import time
 import uuid
-from cachetools import TTLCache
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request, Query
-from fastapi.responses import StreamingResponse
-from starlette.status import HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND, HTTP_500_INTERNAL_SERVER_ERROR
+from typing import List, Optional, Union
+
+import numpy as np
+import soundfile as sf
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request, Query, Response, Header, \
+    WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+from starlette.status import HTTP_400_BAD_REQUEST, HTTP_403_FORBIDDEN, HTTP_404_NOT_FOUND, \
+    HTTP_500_INTERNAL_SERVER_ERROR, WS_1008_POLICY_VIOLATION, WS_1011_INTERNAL_ERROR
 
 from app.api.models import SearchResponse, AudioSearchResult, ErrorResponse, RequestType
-from app.database.qdrant_manager import QdrantManager
-from app.feature_extractor import AudioFeatureExtractor
-from app.utils import audio_utils
-from app.utils.audio_utils import save_upload_file, file_iterator, create_temp_file_url
-from app.config import TEMP_DIR, AUDIO_DATASET_PATH, TEMP_FILE_TTL_MINUTES
+from app.database.qdrant_manager import QdrantManager, VectorVersionNotFound, build_search_filter, \
+    build_search_params, payload_to_result
+from app.database.search_batcher import SearchBatcher
+from app.feature_extractor import AudioFeatureExtractor, FEATURE_VERSIONS
+from app.knn_graph import KnnGraph
+from app.landmark_index import LandmarkIndex
+from app.reranker import Reranker
+from app.utils.audio_utils import save_upload_file, create_file_response, find_dataset_file
+from app.utils.logging_setup import query_id_var
+from app.utils.metrics import RESPONSE_SERIALIZATION_SECONDS, AUDIO_DECODE_SECONDS, record_cache
+from app.utils.peaks_utils import get_peaks_path, is_peaks_fresh, write_peaks
+from app.utils.preview_utils import ensure_preview
+from app.utils.profiling import is_admin_token, profile_store, run_in_threadpool
+from app.utils.result_cache import create_result_cache
+from app.utils.sequence_utils import get_sequence_path, load_sequence
+from app.utils.temp_registry import temp_registry
+from app.warmup import register_warmup_hook
+from app.config import TEMP_DIR, AUDIO_DATASET_PATH, TEMP_FILE_TTL_MINUTES, STREAM_CACHE_MAX_AGE, TOP_K, \
+    SEARCH_MAX_LIMIT, SEARCH_VECTOR_VERSION, RERANK_ENABLED, RERANK_CANDIDATES, LANDMARK_ENABLED, \
+    LANDMARK_MAX_RESULTS, KNN_K, \
+    KNN_VECTOR_VERSION, SAMPLE_RATE, PROGRESSIVE_SEARCH_INTERVAL, PROGRESSIVE_SEARCH_MAX_SECONDS, SEARCH_HNSW_EF, \
+    SEARCH_EXACT
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
+# Log của /stream rất nhiều nên dùng logger riêng để có thể lấy mẫu (LOG_SAMPLING)
+stream_logger = logging.getLogger(f"{__name__}.stream")
+
+# Khởi tạo cache với TTL khớp với TEMP_FILE_TTL_MINUTES (chuyển phút sang giây),
+# dùng SQLite khi chạy nhiều worker để mọi worker đều đọc được kết quả.
+# Mọi thao tác với cache đều chạy trong thread pool vì SQLite có thể chặn khi chờ khóa
+cache = create_result_cache(ttl_seconds=TEMP_FILE_TTL_MINUTES * 60)
+# File tạm của một truy vấn được giữ chừng nào kết quả của truy vấn đó còn trong cache
+# (temp_registry chỉ gọi hàm này trong thread pool)
+temp_registry.is_query_alive = lambda query_id: query_id in cache
+
+def build_results(search_results: List[dict]) -> List[AudioSearchResult]:
+    """ Chuyển danh sách kết quả từ QdrantManager thành AudioSearchResult """
+    return [AudioSearchResult(**item) for item in search_results]
+
+
+def serialize_response(response: SearchResponse) -> Response:
+    """ Serialize response tìm kiếm sang JSON (đo thời gian serialize) """
+    with RESPONSE_SERIALIZATION_SECONDS.time():
+        content = response.model_dump_json()
+    return Response(content=content, media_type="application/json")
+
+
+def get_next_offset(offset: int, limit: int, result_count: int) -> Optional[int]:
+    """ Offset của trang tiếp theo, None nếu trang hiện tại chưa đầy (đã hết kết quả) """
+    return offset + result_count if result_count == limit else None
 
-# Khởi tạo cache với TTL khớp với TEMP_FILE_TTL_MINUTES (chuyển phút sang giây)
-cache = TTLCache(maxsize=1000, ttl=TEMP_FILE_TTL_MINUTES * 60)
 
 # Dependency để lấy các instances cần thiết
 def get_feature_extractor():
@@ -29,6 +78,131 @@ def get_qdrant_manager():
     return QdrantManager()
 
 
+def get_search_filters(
+        category: Optional[List[str]] = Query(None, description="Chỉ tìm trong các category (thư mục con của dataset)"),
+        min_duration: Optional[float] = Query(None, ge=0, description="Thời lượng tối thiểu (giây)"),
+        max_duration: Optional[float] = Query(None, ge=0, description="Thời lượng tối đa (giây)"),
+        sample_rate: Optional[int] = Query(None, ge=1, description="Tần số lấy mẫu (Hz)"),
+        channel: Optional[int] = Query(None, ge=1, description="Số kênh"),
+        collapse_duplicates: bool = Query(True, description="Chỉ trả về point chính của mỗi nhóm bản gần trùng lặp"),
+) -> Optional[dict]:
+    """ Dependency đọc các tham số lọc theo payload, None nếu không lọc """
+    filters = {
+        "category": category,
+        "min_duration": min_duration,
+        "max_duration": max_duration,
+        "sample_rate": sample_rate,
+        "channel": channel,
+        "collapse_duplicates": collapse_duplicates or None,
+    }
+    filters = {key: value for key, value in filters.items() if value is not None}
+    return filters or None
+
+
+def get_search_params(
+        hnsw_ef: Optional[int] = Query(SEARCH_HNSW_EF, ge=1, le=4096,
+                                       description="Số ứng viên duyệt trong HNSW (lớn hơn: recall cao hơn, chậm hơn)"),
+        exact: bool = Query(SEARCH_EXACT, description="Tìm kiếm chính xác trên mọi vector, bỏ qua chỉ mục HNSW"),
+) -> Optional[dict]:
+    """ Dependency đọc các tham số tìm kiếm HNSW, None nếu dùng mặc định của Qdrant """
+    params = {key: value for key, value in {"hnsw_ef": hnsw_ef, "exact": exact or None}.items() if value is not None}
+    return params or None
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """ Dependency kiểm tra header X-Admin-Token cho các endpoint quản trị """
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=HTTP_403_FORBIDDEN, detail="Không có quyền truy cập")
+
+
+# Batcher dùng chung cho mọi request để gom các truy vấn đồng thời
+search_batcher = None
+
+
+def get_search_batcher():
+    global search_batcher
+    if search_batcher is None:
+        search_batcher = SearchBatcher(QdrantManager())
+    return search_batcher
+
+
+def get_reranker():
+    return Reranker()
+
+
+# Index fingerprint landmark dùng chung, nạp trong warm-up và nạp lại khi file index thay đổi
+landmark_index = LandmarkIndex()
+register_warmup_hook("landmark_index", landmark_index.load)
+
+
+def get_landmark_index():
+    return landmark_index
+
+
+# Đồ thị láng giềng tính trước cho /related, nạp lại khi file đồ thị thay đổi
+knn_graph = KnnGraph()
+register_warmup_hook("knn_graph", knn_graph.load)
+
+
+def get_knn_graph():
+    return knn_graph
+
+
+def check_vector_version(vector_version: str):
+    """ Kiểm tra phiên bản vector của request có trong FEATURE_VERSIONS """
+    if vector_version not in FEATURE_VERSIONS:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail=f"Phiên bản vector không hợp lệ. Các phiên bản hỗ trợ: {', '.join(FEATURE_VERSIONS)}"
+        )
+
+
+def is_fingerprint_applicable(filters: Optional[dict]) -> bool:
+    """
+    Khớp fingerprint chỉ áp dụng khi không lọc theo payload
+    (gộp bản gần trùng lặp không ảnh hưởng: file khớp chính xác luôn được trả về)
+    """
+    return not any(key != "collapse_duplicates" for key in (filters or {}))
+
+
+async def search_page(batcher: SearchBatcher, query_vector: Union[np.ndarray, int], offset: int, limit: int,
+                      score_threshold: Optional[float], query_filter, vector_version: str,
+                      reranked: Optional[List[dict]] = None, rerank_window: int = 0,
+                      search_params=None, fingerprint: Optional[List[dict]] = None) -> List[dict]:
+    """
+    Lấy một trang kết quả tìm kiếm. Các file khớp fingerprint (đã cache, query_filter phải loại các point này)
+    đứng đầu danh sách, sau đó là kết quả theo vector. Với truy vấn có re-rank, rerank_window kết quả vector
+    đầu được lấy theo thứ tự đã re-rank (đã cache), phần sau lấy tiếp từ Qdrant theo thứ tự độ tương đồng vector
+    """
+    page = []
+    if fingerprint:
+        matched = fingerprint
+        if score_threshold is not None:
+            matched = [item for item in fingerprint if item["similarity"] >= score_threshold]
+        page = matched[offset:offset + limit]
+        if len(page) == limit:
+            return page
+        offset, limit = max(offset - len(matched), 0), limit - len(page)
+
+    if reranked is None:
+        return page + await batcher.search_similar(
+            query_vector, top_k=limit, offset=offset, score_threshold=score_threshold,
+            query_filter=query_filter, vector_version=vector_version, search_params=search_params
+        )
+    ranked = reranked
+    if score_threshold is not None:
+        ranked = [item for item in reranked if item["similarity"] >= score_threshold]
+    ranked_page = ranked[offset:offset + limit]
+    # Chỉ còn kết quả sau cửa sổ re-rank nếu cửa sổ đã đầy
+    if len(ranked_page) < limit and len(reranked) >= rerank_window:
+        ranked_page += await batcher.search_similar(
+            query_vector, top_k=limit - len(ranked_page), offset=rerank_window + max(offset - len(ranked), 0),
+            score_threshold=score_threshold, query_filter=query_filter, vector_version=vector_version,
+            search_params=search_params
+        )
+    return page + ranked_page
+
+
 @router.post(
     "/search",
     response_model=SearchResponse,
@@ -40,8 +214,20 @@ def get_qdrant_manager():
 async def search_similar_audio(
         file: UploadFile = File(...),
         request: Request = None,
+        limit: int = Query(TOP_K, ge=1, le=SEARCH_MAX_LIMIT, description="Số kết quả tối đa của trang"),
+        offset: int = Query(0, ge=0, description="Số kết quả đầu tiên bỏ qua"),
+        score_threshold: Optional[float] = Query(None, ge=-1.0, le=1.0, description="Ngưỡng độ tương đồng tối thiểu"),
+        filters: Optional[dict] = Depends(get_search_filters),
+        params: Optional[dict] = Depends(get_search_params),
+        vector_version: str = Query(SEARCH_VECTOR_VERSION, description="Phiên bản vector đặc trưng được truy vấn"),
+        rerank: bool = Query(RERANK_ENABLED, description="Re-rank các kết quả đầu bằng DTW trên chuỗi đặc trưng"),
+        fingerprint: bool = Query(LANDMARK_ENABLED,
+                                  description="Khớp fingerprint landmark (file hoặc đoạn trích của file trong dataset): "
+                                              "các file khớp đứng đầu, sau đó là kết quả theo vector"),
         feature_extractor: AudioFeatureExtractor = Depends(get_feature_extractor),
-        qdrant_manager: QdrantManager = Depends(get_qdrant_manager)
+        batcher: SearchBatcher = Depends(get_search_batcher),
+        reranker: Reranker = Depends(get_reranker),
+        landmarks: LandmarkIndex = Depends(get_landmark_index)
 ):
     """ Tìm kiếm các file audio tương tự với file được upload """
     try:
@@ -53,42 +239,88 @@ async def search_similar_audio(
                 status_code=HTTP_400_BAD_REQUEST,
                 detail=f"Định dạng file không hỗ trợ. Các định dạng hỗ trợ: {', '.join(valid_extensions)}"
             )
+        check_vector_version(vector_version)
 
         # Tạo query_id duy nhất
         query_id = str(uuid.uuid4())
+        query_id_var.set(query_id)
 
         # Lưu file upload vào thư mục tạm
         temp_file_path = await save_upload_file(file)
         temp_file_name = os.path.basename(temp_file_path)
+        peaks_path = get_peaks_path(temp_file_name, temp=True)
+        temp_registry.register(temp_file_path, query_id=query_id)
+        temp_registry.register(peaks_path, query_id=query_id)
+        sequence_path = get_sequence_path(temp_file_name, temp=True) if rerank else None
+        if sequence_path:
+            temp_registry.register(sequence_path, query_id=query_id)
 
-        # Trích xuất đặc trưng
+        # Giải mã một lần, dùng chung cho khớp fingerprint và trích xuất đặc trưng
         start_extraction_time = time.time()
-        features = feature_extractor.extract_features(temp_file_path)
-        query_vector = features["vector"]
+        with AUDIO_DECODE_SECONDS.time():
+            signal = await run_in_threadpool(feature_extractor.load_audio, temp_file_path)
+
+        # Trích xuất đặc trưng (kèm waveform peaks và chuỗi đặc trưng của file truy vấn)
+        def extract_features():
+            return feature_extractor.extract_features(temp_file_path, peaks_path=peaks_path,
+                                                      versions=[vector_version], sequence_path=sequence_path,
+                                                      signal=signal)
+
+        # Khớp fingerprint landmark chạy song song với trích xuất đặc trưng: vector truy vấn vẫn cần
+        # cho độ tương đồng của các file khớp và các kết quả theo vector đứng sau chúng
+        fingerprint_time = 0.0
+
+        def match_landmarks():
+            nonlocal fingerprint_time
+            start_fingerprint_time = time.time()
+            matches = landmarks.match(feature_extractor.compute_landmarks(signal[0]), limit=LANDMARK_MAX_RESULTS)
+            fingerprint_time = time.time() - start_fingerprint_time
+            return matches
+
+        matches = []
+        if fingerprint and is_fingerprint_applicable(filters):
+            matches, features = await asyncio.gather(run_in_threadpool(match_landmarks),
+                                                     run_in_threadpool(extract_features))
+        else:
+            features = await run_in_threadpool(extract_features)
+        query_vector = features["vectors"][vector_version]
         extraction_time = time.time() - start_extraction_time
-        logger.info(f"Thời gian trích xuất đặc trưng: {extraction_time:.4f} giây")
 
         # Tìm kiếm trong Qdrant
         start_query_time = time.time()
-        search_results = qdrant_manager.search_similar(query_vector)
-        query_time = time.time() - start_query_time
-        logger.info(f"Thời gian truy vấn Qdrant: {query_time:.4f} giây")
-
-        # Chuẩn bị kết quả
-        results = [
-            AudioSearchResult(
-                file_name=item["file_name"],
-                file_type=item["file_type"],
-                file_size_kb=item["file_size_kb"],
-                sample_rate=item["sample_rate"],
-                channel=item["channel"],
-                samples=item["samples"],
-                duration=item["duration"],
-                subtype=item["subtype"],
-                similarity=item["similarity"]
+        search_params = build_search_params(**params) if params else None
+        fingerprint_results = []
+        fingerprint_ids = None
+        if matches:
+            scored = await run_in_threadpool(batcher.qdrant_manager.score_points, query_vector,
+                                             [match["point_id"] for match in matches], vector_version)
+            # Point đã bị xóa sau lần tạo index gần nhất (hoặc chưa có vector phiên bản này) bị bỏ qua
+            matches = [match for match in matches if match["point_id"] in scored]
+            fingerprint_results = [
+                {**payload_to_result(*scored[match["point_id"]]),
+                 "fingerprint_score": match["score"], "match_offset": match["offset"]}
+                for match in matches
+            ]
+            fingerprint_ids = [match["point_id"] for match in matches] or None
+        # Các file khớp fingerprint đã đứng đầu danh sách nên được loại khỏi phần kết quả theo vector
+        query_filter = build_search_filter(**(filters or {}), exclude_ids=fingerprint_ids)
+        reranked = None
+        rerank_time = 0.0
+        if rerank:
+            # Giai đoạn hai: re-rank RERANK_CANDIDATES ứng viên đầu, thứ tự mới được cache cho các trang sau
+            candidates = await batcher.search_similar(
+                query_vector, top_k=RERANK_CANDIDATES, score_threshold=score_threshold,
+                query_filter=query_filter, vector_version=vector_version, search_params=search_params
             )
-            for item in search_results
-        ]
+            start_rerank_time = time.time()
+            reranked = await run_in_threadpool(reranker.rerank, load_sequence(sequence_path), candidates)
+            rerank_time = time.time() - start_rerank_time
+        search_results = await search_page(
+            batcher, query_vector, offset, limit, score_threshold, query_filter, vector_version,
+            reranked=reranked, rerank_window=RERANK_CANDIDATES, search_params=search_params,
+            fingerprint=fingerprint_results
+        )
+        query_time = time.time() - start_query_time - rerank_time
 
         # Tạo response
         response = SearchResponse(
@@ -96,15 +328,42 @@ async def search_similar_audio(
             request_type=RequestType.file,
             query_string="",
             temp_file_name=temp_file_name,
-            results=results
+            results=build_results(search_results),
+            offset=offset,
+            limit=limit,
+            score_threshold=score_threshold,
+            next_offset=get_next_offset(offset, limit, len(search_results)),
+            filters=filters,
+            vector_version=vector_version,
+            search_params=params,
+            rerank=rerank,
+            match_type="fingerprint" if fingerprint_results else "vector"
         )
 
-        # Lưu response và file_name vào cache
-        cache[query_id] = response
-        logger.info(f"Lưu kết quả tìm kiếm vào cache với query_id: {query_id}")
+        # Lưu response, vector truy vấn và các file khớp fingerprint vào cache
+        # để phân trang không cần trích xuất lại và mọi trang cùng một thứ tự
+        await run_in_threadpool(cache.set, query_id, {
+            "response": response.model_dump(mode="json"),
+            "query_vector": query_vector.tolist(),
+            "reranked": reranked,
+            "rerank_window": RERANK_CANDIDATES,
+            "fingerprint": fingerprint_results,
+            "fingerprint_ids": fingerprint_ids
+        })
+        logger.info(
+            f"Tìm kiếm xong: {len(search_results)} kết quả ({len(fingerprint_results)} file khớp fingerprint), "
+            f"lưu vào cache với query_id: {query_id}",
+            extra={"timings": {"fingerprint": round(fingerprint_time, 6), "extraction": round(extraction_time, 6),
+                               "search": round(query_time, 6), "rerank": round(rerank_time, 6)}}
+        )
 
-        return response
+        return serialize_response(response)
 
+    except HTTPException:
+        raise
+    except VectorVersionNotFound as e:
+        # Phiên bản hợp lệ nhưng collection chưa có (chưa backfill)
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Lỗi khi xử lý tìm kiếm: {str(e)}")
         raise HTTPException(
@@ -112,6 +371,320 @@ async def search_similar_audio(
             detail=f"Lỗi khi xử lý tìm kiếm: {str(e)}"
         )
 
+# Định dạng mẫu PCM mà client gửi qua /search/stream: (kiểu dữ liệu, hệ số đưa về [-1, 1])
+PCM_FORMATS = {"float32": (np.float32, 1.0), "int16": (np.int16, 1 / 32768)}
+
+
+@router.websocket("/search/stream")
+async def search_stream(
+        websocket: WebSocket,
+        pcm_sample_rate: int = Query(SAMPLE_RATE, ge=8000, le=192000, description="Tần số lấy mẫu của audio gửi lên"),
+        pcm_channels: int = Query(1, ge=1, le=8, description="Số kênh (các mẫu xen kẽ theo kênh)"),
+        pcm_format: str = Query("float32", description="Định dạng mẫu PCM: float32 hoặc int16 (little-endian)"),
+        limit: int = Query(TOP_K, ge=1, le=SEARCH_MAX_LIMIT, description="Số kết quả tối đa"),
+        filters: Optional[dict] = Depends(get_search_filters),
+        params: Optional[dict] = Depends(get_search_params),
+        vector_version: str = Query(SEARCH_VECTOR_VERSION, description="Phiên bản vector đặc trưng được truy vấn"),
+        feature_extractor: AudioFeatureExtractor = Depends(get_feature_extractor),
+        batcher: SearchBatcher = Depends(get_search_batcher)
+):
+    """
+    Tìm kiếm tăng dần khi audio đang được ghi âm/tải lên. Client gửi các đoạn audio PCM (message nhị phân, mỗi
+    message chứa trọn các frame của mọi kênh) và {"type": "end"} khi hết. Server tích lũy đặc trưng theo từng
+    đoạn, sau mỗi PROGRESSIVE_SEARCH_INTERVAL giây audio mới gửi {"type": "results", "seconds", "results"} nếu
+    top-k thay đổi; khi kết thúc tính lại vector trên toàn bộ audio và gửi {"type": "final", "response"}
+    (SearchResponse, dùng được với /search/result và /stream như kết quả của /search)
+    """
+    await websocket.accept()
+    if pcm_format not in PCM_FORMATS or vector_version not in FEATURE_VERSIONS:
+        await websocket.send_json({
+            "type": "error",
+            "detail": f"Tham số không hợp lệ. Định dạng mẫu hỗ trợ: {', '.join(PCM_FORMATS)}; "
+                      f"phiên bản vector hỗ trợ: {', '.join(FEATURE_VERSIONS)}"
+        })
+        await websocket.close(code=WS_1008_POLICY_VIOLATION)
+        return
+
+    query_id = str(uuid.uuid4())
+    query_id_var.set(query_id)
+    dtype, scale = PCM_FORMATS[pcm_format]
+    accumulator = feature_extractor.create_accumulator(pcm_sample_rate, channels=pcm_channels,
+                                                       versions=[vector_version])
+    query_filter = build_search_filter(**filters) if filters else None
+    search_params = build_search_params(**params) if params else None
+    searched_at, last_results = 0.0, None
+    try:
+        while accumulator.duration < PROGRESSIVE_SEARCH_MAX_SECONDS:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                logger.info(f"Client ngắt kết nối tìm kiếm tăng dần sau {accumulator.duration:.2f} giây audio")
+                return
+            if message.get("text") is not None:
+                if json.loads(message["text"]).get("type") == "end":
+                    break
+                continue
+            data = message.get("bytes") or b""
+            if len(data) % (np.dtype(dtype).itemsize * pcm_channels):
+                raise ValueError("Mỗi message phải chứa trọn các frame PCM của mọi kênh")
+            samples = np.frombuffer(data, dtype=dtype).astype(np.float32) * scale
+            await run_in_threadpool(accumulator.add, samples)
+
+            # Tìm lại khi đã nhận thêm đủ audio, chỉ gửi khi top-k thay đổi
+            if accumulator.duration - searched_at < PROGRESSIVE_SEARCH_INTERVAL:
+                continue
+            vectors = accumulator.vectors()
+            if vectors is None:
+                continue
+            searched_at = accumulator.duration
+            results = await batcher.search_similar(vectors[vector_version], top_k=limit, query_filter=query_filter,
+                                                   vector_version=vector_version, search_params=search_params)
+            if last_results is None or [item["file_name"] for item in results] != last_results:
+                last_results = [item["file_name"] for item in results]
+                await websocket.send_json({
+                    "type": "results",
+                    "seconds": round(accumulator.duration, 3),
+                    "results": [result.model_dump(mode="json") for result in build_results(results)]
+                })
+
+        # Kết thúc: vector chính xác trên toàn bộ audio, lưu thành file tạm như file upload của /search
+        await run_in_threadpool(accumulator.add, np.zeros(0, dtype=np.float32), True)
+        if accumulator.frames == 0:
+            raise ValueError("Chưa nhận đủ audio để trích xuất đặc trưng")
+        query_vector = (await run_in_threadpool(accumulator.final_vectors))[vector_version]
+        signal = accumulator.signal()
+        temp_file_name = f"{query_id}.wav"
+        temp_file_path = os.path.join(TEMP_DIR, temp_file_name)
+        peaks_path = get_peaks_path(temp_file_name, temp=True)
+        temp_registry.register(temp_file_path, query_id=query_id)
+        temp_registry.register(peaks_path, query_id=query_id)
+        await run_in_threadpool(sf.write, temp_file_path, signal, accumulator.sr)
+        def build_peaks():
+            write_peaks(feature_extractor.compute_peaks(signal), peaks_path)
+        await run_in_threadpool(build_peaks)
+
+        search_results = await search_page(batcher, query_vector, 0, limit, None, query_filter, vector_version,
+                                           search_params=search_params)
+        response = SearchResponse(
+            query_id=query_id,
+            request_type=RequestType.file,
+            query_string="",
+            temp_file_name=temp_file_name,
+            results=build_results(search_results),
+            offset=0,
+            limit=limit,
+            next_offset=get_next_offset(0, limit, len(search_results)),
+            filters=filters,
+            vector_version=vector_version,
+            search_params=params,
+            match_type="vector"
+        )
+        await run_in_threadpool(cache.set, query_id,
+                                {"response": response.model_dump(mode="json"), "query_vector": query_vector.tolist()})
+        logger.info(f"Tìm kiếm tăng dần xong sau {accumulator.duration:.2f} giây audio, lưu vào cache với "
+                    f"query_id: {query_id}")
+        await websocket.send_json({"type": "final", "response": response.model_dump(mode="json")})
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        logger.info(f"Client ngắt kết nối tìm kiếm tăng dần sau {accumulator.duration:.2f} giây audio")
+    except Exception as e:
+        logger.error(f"Lỗi khi tìm kiếm tăng dần: {str(e)}")
+        try:
+            await websocket.send_json({"type": "error", "detail": f"Lỗi khi tìm kiếm tăng dần: {str(e)}"})
+            await websocket.close(code=WS_1011_INTERNAL_ERROR)
+        except Exception:
+            pass
+
+
+@router.get(
+    "/search/similar",
+    response_model=SearchResponse,
+    responses={
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+        500: {"model": ErrorResponse}
+    }
+)
+async def search_similar_to_point(
+        point_id: Optional[int] = Query(None, ge=0, description="ID của point trong collection"),
+        file_name: Optional[str] = Query(None, description="Tên file trong dataset (dùng khi không có point_id)"),
+        limit: int = Query(TOP_K, ge=1, le=SEARCH_MAX_LIMIT, description="Số kết quả tối đa của trang"),
+        offset: int = Query(0, ge=0, description="Số kết quả đầu tiên bỏ qua"),
+        score_threshold: Optional[float] = Query(None, ge=-1.0, le=1.0, description="Ngưỡng độ tương đồng tối thiểu"),
+        filters: Optional[dict] = Depends(get_search_filters),
+        params: Optional[dict] = Depends(get_search_params),
+        vector_version: str = Query(SEARCH_VECTOR_VERSION, description="Phiên bản vector đặc trưng được truy vấn"),
+        rerank: bool = Query(RERANK_ENABLED, description="Re-rank các kết quả đầu bằng DTW trên chuỗi đặc trưng"),
+        batcher: SearchBatcher = Depends(get_search_batcher),
+        reranker: Reranker = Depends(get_reranker)
+):
+    """
+    Tìm các file tương tự với một file đã có trong collection (theo ID của point hoặc tên file).
+    Không cần upload và trích xuất đặc trưng: Qdrant truy vấn bằng vector đã lưu của point
+    """
+    try:
+        if (point_id is None) == (file_name is None):
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail="Cần đúng một trong hai tham số point_id hoặc file_name"
+            )
+        check_vector_version(vector_version)
+
+        query_id = str(uuid.uuid4())
+        query_id_var.set(query_id)
+
+        point = await run_in_threadpool(batcher.qdrant_manager.find_point, point_id, file_name, vector_version)
+        if point is None:
+            raise HTTPException(
+                status_code=HTTP_404_NOT_FOUND,
+                detail=f"Không tìm thấy file trong collection: {file_name if point_id is None else point_id}"
+            )
+        payload = point["payload"]
+        if not point["has_vector"]:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail=f"File {payload['file_name']} chưa có vector phiên bản {vector_version}"
+            )
+        # Các bản gần trùng lặp của chính file truy vấn không phải kết quả "tương tự"
+        if filters and filters.get("collapse_duplicates") and payload.get("group_id") is not None:
+            filters = {**filters, "exclude_group": payload["group_id"]}
+
+        start_query_time = time.time()
+        query_filter = build_search_filter(**filters) if filters else None
+        search_params = build_search_params(**params) if params else None
+        reranked = None
+        if rerank:
+            candidates = await batcher.search_similar(
+                point["id"], top_k=RERANK_CANDIDATES, score_threshold=score_threshold,
+                query_filter=query_filter, vector_version=vector_version, search_params=search_params
+            )
+            query_sequence = load_sequence(get_sequence_path(payload["file_name"]))
+            reranked = await run_in_threadpool(reranker.rerank, query_sequence, candidates)
+        search_results = await search_page(
+            batcher, point["id"], offset, limit, score_threshold, query_filter, vector_version,
+            reranked=reranked, rerank_window=RERANK_CANDIDATES, search_params=search_params
+        )
+        query_time = time.time() - start_query_time
+
+        response = SearchResponse(
+            query_id=query_id,
+            request_type=RequestType.point,
+            query_string=payload["file_name"],
+            temp_file_name=None,
+            results=build_results(search_results),
+            offset=offset,
+            limit=limit,
+            score_threshold=score_threshold,
+            next_offset=get_next_offset(offset, limit, len(search_results)),
+            filters=filters,
+            vector_version=vector_version,
+            search_params=params,
+            rerank=rerank,
+            match_type="vector"
+        )
+        # Phân trang qua /search/result dùng lại ID của point thay cho vector truy vấn
+        await run_in_threadpool(cache.set, query_id, {
+            "response": response.model_dump(mode="json"),
+            "query_vector": None,
+            "query_point_id": point["id"],
+            "reranked": reranked,
+            "rerank_window": RERANK_CANDIDATES
+        })
+        logger.info(
+            f"Tìm kiếm theo point {point['id']} xong: {len(search_results)} kết quả, lưu vào cache với query_id: "
+            f"{query_id}",
+            extra={"timings": {"search": round(query_time, 6)}}
+        )
+        return serialize_response(response)
+
+    except HTTPException:
+        raise
+    except VectorVersionNotFound as e:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Lỗi khi tìm kiếm theo point: {str(e)}")
+        raise HTTPException(
+            status_code=HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Lỗi khi tìm kiếm theo point: {str(e)}"
+        )
+
+@router.get(
+    "/related/{point_id}",
+    response_model=SearchResponse,
+    responses={
+        404: {"model": ErrorResponse},
+        500: {"model": ErrorResponse}
+    }
+)
+async def get_related_audio(
+        point_id: int,
+        limit: int = Query(TOP_K, ge=1, le=KNN_K, description="Số kết quả tối đa"),
+        collapse_duplicates: bool = Query(True, description="Bỏ bản gần trùng lặp (của nhau và của file truy vấn)"),
+        batcher: SearchBatcher = Depends(get_search_batcher),
+        graph: KnnGraph = Depends(get_knn_graph)
+):
+    """
+    Các file liên quan của một file trong collection, lấy từ đồ thị láng giềng tính trước (không truy vấn vector).
+    Point chưa có trong đồ thị (index sau lần cập nhật đồ thị gần nhất) được tìm bằng vector đã lưu của point
+    """
+    try:
+        neighbors = graph.neighbors(point_id)
+        if neighbors is None:
+            point = await run_in_threadpool(batcher.qdrant_manager.find_point, point_id, None, KNN_VECTOR_VERSION)
+            if point is None or not point["has_vector"]:
+                raise HTTPException(
+                    status_code=HTTP_404_NOT_FOUND,
+                    detail=f"Không tìm thấy file trong collection: {point_id}"
+                )
+            seed = point["payload"]
+            group_id = seed.get("group_id") if collapse_duplicates else None
+            related = await batcher.search_similar(
+                point_id, top_k=limit, vector_version=KNN_VECTOR_VERSION,
+                query_filter=build_search_filter(collapse_duplicates=collapse_duplicates, exclude_group=group_id)
+            )
+            match_type = "vector"
+        else:
+            payloads = await run_in_threadpool(batcher.qdrant_manager.get_payloads,
+                                               [point_id] + [neighbor for neighbor, _ in neighbors])
+            if point_id not in payloads:
+                raise HTTPException(
+                    status_code=HTTP_404_NOT_FOUND,
+                    detail=f"Không tìm thấy file trong collection: {point_id}"
+                )
+            seed = payloads[point_id]
+            related = []
+            for neighbor, score in neighbors:
+                payload = payloads.get(neighbor)
+                # Point đã bị xóa sau lần cập nhật đồ thị gần nhất bị bỏ qua
+                if payload is None:
+                    continue
+                if collapse_duplicates and (payload.get("is_canonical") is False or (
+                        seed.get("group_id") is not None and payload.get("group_id") == seed.get("group_id"))):
+                    continue
+                related.append(payload_to_result(payload, score))
+            related = related[:limit]
+            match_type = "graph"
+
+        return serialize_response(SearchResponse(
+            query_id="",
+            request_type=RequestType.point,
+            query_string=seed["file_name"],
+            temp_file_name=None,
+            results=build_results(related),
+            limit=limit,
+            vector_version=KNN_VECTOR_VERSION,
+            match_type=match_type
+        ))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy file liên quan: {str(e)}")
+        raise HTTPException(
+            status_code=HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Lỗi khi lấy file liên quan: {str(e)}"
+        )
+
+
 @router.get(
     "/search/result/{query_id}",
     response_model=SearchResponse,
@@ -120,18 +693,63 @@ async def search_similar_audio(
         500: {"model": ErrorResponse}
     }
 )
-async def get_search_result(query_id: str):
-    """ Lấy kết quả tìm kiếm từ cache dựa trên query_id """
+async def get_search_result(
+        query_id: str,
+        limit: Optional[int] = Query(None, ge=1, le=SEARCH_MAX_LIMIT, description="Số kết quả tối đa của trang"),
+        offset: Optional[int] = Query(None, ge=0, description="Số kết quả đầu tiên bỏ qua"),
+        score_threshold: Optional[float] = Query(None, ge=-1.0, le=1.0, description="Ngưỡng độ tương đồng tối thiểu"),
+        batcher: SearchBatcher = Depends(get_search_batcher)
+):
+    """
+    Lấy kết quả tìm kiếm từ cache dựa trên query_id.
+    Nếu có tham số phân trang, truy vấn lại Qdrant bằng vector, bộ lọc và tham số tìm kiếm đã cache
+    (không trích xuất lại)
+    """
     try:
+        query_id_var.set(query_id)
         # Kiểm tra cache
-        if query_id not in cache:
+        entry = await run_in_threadpool(cache.get, query_id)
+        record_cache("query", hit=entry is not None)
+        if entry is None:
             raise HTTPException(
                 status_code=HTTP_404_NOT_FOUND,
                 detail=f"Kết quả tìm kiếm cho query_id {query_id} không tồn tại hoặc đã hết hạn"
             )
 
-        # Lấy response và file_name từ cache
-        response = cache[query_id]
+        # Lấy response từ cache
+        response = SearchResponse(**entry["response"])
+
+        # Truy vấn trang khác bằng vector (hoặc ID của point) đã cache,
+        # các file khớp fingerprint đã cache vẫn đứng đầu và được loại khỏi phần kết quả theo vector
+        query = entry.get("query_point_id")
+        if query is None and entry.get("query_vector") is not None:
+            query = np.asarray(entry["query_vector"], dtype=np.float32)
+        paginate = limit is not None or offset is not None or score_threshold is not None
+        if paginate and query is not None:
+            limit = limit or response.limit or TOP_K
+            offset = offset or 0
+            if score_threshold is None:
+                score_threshold = response.score_threshold
+            search_results = await search_page(
+                batcher,
+                query,
+                offset,
+                limit,
+                score_threshold,
+                build_search_filter(**(response.filters or {}), exclude_ids=entry.get("fingerprint_ids")),
+                response.vector_version or SEARCH_VECTOR_VERSION,
+                reranked=entry.get("reranked"),
+                rerank_window=entry.get("rerank_window", RERANK_CANDIDATES),
+                search_params=build_search_params(**response.search_params) if response.search_params else None,
+                fingerprint=entry.get("fingerprint")
+            )
+            response = response.model_copy(update={
+                "results": build_results(search_results),
+                "offset": offset,
+                "limit": limit,
+                "score_threshold": score_threshold,
+                "next_offset": get_next_offset(offset, limit, len(search_results))
+            })
 
         # Kiểm tra file tạm có còn tồn tại không
         if response.temp_file_name:
@@ -141,10 +759,12 @@ async def get_search_result(query_id: str):
                 response.temp_file_name = None
 
         logger.info(f"Trả về kết quả từ cache cho query_id: {query_id}")
-        return response
+        return serialize_response(response)
 
     except HTTPException:
         raise
+    except VectorVersionNotFound as e:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Lỗi khi lấy kết quả từ cache: {str(e)}")
         raise HTTPException(
@@ -153,6 +773,12 @@ async def get_search_result(query_id: str):
         )
 
 
+@router.get("/stats/search-batcher")
+async def get_search_batcher_stats(batcher: SearchBatcher = Depends(get_search_batcher)):
+    """ Thống kê gom batch truy vấn: kích thước batch và thời gian chờ thêm của mỗi truy vấn """
+    return batcher.get_stats()
+
+
 @router.get(
     "/metadata",
     response_model=SearchResponse,
@@ -174,29 +800,14 @@ async def get_audio_file_metadata(
                 status_code=HTTP_404_NOT_FOUND,
                 detail=f"Không tìm thấy file nào có tên chứa: {query_string}"
             )
-        # Chuẩn bị kết quả trả về
-        results = [
-            AudioSearchResult(
-                file_name=item["file_name"],
-                file_type=item["file_type"],
-                file_size_kb=item["file_size_kb"],
-                sample_rate=item["sample_rate"],
-                channel=item["channel"],
-                samples=item["samples"],
-                duration=item["duration"],
-                subtype=item["subtype"],
-                similarity=item["similarity"]
-            )
-            for item in search_results
-        ]
         # Trả về theo template SearchResponse
-        return SearchResponse(
+        return serialize_response(SearchResponse(
             query_id="",
             request_type=RequestType.metadata,
             query_string=query_string,
             temp_file_name=None,
-            results=results
-        )
+            results=build_results(search_results)
+        ))
     except HTTPException:
         raise
     except Exception as e:
@@ -216,33 +827,37 @@ async def get_audio_file_metadata(
 )
 async def stream_audio(
         file_name: str,
+        request: Request,
         type: str = Query(..., enum=["temp", "result"]),
+        quality: str = Query("original", enum=["preview", "original"]),
 ):
-    """ Stream file audio từ thư mục tạm hoặc dataset """
+    """ Stream file audio từ thư mục tạm hoặc dataset (bản gốc hoặc bản preview dung lượng thấp) """
     try:
         file_path = None
         if type == "temp":
             # Tìm file trong TEMP_DIR
             file_path = os.path.join(TEMP_DIR, file_name)
-            logger.info(f"Kiểm tra file trong TEMP_DIR: {file_path}")
+            stream_logger.debug("Kiểm tra file trong TEMP_DIR: %s", file_path)
         elif type == "result":
             # Tìm file trong AUDIO_DATASET_PATH
-            for root, _, files in os.walk(AUDIO_DATASET_PATH):
-                if file_name in files:
-                    file_path = os.path.join(root, file_name)
-                    break
-            logger.info(f"Kiểm tra file trong AUDIO_DATASET_PATH: {file_path}")
+            file_path = find_dataset_file(file_name)
+            stream_logger.debug("Kiểm tra file trong AUDIO_DATASET_PATH: %s", file_path)
 
         # Kiểm tra file tồn tại
         if not file_path or not os.path.exists(file_path):
-            logger.error(f"File không tồn tại: {file_name} (type: {type})")
+            stream_logger.error(f"File không tồn tại: {file_name} (type: {type})")
             raise HTTPException(
                 status_code=HTTP_404_NOT_FOUND,
                 detail=f"File không tồn tại: {file_name}"
             )
 
-        # Lấy thông tin file
-        file_size = os.path.getsize(file_path)
+        # Bản preview chỉ áp dụng cho file dataset, tạo khi cần nếu chưa có
+        if type == "result" and quality == "preview":
+            try:
+                file_path = await ensure_preview(file_path)
+            except Exception as e:
+                stream_logger.warning(f"Không thể tạo bản preview cho {file_path}, trả về bản gốc: {str(e)}")
+
         # Xác định content_type dựa trên phần mở rộng
         file_ext = os.path.splitext(file_path)[1].lower()
         content_type_map = {
@@ -253,36 +868,131 @@ async def stream_audio(
         }
         content_type = content_type_map.get(file_ext, 'application/octet-stream')
 
-        # Thêm file vào active_streams
-        async with audio_utils.active_streams_lock:
-            audio_utils.active_streams.add(file_path)
-        logger.info(f"Đã thêm file vào active_streams: {file_path}")
+        # File dataset không thay đổi nên cho phép trình duyệt/proxy cache lâu dài,
+        # file tạm chỉ được cache riêng và phải kiểm tra lại bằng ETag
+        if type == "result":
+            cache_control = f"public, max-age={STREAM_CACHE_MAX_AGE}, immutable"
+        else:
+            cache_control = "private, no-cache"
+
+        # Giữ file tạm không bị xóa cho đến khi gửi xong response
+        background = None
+        if type == "temp" and temp_registry.lease(file_path):
+            background = BackgroundTask(temp_registry.release, file_path)
 
         try:
-            # Tạo iterator để streaming file
-            file_stream = file_iterator(file_path)
-            # Trả về response streaming
-            response = StreamingResponse(
-                file_stream,
-                media_type=content_type
+            # Trả về file (sendfile nếu server hỗ trợ), 206 nếu có Range, 304 nếu client đã có bản mới nhất
+            response = create_file_response(
+                file_path,
+                request.headers,
+                media_type=content_type,
+                cache_control=cache_control,
+                background=background,
+                stream_type=f"{type}_{quality}" if type == "result" else type
             )
-            # Thêm các headers cần thiết
-            response.headers["Content-Disposition"] = f"inline; filename={os.path.basename(file_path)}"
-            response.headers["Accept-Ranges"] = "bytes"
-            response.headers["Content-Length"] = str(file_size)
-
-            logger.info(f"Streaming file: {file_path}")
-            return response
-        finally:
-            # Xóa file khỏi active_streams sau khi stream hoàn tất hoặc lỗi
-            async with audio_utils.active_streams_lock:
-                audio_utils.active_streams.discard(file_path)
-            logger.info(f"Đã xóa file khỏi active_streams: {file_path}")
+        except Exception:
+            if background is not None:
+                temp_registry.release(file_path)
+            raise
+        # Định dạng lười (%s) để không tốn chi phí khi record bị bỏ do lấy mẫu
+        stream_logger.info("Streaming file: %s (status: %s)", file_path, response.status_code)
+        return response
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Lỗi khi streaming file audio: {str(e)}")
+        stream_logger.error(f"Lỗi khi streaming file audio: {str(e)}")
         raise HTTPException(
             status_code=HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi khi streaming file audio: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.get(
+    "/peaks/{file_name}",
+    responses={
+        404: {"model": ErrorResponse},
+        500: {"model": ErrorResponse}
+    }
+)
+async def get_audio_peaks(
+        file_name: str,
+        request: Request,
+        type: str = Query(..., enum=["temp", "result"]),
+        feature_extractor: AudioFeatureExtractor = Depends(get_feature_extractor)
+):
+    """
+    Lấy waveform peaks của file audio dạng nhị phân: các cặp (min, max) int8 liên tiếp,
+    biên độ [-1, 1] ánh xạ sang [-127, 127]
+    """
+    try:
+        if type == "temp":
+            # Peaks của file truy vấn được tính cùng lúc trích xuất đặc trưng
+            peaks_path = get_peaks_path(file_name, temp=True)
+            if not peaks_path.exists():
+                raise HTTPException(
+                    status_code=HTTP_404_NOT_FOUND,
+                    detail=f"Waveform peaks không tồn tại: {file_name}"
+                )
+            cache_control = "private, no-cache"
+        else:
+            file_path = find_dataset_file(file_name)
+            if not file_path:
+                raise HTTPException(
+                    status_code=HTTP_404_NOT_FOUND,
+                    detail=f"File không tồn tại: {file_name}"
+                )
+            peaks_path = get_peaks_path(file_name)
+            # Tính peaks khi cần nếu file chưa được index kèm peaks
+            peaks_fresh = is_peaks_fresh(peaks_path, file_path)
+            record_cache("peaks", hit=peaks_fresh)
+            if not peaks_fresh:
+                def build_peaks():
+                    y, _ = feature_extractor.load_audio(file_path)
+                    write_peaks(feature_extractor.compute_peaks(y), peaks_path)
+                await run_in_threadpool(build_peaks)
+                logger.info(f"Đã tạo waveform peaks: {peaks_path}")
+            cache_control = f"public, max-age={STREAM_CACHE_MAX_AGE}"
+
+        response = create_file_response(
+            str(peaks_path),
+            request.headers,
+            media_type="application/octet-stream",
+            cache_control=cache_control,
+            stream_type="peaks"
+        )
+        response.headers["X-Peaks-Format"] = "int8-minmax"
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy waveform peaks: {str(e)}")
+        raise HTTPException(
+            status_code=HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Lỗi khi lấy waveform peaks: {str(e)}"
+        )
+
+
+@router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """ Danh sách các profile đã lưu (mới nhất trước) """
+    return {"profiles": profile_store.list()}
+
+
+@router.get(
+    "/admin/profiles/{profile_id}",
+    dependencies=[Depends(require_admin)],
+    responses={
+        403: {"model": ErrorResponse},
+        404: {"model": ErrorResponse}
+    }
+)
+async def get_profile(profile_id: str, format: str = Query("pstats", enum=["pstats", "collapsed"])):
+    """ Tải profile theo định dạng pstats (nhị phân) hoặc collapsed stack (text, dùng cho flamegraph) """
+    path = profile_store.get_path(profile_id, format)
+    if path is None:
+        raise HTTPException(
+            status_code=HTTP_404_NOT_FOUND,
+            detail=f"Profile không tồn tại: {profile_id}"
+        )
+    media_type = "application/octet-stream" if format == "pstats" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=path.name)
\ No newline at end of file
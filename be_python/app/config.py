@@ -12,6 +12,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
 QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME", "audio_vectors")
+# Chạy Qdrant trong tiến trình (local mode) thay vì kết nối server:
+# ":memory:" để lưu trong RAM hoặc đường dẫn thư mục để lưu trên đĩa. Để trống để dùng QDRANT_HOST/QDRANT_PORT
+QDRANT_LOCATION = os.getenv("QDRANT_LOCATION", "")
 
 # Đường dẫn đến thư mục audio
 AUDIO_DATASET_PATH = os.getenv("AUDIO_DATASET_PATH", r"/Dataset/Bassoon")
@@ -22,15 +25,177 @@ N_MFCC = 40
 HOP_LENGTH = 512
 N_FFT = 2048
 
+# Phiên bản vector đặc trưng (định nghĩa trong FEATURE_VERSIONS của feature_extractor.py).
+# Mỗi point lưu một named vector cho từng phiên bản trong FEATURE_VECTOR_VERSIONS, collection mới khai báo sẵn
+# tất cả các phiên bản này; phiên bản mới được bổ sung dần bằng scripts/backfill_vectors.py
+FEATURE_VECTOR_VERSIONS = [version.strip() for version in
+                           os.getenv("FEATURE_VECTOR_VERSIONS", "v1,v2").split(",") if version.strip()]
+# Phiên bản được dùng khi tìm kiếm nếu request không chỉ định vector_version
+SEARCH_VECTOR_VERSION = os.getenv("SEARCH_VECTOR_VERSION", "v1")
+
 # Số lượng kết quả trả về
 TOP_K = 3
+# Số lượng kết quả tối đa của một trang tìm kiếm
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", 100))
+
+# Gom các truy vấn tìm kiếm đồng thời thành một lần gọi Qdrant
+SEARCH_BATCHING_ENABLED = os.getenv("SEARCH_BATCHING_ENABLED", "true").lower() == "true"
+# Thời gian tối đa chờ gom thêm truy vấn (ms), chỉ áp dụng khi đang có tải đồng thời
+SEARCH_BATCH_WINDOW_MS = float(os.getenv("SEARCH_BATCH_WINDOW_MS", 2.0))
+# Số truy vấn tối đa trong một batch
+SEARCH_BATCH_MAX_SIZE = int(os.getenv("SEARCH_BATCH_MAX_SIZE", 32))
+# Số batch được gửi đến Qdrant cùng lúc
+SEARCH_BATCH_MAX_INFLIGHT = int(os.getenv("SEARCH_BATCH_MAX_INFLIGHT", 4))
 
 # Thư mục tạm để lưu file upload
 TEMP_DIR = BASE_DIR / "data" / "temp"
 TEMP_DIR.mkdir(parents=True, exist_ok=True)
 
+# Thư mục lưu bản preview (OGG/Vorbis, mono, sample rate thấp) của file dataset
+PREVIEW_DIR = BASE_DIR / "data" / "previews"
+PREVIEW_DIR.mkdir(parents=True, exist_ok=True)
+PREVIEW_SAMPLE_RATE = int(os.getenv("PREVIEW_SAMPLE_RATE", 16000))
+# Độ dài tối đa của bản preview (giây)
+PREVIEW_MAX_SECONDS = float(os.getenv("PREVIEW_MAX_SECONDS", 30.0))
+
+# Thư mục lưu dữ liệu waveform (min/max peaks dạng int8) của file dataset
+PEAKS_DIR = BASE_DIR / "data" / "peaks"
+PEAKS_DIR.mkdir(parents=True, exist_ok=True)
+# Số điểm (cặp min/max) của waveform
+PEAKS_BINS = int(os.getenv("PEAKS_BINS", 1024))
+
+# Thư mục lưu chuỗi đặc trưng theo frame (MFCC float16, dùng để re-rank) của file dataset
+SEQUENCE_DIR = BASE_DIR / "data" / "sequences"
+SEQUENCE_DIR.mkdir(parents=True, exist_ok=True)
+# Số hệ số MFCC mỗi frame (bỏ hệ số 0 - năng lượng), số frame MFCC được gộp (trung bình) thành một frame
+# của chuỗi (8 x HOP_LENGTH ~ 0.19 giây) và số frame tối đa được lưu (phần đầu của file)
+SEQUENCE_N_COEFFS = int(os.getenv("SEQUENCE_N_COEFFS", 20))
+SEQUENCE_POOL = int(os.getenv("SEQUENCE_POOL", 8))
+SEQUENCE_MAX_FRAMES = int(os.getenv("SEQUENCE_MAX_FRAMES", 160))
+
+# Re-rank: lấy RERANK_CANDIDATES kết quả đầu từ Qdrant rồi sắp xếp lại bằng DTW trên chuỗi đặc trưng theo frame
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() in ("1", "true", "yes")  # mặc định của tham số rerank
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 50))
+# Thời gian tối đa cho DTW của một truy vấn (ms); ứng viên chưa kịp so sánh giữ thứ tự vector, xếp sau
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", 50))
+# Độ rộng dải Sakoe-Chiba của DTW (tỉ lệ so với độ dài chuỗi dài hơn)
+RERANK_BAND = float(os.getenv("RERANK_BAND", 0.1))
+# Trọng số của độ tương đồng DTW trong điểm re-rank (phần còn lại là độ tương đồng vector)
+RERANK_WEIGHT = float(os.getenv("RERANK_WEIGHT", 0.7))
+
+# Phát hiện bản gần trùng lặp khi index: point có độ tương đồng vector >= DEDUP_THRESHOLD với một point chính
+# (và thời lượng chênh lệch không quá DEDUP_DURATION_TOLERANCE, tỉ lệ) được gộp vào nhóm của point đó.
+# Bản ghi lại/chuyển mã của cùng một clip thường >= 0.998, hai clip khác nhau gần nhất trong dataset ~0.98
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.995))
+DEDUP_DURATION_TOLERANCE = float(os.getenv("DEDUP_DURATION_TOLERANCE", 0.1))
+DEDUP_VECTOR_VERSION = os.getenv("DEDUP_VECTOR_VERSION", SEARCH_VECTOR_VERSION)
+
+# Fingerprint landmark (cặp đỉnh phổ) để nhận diện chính xác một file dataset hoặc đoạn trích của nó.
+# Mỗi file dataset có một file landmark riêng trong LANDMARK_DIR; các file này được gộp thành index đảo ngược
+# LANDMARK_INDEX_PATH (hash -> point, vị trí) sắp xếp theo hash, API đọc bằng memory-map
+LANDMARK_ENABLED = os.getenv("LANDMARK_ENABLED", "true").lower() in ("1", "true", "yes")  # mặc định của tham số
+LANDMARK_DIR = BASE_DIR / "data" / "landmarks"
+LANDMARK_DIR.mkdir(parents=True, exist_ok=True)
+LANDMARK_INDEX_PATH = Path(os.getenv("LANDMARK_INDEX_PATH", BASE_DIR / "data" / "landmark_index.npy"))
+# Số đỉnh phổ giữ lại mỗi giây (đỉnh mạnh nhất) và số cặp tạo từ mỗi đỉnh neo
+LANDMARK_PEAKS_PER_SECOND = int(os.getenv("LANDMARK_PEAKS_PER_SECOND", 30))
+LANDMARK_FAN_OUT = int(os.getenv("LANDMARK_FAN_OUT", 5))
+# Một file được coi là khớp khi có ít nhất LANDMARK_MIN_MATCHES hash cùng độ lệch thời gian
+# và chiếm ít nhất LANDMARK_MIN_RATIO số landmark của truy vấn
+LANDMARK_MIN_MATCHES = int(os.getenv("LANDMARK_MIN_MATCHES", 20))
+LANDMARK_MIN_RATIO = float(os.getenv("LANDMARK_MIN_RATIO", 0.05))
+# Số file khớp fingerprint tối đa được đặt lên đầu kết quả (trước các kết quả theo vector)
+LANDMARK_MAX_RESULTS = int(os.getenv("LANDMARK_MAX_RESULTS", 10))
+
+# Đồ thị KNN_K láng giềng gần nhất của toàn bộ collection (tính trước, cập nhật tăng dần khi reindex)
+# cho endpoint /related: mỗi dòng là ID (int32) và độ tương đồng (float16) của các láng giềng
+KNN_GRAPH_PATH = Path(os.getenv("KNN_GRAPH_PATH", BASE_DIR / "data" / "knn_graph.npy"))
+KNN_K = int(os.getenv("KNN_K", 20))
+KNN_VECTOR_VERSION = os.getenv("KNN_VECTOR_VERSION", SEARCH_VECTOR_VERSION)
+# Số dòng tính trong một lần nhân ma trận khi tạo đồ thị (bộ nhớ ~ KNN_BLOCK_SIZE x số point x 4 bytes)
+KNN_BLOCK_SIZE = int(os.getenv("KNN_BLOCK_SIZE", 1024))
+
+# Tìm kiếm tăng dần qua WebSocket (/api/search/stream): client gửi audio PCM theo từng đoạn, server tìm lại
+# sau mỗi PROGRESSIVE_SEARCH_INTERVAL giây audio mới và gửi top-k mỗi khi kết quả thay đổi
+PROGRESSIVE_SEARCH_INTERVAL = float(os.getenv("PROGRESSIVE_SEARCH_INTERVAL", 1.0))
+# Thời lượng tối đa của một phiên (giây), quá thời lượng này phiên được kết thúc như khi client gửi "end"
+PROGRESSIVE_SEARCH_MAX_SECONDS = float(os.getenv("PROGRESSIVE_SEARCH_MAX_SECONDS", 600))
+
+# Cấu hình chỉ mục HNSW của collection mới (collection đã có giữ cấu hình lúc tạo).
+# Chọn bằng scripts/benchmark_hnsw.py: recall@k so với tìm kiếm chính xác và độ trễ của từng cấu hình
+HNSW_M = int(os.getenv("HNSW_M", 16))  # Số kết nối tối đa mỗi node
+HNSW_EF_CONSTRUCT = int(os.getenv("HNSW_EF_CONSTRUCT", 100))  # Số neighbor khi xây dựng chỉ mục
+HNSW_FULL_SCAN_THRESHOLD = int(os.getenv("HNSW_FULL_SCAN_THRESHOLD", 10000))  # Ngưỡng (KB) để dùng tìm kiếm toàn bộ
+# Tham số tìm kiếm mặc định (ghi đè theo từng request bằng hnsw_ef/exact):
+# SEARCH_HNSW_EF = 0 dùng mặc định của Qdrant (ef_construct), SEARCH_EXACT bỏ qua chỉ mục, so sánh với mọi vector
+SEARCH_HNSW_EF = int(os.getenv("SEARCH_HNSW_EF", 0)) or None
+SEARCH_EXACT = os.getenv("SEARCH_EXACT", "false").lower() in ("1", "true", "yes")
+
 # Kích thước chunk cho việc streaming (bytes)
-CHUNK_SIZE = 1024 * 8  # 8KB
+# Dùng khi ASGI server không hỗ trợ sendfile (uvicorn) hoặc request có Range; chunk lớn giúp giảm số lần đọc file
+# trong thread pool
+CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 1024 * 256))  # 256KB
+
+# Thời gian cache (giây) của file dataset ở trình duyệt/proxy
+STREAM_CACHE_MAX_AGE = int(os.getenv("STREAM_CACHE_MAX_AGE", 60 * 60 * 24 * 30))  # 30 ngày
 
 # Thời gian sống của file tạm (phút)
-TEMP_FILE_TTL_MINUTES = float(os.getenv("TEMP_FILE_TTL_MINUTES", 1.0))
\ No newline at end of file
+TEMP_FILE_TTL_MINUTES = float(os.getenv("TEMP_FILE_TTL_MINUTES", 1.0))
+# Thời gian tối đa giữ file tạm cho một lượt stream (giây), phòng khi client ngắt kết nối giữa chừng
+TEMP_LEASE_TIMEOUT_SECONDS = float(os.getenv("TEMP_LEASE_TIMEOUT_SECONDS", 600))
+
+# Số worker của uvicorn khi chạy app/main.py
+APP_WORKERS = int(os.getenv("APP_WORKERS", 1))
+# Có chạy nhiều worker không: APP_WORKERS > 1, WEB_CONCURRENCY > 1 (số worker mặc định của uvicorn/gunicorn)
+# hoặc chạy dưới gunicorn (master đặt SERVER_SOFTWARE trước khi fork, các worker vẫn thấy APP_WORKERS=1)
+MULTI_WORKER = (APP_WORKERS > 1 or int(os.getenv("WEB_CONCURRENCY", 1)) > 1
+                or os.getenv("SERVER_SOFTWARE", "").startswith("gunicorn"))
+
+# Cache kết quả tìm kiếm: "memory" (trong tiến trình) hoặc "sqlite" (dùng chung giữa các worker trên cùng máy)
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "sqlite" if MULTI_WORKER else "memory").lower()
+RESULT_CACHE_PATH = Path(os.getenv("RESULT_CACHE_PATH", BASE_DIR / "data" / "result_cache.sqlite3"))
+# Số kết quả tối đa được giữ trong cache
+RESULT_CACHE_MAXSIZE = int(os.getenv("RESULT_CACHE_MAXSIZE", 1000))
+
+# Token quản trị (header X-Admin-Token) cho các endpoint quản trị, để trống sẽ tắt các endpoint này
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Profiling theo request: bật bằng header X-Profile (giá trị = ADMIN_TOKEN) hoặc lấy mẫu ngẫu nhiên
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.0))
+# Middleware chỉ được gắn khi có ADMIN_TOKEN hoặc PROFILE_SAMPLE_RATE > 0 (không tốn chi phí khi tắt)
+PROFILING_ENABLED = bool(ADMIN_TOKEN) or PROFILE_SAMPLE_RATE > 0
+# Các đường dẫn được profile
+PROFILE_PATH_PREFIXES = tuple(os.getenv("PROFILE_PATH_PREFIXES", "/api/search").split(","))
+# Chu kỳ lấy mẫu stack của profiler (ms)
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 2.0))
+# Thư mục lưu profile và số profile tối đa được giữ lại (vòng tròn, xóa profile cũ nhất)
+PROFILE_DIR = BASE_DIR / "data" / "profiles"
+PROFILE_RING_SIZE = int(os.getenv("PROFILE_RING_SIZE", 50))
+
+# Logging: file log JSON xoay vòng theo kích thước, ghi qua hàng đợi ở thread riêng
+# (khi chạy nhiều worker, xem MULTI_WORKER, mỗi worker ghi file riêng app.<pid>.log)
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))  # 10MB
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+# Số record tối đa chờ ghi, record mới bị bỏ khi hàng đợi đầy (không chặn request)
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Tỉ lệ giữ lại log (dưới WARNING) theo logger, dạng "logger=rate,logger=rate"
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "app.api.router.stream=0.1")
+
+# Warm-up khi khởi động (trích xuất tổng hợp, kết nối vector store, nạp trước index); /ready trả về 503 cho đến khi xong
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Manifest của dataset đã index (đường dẫn, kích thước, mtime, hash nội dung, ID point) cho reindex tăng dần
+INDEX_MANIFEST_PATH = Path(os.getenv("INDEX_MANIFEST_PATH", BASE_DIR / "data" / "index_manifest.json"))
+# Checkpoint của index_dataset.py (chạy tiếp bằng --resume) và số file mỗi batch được ghi checkpoint
+INDEX_CHECKPOINT_PATH = Path(os.getenv("INDEX_CHECKPOINT_PATH", BASE_DIR / "data" / "index_checkpoint.json"))
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", 64))
+
+# Watcher của dataset (scripts/watch_dataset.py): file phải ổn định trong INGEST_DEBOUNCE_SECONDS trước khi được index
+INGEST_DEBOUNCE_SECONDS = float(os.getenv("INGEST_DEBOUNCE_SECONDS", 2.0))
+# Chu kỳ quét thư mục khi không có watchdog (giây) và số file tối đa mỗi batch
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", 2.0))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 32))
+# Cổng của status server (/status, /metrics) của watcher
+INGEST_STATUS_PORT = int(os.getenv("INGEST_STATUS_PORT", 8001))
\ No newline at end of file
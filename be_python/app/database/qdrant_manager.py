@@ -1,78 +1,368 @@
 import logging
 import os
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple, Union
 import numpy as np
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from qdrant_client.http.exceptions import UnexpectedResponse
 
-from app.config import QDRANT_HOST, QDRANT_PORT, QDRANT_COLLECTION_NAME, TOP_K
+from app.config import QDRANT_HOST, QDRANT_PORT, QDRANT_COLLECTION_NAME, QDRANT_LOCATION, TOP_K, \
+    SEARCH_VECTOR_VERSION, DEDUP_ENABLED, DEDUP_THRESHOLD, DEDUP_DURATION_TOLERANCE, DEDUP_VECTOR_VERSION, \
+    HNSW_M, HNSW_EF_CONSTRUCT, HNSW_FULL_SCAN_THRESHOLD
 
 logger = logging.getLogger(__name__)
 
+# Collection tạo trước khi có named vector chỉ có một vector không tên, tương ứng với phiên bản này
+LEGACY_VECTOR_VERSION = "v1"
+
+# Các payload index của collection: id (sắp xếp), file_name (tìm theo tên), các trường lọc khi tìm kiếm
+# và nhóm bản gần trùng lặp (group_id = ID của point chính, is_canonical)
+PAYLOAD_INDEXES = {
+    "id": models.PayloadSchemaType.INTEGER,
+    "file_name": models.PayloadSchemaType.KEYWORD,
+    "category": models.PayloadSchemaType.KEYWORD,
+    "duration": models.PayloadSchemaType.FLOAT,
+    "sample_rate": models.PayloadSchemaType.INTEGER,
+    "channel": models.PayloadSchemaType.INTEGER,
+    "group_id": models.PayloadSchemaType.INTEGER,
+    "is_canonical": models.PayloadSchemaType.BOOL,
+}
+
+# Point không phải point chính của nhóm (point cũ chưa có is_canonical được coi là point chính)
+NOT_CANONICAL = models.FieldCondition(key="is_canonical", match=models.MatchValue(value=False))
+
+# Client dùng chung cho mọi QdrantManager trong tiến trình
+_client = None
+
+
+class VectorVersionNotFound(ValueError):
+    """ Collection không có (hoặc chưa được backfill) named vector của phiên bản được yêu cầu """
+
+
+def get_qdrant_client() -> QdrantClient:
+    """
+    Lấy Qdrant client dùng chung (tạo khi gọi lần đầu).
+    Nếu QDRANT_LOCATION được đặt, Qdrant chạy trong tiến trình (local mode) thay vì kết nối server
+    Returns:
+        QdrantClient
+    """
+    global _client
+    if _client is None:
+        if QDRANT_LOCATION == ":memory:":
+            _client = QdrantClient(location=":memory:")
+            logger.info("Sử dụng Qdrant trong bộ nhớ (local mode)")
+        elif QDRANT_LOCATION:
+            _client = QdrantClient(path=QDRANT_LOCATION)
+            logger.info(f"Sử dụng Qdrant local mode tại: {QDRANT_LOCATION}")
+        else:
+            _client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+    return _client
+
+
+def build_payload(data: Dict[str, Any], point_id: int) -> Dict[str, Any]:
+    """
+    Tạo payload của point từ kết quả extract_features
+
+    Args:
+        data: Dict chứa metadata của file audio
+        point_id: ID của point (lưu cả trong payload để sắp xếp theo range index id)
+
+    Returns:
+        Payload lưu vào Qdrant (point không thuộc nhóm nào là point chính của nhóm của chính nó)
+    """
+    return {
+        "id": int(point_id),
+        "file_name": data["file_name"],
+        "file_type": data["file_type"],
+        "file_size_kb": float(data["file_size_kb"]),
+        "sample_rate": int(data["sample_rate"]),
+        "channel": int(data["channel"]),
+        "samples": int(data["samples"]),
+        "duration": float(data["duration"]),
+        "subtype": data["subtype"],
+        "category": data.get("category"),
+        "group_id": int(data.get("group_id", point_id)),
+        "is_canonical": bool(data.get("is_canonical", True))
+    }
+
+
+def build_point_vectors(vectors: Dict[str, np.ndarray], vector_sizes: Dict[str, int]) -> Any:
+    """
+    Tạo vector của point theo cấu trúc của collection
+
+    Args:
+        vectors: Vector đặc trưng theo phiên bản (kết quả extract_features["vectors"])
+        vector_sizes: Cấu trúc vector của collection (QdrantManager.get_vector_sizes)
+
+    Returns:
+        Dict named vector (chỉ gồm các phiên bản collection có), hoặc list nếu collection chỉ có vector không tên
+    """
+    if "" in vector_sizes:
+        return np.asarray(vectors[LEGACY_VECTOR_VERSION]).tolist()
+    return {version: np.asarray(vector).tolist() for version, vector in vectors.items() if version in vector_sizes}
+
+
+def build_search_filter(category: Optional[List[str]] = None, min_duration: Optional[float] = None,
+                        max_duration: Optional[float] = None, sample_rate: Optional[int] = None,
+                        channel: Optional[int] = None, collapse_duplicates: bool = False,
+                        exclude_group: Optional[int] = None,
+                        exclude_ids: Optional[List[int]] = None) -> Optional[models.Filter]:
+    """
+    Tạo filter theo payload cho truy vấn vector (Qdrant áp dụng filter trong lúc duyệt HNSW,
+    không lọc sau trên top-k toàn cục)
+    Args:
+        category: Danh sách category (tên thư mục con của dataset) được chấp nhận
+        min_duration, max_duration: Khoảng thời lượng (giây)
+        sample_rate: Tần số lấy mẫu
+        channel: Số kênh
+        collapse_duplicates: Chỉ trả về point chính của mỗi nhóm bản gần trùng lặp
+        exclude_group: Bỏ các point thuộc nhóm bản gần trùng lặp này (group_id)
+        exclude_ids: Bỏ các point có ID này (ví dụ các file khớp fingerprint đã đứng đầu kết quả)
+    Returns:
+        models.Filter, None nếu không có điều kiện nào
+    """
+    conditions = []
+    if category:
+        conditions.append(models.FieldCondition(key="category", match=models.MatchAny(any=list(category))))
+    if min_duration is not None or max_duration is not None:
+        conditions.append(models.FieldCondition(
+            key="duration", range=models.Range(gte=min_duration, lte=max_duration)))
+    if sample_rate is not None:
+        conditions.append(models.FieldCondition(key="sample_rate", match=models.MatchValue(value=sample_rate)))
+    if channel is not None:
+        conditions.append(models.FieldCondition(key="channel", match=models.MatchValue(value=channel)))
+    must_not = [NOT_CANONICAL] if collapse_duplicates else []
+    if exclude_group is not None:
+        must_not.append(models.FieldCondition(key="group_id", match=models.MatchValue(value=exclude_group)))
+    if exclude_ids:
+        must_not.append(models.HasIdCondition(has_id=list(exclude_ids)))
+    if not conditions and not must_not:
+        return None
+    return models.Filter(must=conditions or None, must_not=must_not or None)
+
+
+def build_search_params(hnsw_ef: Optional[int] = None, exact: bool = False) -> Optional[models.SearchParams]:
+    """
+    Tạo tham số tìm kiếm cho truy vấn vector
+    Args:
+        hnsw_ef: Số ứng viên duyệt trong HNSW (lớn hơn: recall cao hơn, chậm hơn; None: mặc định của Qdrant)
+        exact: Bỏ qua chỉ mục HNSW, so sánh với mọi vector (kết quả chính xác, chậm nhất)
+    Returns:
+        models.SearchParams, None nếu dùng mặc định
+    """
+    if hnsw_ef is None and not exact:
+        return None
+    return models.SearchParams(hnsw_ef=hnsw_ef, exact=exact)
+
+
+def default_hnsw_config() -> models.HnswConfigDiff:
+    """ Cấu hình chỉ mục HNSW của collection mới (HNSW_M, HNSW_EF_CONSTRUCT, HNSW_FULL_SCAN_THRESHOLD) """
+    return models.HnswConfigDiff(
+        m=HNSW_M,  # Số kết nối tối đa mỗi node
+        ef_construct=HNSW_EF_CONSTRUCT,  # Số neighbor khi xây dựng chỉ mục
+        full_scan_threshold=HNSW_FULL_SCAN_THRESHOLD  # Ngưỡng để dùng tìm kiếm toàn bộ
+    )
+
+
+def build_query(query: Union[np.ndarray, int]) -> Union[List[float], int]:
+    """ Truy vấn của query_points: vector đặc trưng, hoặc ID của point để Qdrant dùng lại vector đã lưu """
+    if isinstance(query, (int, np.integer)):
+        return int(query)
+    return np.asarray(query, dtype=np.float32).tolist()
+
+
+def payload_to_result(payload: Dict[str, Any], similarity: float) -> Dict[str, Any]:
+    """
+    Chuyển payload của point thành kết quả tìm kiếm
+    Args:
+        payload: Payload của point trong Qdrant
+        similarity: Điểm số tương đồng
+    Returns:
+        Dict kết quả tìm kiếm
+    """
+    return {
+        "file_name": payload["file_name"],
+        "file_type": payload["file_type"],
+        "file_size_kb": payload["file_size_kb"],
+        "sample_rate": payload["sample_rate"],
+        "channel": payload["channel"],
+        "samples": payload["samples"],
+        "duration": payload["duration"],
+        "subtype": payload["subtype"],
+        "category": payload.get("category"),
+        "group_id": payload.get("group_id"),
+        "similarity": similarity
+    }
+
 
 class QdrantManager:
     """
     Quản lý Qdrant vector database
     """
 
-    def __init__(self):
-        # Khởi tạo kết nối đến Qdrant server
-        self.client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
-        self.collection_name = QDRANT_COLLECTION_NAME
+    def __init__(self, collection_name: Optional[str] = None):
+        # Dùng chung kết nối đến Qdrant server (hoặc Qdrant trong tiến trình)
+        self.client = get_qdrant_client()
+        # Tên collection hoặc alias (QDRANT_COLLECTION_NAME là alias khi index bằng build-then-swap)
+        self.collection_name = collection_name or QDRANT_COLLECTION_NAME
+        # Cấu trúc vector của collection (đọc khi cần, đọc lại khi truy vấn lỗi vì alias đã chuyển)
+        self._vector_sizes: Optional[Dict[str, int]] = None
 
-    def create_collection(self, vector_size: int, recreate_collection: bool = False):
+    def create_collection(self, vector_sizes: Dict[str, int], recreate_collection: bool = False,
+                          hnsw_config: Optional[models.HnswConfigDiff] = None):
         """
         Tạo collection trong Qdrant, tùy chọn xóa collection cũ nếu đã tồn tại
         Args:
-            vector_size: Kích thước của vector đặc trưng
+            vector_sizes: Kích thước vector của từng phiên bản (mỗi phiên bản là một named vector)
             recreate_collection: Nếu True, xóa và tạo lại collection
+            hnsw_config: Cấu hình HNSW của collection mới (mặc định: default_hnsw_config)
         """
         try:
-            # Kiểm tra xem collection đã tồn tại chưa
-            collections = self.client.get_collections()
-            collection_names = [collection.name for collection in collections.collections]
+            # Kiểm tra xem collection (hoặc alias) đã tồn tại chưa
+            exists = self.client.collection_exists(self.collection_name)
 
-            if self.collection_name in collection_names and recreate_collection:
-                # Xóa collection cũ nếu yêu cầu
-                self.client.delete_collection(collection_name=self.collection_name)
-                logger.info(f"Đã xóa collection cũ: {self.collection_name}")
+            if exists and recreate_collection:
+                # Xóa collection cũ nếu yêu cầu (nếu là alias thì xóa collection mà alias trỏ tới)
+                target = self.get_alias_target(self.collection_name) or self.collection_name
+                self.client.delete_collection(collection_name=target)
+                logger.info(f"Đã xóa collection cũ: {target}")
 
-            if self.collection_name not in collection_names or recreate_collection:
+            if not exists or recreate_collection:
                 # Tạo collection mới với cấu hình HNSW
                 self.client.create_collection(
                     collection_name=self.collection_name,
-                    vectors_config=models.VectorParams(
-                        size=vector_size,
-                        distance=models.Distance.COSINE,
-                        on_disk=True  # Lưu vector trên đĩa để tiết kiệm RAM
-                    ),
-                    hnsw_config=models.HnswConfigDiff(
-                        m=16,  # Số kết nối tối đa mỗi node
-                        ef_construct=100,  # Số neighbor khi xây dựng chỉ mục
-                        full_scan_threshold=10000  # Ngưỡng để dùng tìm kiếm toàn bộ
-                    )
-                )
-                # Tạo range index cho trường id
-                self.client.create_payload_index(
-                    collection_name=self.collection_name,
-                    field_name="id",
-                    field_schema=models.PayloadSchemaType.INTEGER
-                )
-                # Tạo index cho trường file_name để tối ưu tìm kiếm chuỗi
-                self.client.create_payload_index(
-                    collection_name=self.collection_name,
-                    field_name="file_name",
-                    field_schema=models.PayloadSchemaType.KEYWORD
+                    vectors_config={
+                        version: models.VectorParams(
+                            size=size,
+                            distance=models.Distance.COSINE,
+                            on_disk=True  # Lưu vector trên đĩa để tiết kiệm RAM
+                        )
+                        for version, size in vector_sizes.items()
+                    },
+                    hnsw_config=hnsw_config or default_hnsw_config()
                 )
+                self.create_payload_indexes()
                 logger.info(
-                    f"Đã tạo collection mới {self.collection_name} với vector size {vector_size}, range index cho id và keyword index cho file_name")
+                    f"Đã tạo collection mới {self.collection_name} với các vector {vector_sizes} và các payload index")
             else:
+                # Collection cũ có thể chưa có các index được thêm sau
+                self.create_payload_indexes()
                 logger.info(f"Collection {self.collection_name} đã tồn tại, tiếp tục sử dụng")
+            self._vector_sizes = None
         except Exception as e:
             logger.error(f"Lỗi khi tạo collection: {str(e)}")
             raise
 
+    def get_vector_sizes(self, refresh: bool = False) -> Dict[str, int]:
+        """
+        Cấu trúc vector của collection (có cache)
+        Args:
+            refresh: Đọc lại từ Qdrant thay vì dùng cache
+        Returns:
+            Dictionary phiên bản -> kích thước vector; key "" nếu collection chỉ có vector không tên (kiểu cũ)
+        """
+        if self._vector_sizes is None or refresh:
+            vectors = self.client.get_collection(self.collection_name).config.params.vectors
+            if isinstance(vectors, dict):
+                self._vector_sizes = {version: params.size for version, params in vectors.items()}
+            else:
+                self._vector_sizes = {"": vectors.size}
+        return self._vector_sizes
+
+    def get_vector_versions(self) -> List[str]:
+        """ Các phiên bản vector mà collection có (vector không tên được coi là LEGACY_VECTOR_VERSION) """
+        return [version or LEGACY_VECTOR_VERSION for version in self.get_vector_sizes()]
+
+    def resolve_vector_name(self, vector_version: str) -> Optional[str]:
+        """
+        Tên named vector dùng để truy vấn một phiên bản
+        Returns:
+            Tên vector, None với vector không tên của collection kiểu cũ
+        Raises:
+            VectorVersionNotFound: Collection không có phiên bản này
+        """
+        # Đọc lại cấu trúc vector trước khi báo lỗi: phiên bản có thể vừa được thêm (alias đã chuyển)
+        for refresh in (False, True):
+            vector_sizes = self.get_vector_sizes(refresh=refresh)
+            if vector_version in vector_sizes:
+                return vector_version
+            if "" in vector_sizes and vector_version == LEGACY_VECTOR_VERSION:
+                return None
+        raise VectorVersionNotFound(
+            f"Collection {self.collection_name} không có vector phiên bản {vector_version} "
+            f"(hiện có: {', '.join(self.get_vector_versions())})")
+
+    def _with_vector_layout(self, func):
+        """
+        Gọi func; nếu lỗi khi đang dùng cấu trúc vector đã cache (alias có thể vừa chuyển sang
+        collection có cấu trúc khác) thì đọc lại cấu trúc vector và thử lại một lần
+        """
+        cached = self._vector_sizes is not None
+        try:
+            return func()
+        except Exception:
+            if not cached:
+                raise
+            self.get_vector_sizes(refresh=True)
+            return func()
+
+    def create_payload_indexes(self):
+        """
+        Tạo các payload index (bỏ qua index đã có): range index cho id, keyword index cho file_name
+        và các trường dùng để lọc khi tìm kiếm
+        """
+        schema = self.client.get_collection(self.collection_name).payload_schema
+        for field_name, field_schema in PAYLOAD_INDEXES.items():
+            if field_name not in schema:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema
+                )
+
+    def get_alias_target(self, alias_name: str) -> Optional[str]:
+        """
+        Lấy tên collection mà alias đang trỏ tới
+        Returns:
+            Tên collection, None nếu alias không tồn tại
+        """
+        for alias in self.client.get_aliases().aliases:
+            if alias.alias_name == alias_name:
+                return alias.collection_name
+        return None
+
+    def swap_alias(self, alias_name: str, delete_old: bool = True) -> Optional[str]:
+        """
+        Chuyển alias sang collection hiện tại trong một thao tác nguyên tử (xóa alias cũ và tạo alias mới
+        trong cùng một request), sau đó xóa collection cũ nếu được yêu cầu
+        Args:
+            alias_name: Tên alias mà API đang truy vấn (thường là QDRANT_COLLECTION_NAME)
+            delete_old: Xóa collection mà alias trỏ tới trước đó
+        Returns:
+            Tên collection cũ (None nếu trước đó chưa có)
+        """
+        try:
+            old_collection = self.get_alias_target(alias_name)
+            operations = []
+            if old_collection is not None:
+                operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias_name)))
+            elif self.client.collection_exists(alias_name):
+                # Collection thật trùng tên alias (index theo kiểu cũ): phải xóa trước khi tạo alias,
+                # tìm kiếm sẽ gián đoạn trong khoảnh khắc giữa hai thao tác
+                logger.warning(f"Xóa collection {alias_name} để thay bằng alias cùng tên")
+                self.client.delete_collection(collection_name=alias_name)
+            operations.append(models.CreateAliasOperation(
+                create_alias=models.CreateAlias(collection_name=self.collection_name, alias_name=alias_name)))
+            self.client.update_collection_aliases(change_aliases_operations=operations)
+            logger.info(f"Alias {alias_name} đã chuyển sang collection {self.collection_name}")
+            if delete_old and old_collection and old_collection != self.collection_name:
+                self.client.delete_collection(collection_name=old_collection)
+                logger.info(f"Đã xóa collection cũ: {old_collection}")
+            return old_collection
+        except Exception as e:
+            logger.error(f"Lỗi khi chuyển alias {alias_name}: {str(e)}")
+            raise
+
     def check_existing_files(self, file_paths: List[str]) -> List[str]:
         """
         Kiểm tra các file_path đã tồn tại trong collection
@@ -140,11 +430,13 @@ class QdrantManager:
             if not feature_dict:
                 logger.warning("Không có vectors để chèn")
                 return
-            # Lấy kích thước vector từ item đầu tiên
+            # Lấy kích thước vector của từng phiên bản từ item đầu tiên
             first_item = next(iter(feature_dict.values()))
-            vector_size = len(first_item["vector"])
+            vector_sizes = {version: len(vector) for version, vector in first_item["vectors"].items()}
             # Tạo collection (xóa nếu recreate_collection=True)
-            self.create_collection(vector_size, recreate_collection=recreate_collection)
+            self.create_collection(vector_sizes, recreate_collection=recreate_collection)
+            # Collection đã có sẵn có thể có cấu trúc vector khác (kiểu cũ hoặc thiếu phiên bản mới)
+            vector_sizes = self.get_vector_sizes(refresh=True)
             # Kiểm tra file đã tồn tại (bỏ qua nếu recreate_collection=True)
             file_paths = list(feature_dict.keys())
             if recreate_collection:
@@ -159,22 +451,15 @@ class QdrantManager:
                 return
             # Lấy ID bắt đầu
             start_id = self.get_next_id()
+            if DEDUP_ENABLED:
+                self.assign_duplicate_groups([(start_id + i, data) for i, data in enumerate(new_feature_dict.values())])
             # Chuẩn bị dữ liệu để chèn
             points = []
             for i, (file_path, data) in enumerate(new_feature_dict.items()):
                 points.append(models.PointStruct(
                     id=start_id + i,
-                    vector=data["vector"].tolist(),
-                    payload={
-                        "file_name": data["file_name"],
-                        "file_type": data["file_type"],
-                        "file_size_kb": float(data["file_size_kb"]),
-                        "sample_rate": int(data["sample_rate"]),
-                        "channel": int(data["channel"]),
-                        "samples": int(data["samples"]),
-                        "duration": float(data["duration"]),
-                        "subtype": data["subtype"]
-                    }
+                    vector=build_point_vectors(data["vectors"], vector_sizes),
+                    payload=build_payload(data, start_id + i)
                 ))
             # Thực hiện upsert (insert hoặc update)
             operation_info = self.client.upsert(
@@ -187,41 +472,407 @@ class QdrantManager:
             logger.error(f"Lỗi khi chèn vectors: {str(e)}")
             raise
 
-    def search_similar(self, query_vector: np.ndarray, top_k: int = TOP_K) -> List[Dict[str, Any]]:
+    def upsert_points(self, points_data: Dict[int, Dict], batch_size: int = 256, dedup: bool = DEDUP_ENABLED):
+        """
+        Ghi (insert hoặc cập nhật) vectors với ID cho trước, tạo collection nếu chưa có
+        Args:
+            points_data: Dictionary với key là ID của point, value là dict chứa vector và metadata
+            batch_size: Số point mỗi lần gọi upsert
+            dedup: Gộp các bản gần trùng lặp vào nhóm (assign_duplicate_groups)
+        """
+        try:
+            if not points_data:
+                return
+            first_item = next(iter(points_data.values()))
+            self.create_collection({version: len(vector) for version, vector in first_item["vectors"].items()})
+            vector_sizes = self.get_vector_sizes(refresh=True)
+            items = list(points_data.items())
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                if dedup:
+                    self.assign_duplicate_groups(batch)
+                points = [
+                    models.PointStruct(id=point_id, vector=build_point_vectors(data["vectors"], vector_sizes),
+                                       payload=build_payload(data, point_id))
+                    for point_id, data in batch
+                ]
+                self.client.upsert(collection_name=self.collection_name, points=points)
+                if dedup:
+                    # Point được ghi lại (file thay đổi) có thể từng là point chính của một nhóm
+                    self.promote_group_members([point_id for point_id, data in batch if not data["is_canonical"]])
+            logger.info(f"Đã ghi {len(items)} vectors vào database")
+        except Exception as e:
+            logger.error(f"Lỗi khi ghi vectors: {str(e)}")
+            raise
+
+    def assign_duplicate_groups(self, items: List[Tuple[int, Dict]]):
+        """
+        Gộp các point sắp được ghi vào nhóm bản gần trùng lặp: point có độ tương đồng (vector DEDUP_VECTOR_VERSION)
+        >= DEDUP_THRESHOLD và thời lượng gần bằng với một point chính (trong collection hoặc trước nó trong
+        cùng batch) thuộc nhóm của point đó, ngược lại là point chính của nhóm mới.
+        Ghi kết quả vào data["group_id"] và data["is_canonical"]
+        Args:
+            items: Danh sách (ID của point, dict chứa vectors và metadata)
+        """
+        for point_id, data in items:
+            data["group_id"], data["is_canonical"] = point_id, True
+        items = [(point_id, data) for point_id, data in items if DEDUP_VECTOR_VERSION in data["vectors"]]
+        if not items:
+            return
+
+        def same_duration(a: float, b: float) -> bool:
+            return abs(a - b) <= DEDUP_DURATION_TOLERANCE * max(a, b)
+
+        # Point chính đã có trong collection (một lần gọi batch cho cả batch)
+        try:
+            using = self.resolve_vector_name(DEDUP_VECTOR_VERSION)
+            responses = self.client.query_batch_points(collection_name=self.collection_name, requests=[
+                models.QueryRequest(
+                    query=np.asarray(data["vectors"][DEDUP_VECTOR_VERSION], dtype=np.float32).tolist(),
+                    using=using,
+                    limit=3,
+                    score_threshold=DEDUP_THRESHOLD,
+                    filter=models.Filter(must_not=[NOT_CANONICAL, models.HasIdCondition(has_id=[point_id])]),
+                    with_payload=["duration"]
+                )
+                for point_id, data in items
+            ])
+        except VectorVersionNotFound:
+            responses = [None] * len(items)
+
+        # Point chính mới trong batch: (ID, vector, thời lượng)
+        canonical: List[Tuple[int, np.ndarray, float]] = []
+        for (point_id, data), response in zip(items, responses):
+            vector = np.asarray(data["vectors"][DEDUP_VECTOR_VERSION], dtype=np.float32)
+            duration = float(data["duration"])
+            hits = [hit.id for hit in (response.points if response else [])
+                    if same_duration(hit.payload.get("duration", 0.0), duration)]
+            if not hits and canonical:
+                similarities = np.stack([other for _, other, _ in canonical]) @ vector
+                hits = [canonical[i][0] for i in np.argsort(-similarities)
+                        if similarities[i] >= DEDUP_THRESHOLD and same_duration(canonical[i][2], duration)]
+            if hits:
+                data["group_id"], data["is_canonical"] = int(hits[0]), False
+            else:
+                canonical.append((point_id, vector, duration))
+        duplicates = sum(1 for _, data in items if not data["is_canonical"])
+        if duplicates:
+            logger.info(f"Phát hiện {duplicates}/{len(items)} bản gần trùng lặp")
+
+    def promote_group_members(self, point_ids: List[int]):
+        """
+        Với mỗi point trong point_ids (sắp bị xóa hoặc không còn là point chính), chọn thành viên có ID nhỏ nhất
+        còn lại trong nhóm của nó làm point chính mới và chuyển các thành viên khác sang nhóm đó
+        Args:
+            point_ids: ID của các point chính cũ
+        """
+        if not point_ids:
+            return
+        members: Dict[int, List[int]] = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=models.Filter(
+                    must=[models.FieldCondition(key="group_id", match=models.MatchAny(any=list(point_ids)))],
+                    must_not=[models.HasIdCondition(has_id=list(point_ids))]
+                ),
+                limit=1000,
+                offset=offset,
+                with_payload=["group_id"],
+                with_vectors=False
+            )
+            for point in points:
+                members.setdefault(point.payload["group_id"], []).append(point.id)
+            if offset is None:
+                break
+        for ids in members.values():
+            head = min(ids)
+            self.client.set_payload(collection_name=self.collection_name,
+                                    payload={"group_id": head, "is_canonical": True}, points=[head])
+            if len(ids) > 1:
+                self.client.set_payload(collection_name=self.collection_name, payload={"group_id": head},
+                                        points=[point_id for point_id in ids if point_id != head])
+        if members:
+            logger.info(f"Đã chọn point chính mới cho {len(members)} nhóm bản gần trùng lặp")
+
+    def update_vectors(self, vectors: Dict[int, np.ndarray], vector_version: str):
+        """
+        Ghi (thêm hoặc thay) một phiên bản vector của các point đã có, giữ nguyên payload và các vector khác
+        Args:
+            vectors: Dictionary với key là ID của point, value là vector
+            vector_version: Phiên bản vector (named vector phải có trong collection)
+        """
+        try:
+            if not vectors:
+                return
+            self.client.update_vectors(
+                collection_name=self.collection_name,
+                points=[
+                    models.PointVectors(id=point_id, vector={vector_version: np.asarray(vector).tolist()})
+                    for point_id, vector in vectors.items()
+                ]
+            )
+        except Exception as e:
+            logger.error(f"Lỗi khi cập nhật vectors {vector_version}: {str(e)}")
+            raise
+
+    def delete_points(self, point_ids: List[int]):
+        """
+        Xóa các point theo ID
+        Args:
+            point_ids: Danh sách ID cần xóa
+        """
+        try:
+            if not point_ids:
+                return
+            self.promote_group_members(list(point_ids))
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.PointIdsList(points=list(point_ids))
+            )
+            logger.info(f"Đã xóa {len(point_ids)} vectors khỏi database")
+        except Exception as e:
+            logger.error(f"Lỗi khi xóa vectors: {str(e)}")
+            raise
+
+    def get_point_file_names(self) -> Dict[int, str]:
+        """
+        Lấy ánh xạ ID -> file_name của toàn bộ points (không tải vector)
+        Returns:
+            Dictionary với key là ID của point, value là file_name
+        """
+        try:
+            if not self.client.collection_exists(self.collection_name):
+                return {}
+            file_names: Dict[int, str] = {}
+            offset = None
+            while True:
+                points, offset = self.client.scroll(
+                    collection_name=self.collection_name,
+                    limit=1000,
+                    offset=offset,
+                    with_payload=["file_name"],
+                    with_vectors=False
+                )
+                for point in points:
+                    file_names[point.id] = point.payload.get("file_name")
+                if offset is None:
+                    return file_names
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy danh sách file trong collection: {str(e)}")
+            raise
+
+    def get_payloads(self, point_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Lấy payload của các point theo ID (không tải vector)
+        Args:
+            point_ids: Danh sách ID
+        Returns:
+            Dictionary với key là ID của point, value là payload (point không tồn tại bị bỏ qua)
+        """
+        try:
+            if not point_ids:
+                return {}
+            points = self.client.retrieve(collection_name=self.collection_name, ids=list(point_ids),
+                                          with_payload=True, with_vectors=False)
+            return {point.id: point.payload for point in points}
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy payload của points: {str(e)}")
+            raise
+
+    def score_points(self, query_vector: np.ndarray, point_ids: List[int],
+                     vector_version: str = SEARCH_VECTOR_VERSION) -> Dict[int, Tuple[Dict[str, Any], float]]:
+        """
+        Payload và độ tương đồng cosine (cùng thang điểm với search_similar) giữa vector truy vấn và vector đã lưu
+        của các point cho trước, không duyệt chỉ mục
+        Args:
+            query_vector: Vector đặc trưng của truy vấn
+            point_ids: Danh sách ID
+            vector_version: Phiên bản vector được so sánh
+        Returns:
+            Dictionary với key là ID của point, value là (payload, độ tương đồng); point không tồn tại
+            hoặc chưa có vector phiên bản này bị bỏ qua
+        """
+        try:
+            if not point_ids:
+                return {}
+
+            def retrieve():
+                vector_name = self.resolve_vector_name(vector_version)
+                return vector_name, self.client.retrieve(collection_name=self.collection_name, ids=list(point_ids),
+                                                         with_payload=True,
+                                                         with_vectors=[vector_name] if vector_name else True)
+
+            vector_name, points = self._with_vector_layout(retrieve)
+            query = np.asarray(query_vector, dtype=np.float32)
+            query = query / np.linalg.norm(query)
+            scores = {}
+            for point in points:
+                vector = point.vector.get(vector_name) if isinstance(point.vector, dict) else point.vector
+                if vector is None:
+                    continue
+                vector = np.asarray(vector, dtype=np.float32)
+                scores[point.id] = (point.payload, float(vector @ query / np.linalg.norm(vector)))
+            return scores
+        except Exception as e:
+            logger.error(f"Lỗi khi tính độ tương đồng của points: {str(e)}")
+            raise
+
+    def find_point(self, point_id: Optional[int] = None, file_name: Optional[str] = None,
+                   vector_version: str = SEARCH_VECTOR_VERSION) -> Optional[Dict[str, Any]]:
+        """
+        Tìm một point theo ID hoặc file_name (khớp chính xác, point có ID nhỏ nhất nếu nhiều file cùng tên)
+        Args:
+            point_id: ID của point
+            file_name: Tên file (dùng khi không có point_id)
+            vector_version: Phiên bản vector cần kiểm tra
+        Returns:
+            {"id", "payload", "has_vector" (point đã có vector phiên bản này)}, None nếu không tìm thấy
+        """
+        try:
+            vector_name = self.resolve_vector_name(vector_version)
+            with_vectors = [vector_name] if vector_name else True
+            if point_id is not None:
+                points = self.client.retrieve(collection_name=self.collection_name, ids=[point_id],
+                                              with_payload=True, with_vectors=with_vectors)
+            else:
+                points, _ = self.client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=models.Filter(must=[
+                        models.FieldCondition(key="file_name", match=models.MatchValue(value=file_name))
+                    ]),
+                    limit=1,
+                    with_payload=True,
+                    with_vectors=with_vectors
+                )
+            if not points:
+                return None
+            point = points[0]
+            has_vector = vector_name in point.vector if isinstance(point.vector, dict) else point.vector is not None
+            return {"id": point.id, "payload": point.payload, "has_vector": bool(has_vector)}
+        except Exception as e:
+            logger.error(f"Lỗi khi tìm point: {str(e)}")
+            raise
+
+    def search_similar(self, query_vector: Union[np.ndarray, int], top_k: int = TOP_K, offset: int = 0,
+                       score_threshold: Optional[float] = None,
+                       query_filter: Optional[models.Filter] = None,
+                       vector_version: str = SEARCH_VECTOR_VERSION,
+                       search_params: Optional[models.SearchParams] = None) -> List[Dict[str, Any]]:
         """
         Tìm kiếm các vectors tương tự nhất
         Args:
-            query_vector: Vector đặc trưng cần tìm kiếm
+            query_vector: Vector đặc trưng cần tìm kiếm, hoặc ID của point (dùng vector đã lưu của point,
+                bản thân point không có trong kết quả)
             top_k: Số lượng kết quả trả về
+            offset: Số kết quả đầu tiên bỏ qua (phân trang, Qdrant xử lý phía server)
+            score_threshold: Chỉ trả về kết quả có độ tương đồng >= ngưỡng này
+            query_filter: Filter theo payload (build_search_filter)
+            vector_version: Phiên bản vector được truy vấn (query_vector phải cùng phiên bản)
+            search_params: Tham số tìm kiếm hnsw_ef/exact (build_search_params)
         Returns:
             Danh sách các file tương tự nhất kèm theo độ tương đồng
         """
         try:
-            # Sửa lại cú pháp gọi API theo phiên bản Qdrant mới nhất
-            search_results = self.client.search(
+            response = self._with_vector_layout(lambda: self.client.query_points(
                 collection_name=self.collection_name,
-                query_vector=query_vector.tolist(),
-                limit=top_k
-            )
+                query=build_query(query_vector),
+                using=self.resolve_vector_name(vector_version),
+                limit=top_k,
+                offset=offset,
+                score_threshold=score_threshold,
+                query_filter=query_filter,
+                search_params=search_params,
+                with_payload=True
+            ))
             # Chuyển đổi kết quả thành định dạng dễ sử dụng hơn
-            results = []
-            for hit in search_results:
-                results.append({
-                    "file_name": hit.payload["file_name"],
-                    "file_type": hit.payload["file_type"],
-                    "file_size_kb": hit.payload["file_size_kb"],
-                    "sample_rate": hit.payload["sample_rate"],
-                    "channel": hit.payload["channel"],
-                    "samples": hit.payload["samples"],
-                    "duration": hit.payload["duration"],
-                    "subtype": hit.payload["subtype"],
-                    "similarity": hit.score
-                })
-            return results
+            return [payload_to_result(hit.payload, hit.score) for hit in response.points]
         except Exception as e:
             logger.error(f"Lỗi khi tìm kiếm vectors tương tự: {str(e)}")
             raise
 
+    def search_similar_batch(self, queries: List[Dict[str, Any]],
+                             return_exceptions: bool = False) -> List[Union[List[Dict[str, Any]], Exception]]:
+        """
+        Tìm kiếm nhiều vector trong một lần gọi Qdrant
+        Args:
+            queries: Danh sách dict tham số của search_similar (query_vector, top_k, offset, score_threshold,
+                query_filter, vector_version, search_params)
+            return_exceptions: Truy vấn không hợp lệ (phiên bản vector không có) nhận lỗi của riêng nó thay cho
+                kết quả, các truy vấn còn lại vẫn được gửi; nếu False thì lỗi được raise
+        Returns:
+            Danh sách kết quả (hoặc lỗi) theo đúng thứ tự các truy vấn
+        """
+        try:
+            def query_batch():
+                results: List[Any] = [None] * len(queries)
+                requests, positions = [], []
+                for position, query in enumerate(queries):
+                    try:
+                        using = self.resolve_vector_name(query.get("vector_version") or SEARCH_VECTOR_VERSION)
+                    except VectorVersionNotFound as e:
+                        if not return_exceptions:
+                            raise
+                        results[position] = e
+                        continue
+                    requests.append(models.QueryRequest(
+                        query=build_query(query["query_vector"]),
+                        using=using,
+                        limit=query.get("top_k", TOP_K),
+                        offset=query.get("offset", 0),
+                        score_threshold=query.get("score_threshold"),
+                        filter=query.get("query_filter"),
+                        params=query.get("search_params"),
+                        with_payload=True
+                    ))
+                    positions.append(position)
+                if requests:
+                    responses = self.client.query_batch_points(
+                        collection_name=self.collection_name,
+                        requests=requests
+                    )
+                    for position, response in zip(positions, responses):
+                        results[position] = [payload_to_result(hit.payload, hit.score) for hit in response.points]
+                return results
+
+            return self._with_vector_layout(query_batch)
+        except Exception as e:
+            logger.error(f"Lỗi khi tìm kiếm batch vectors tương tự: {str(e)}")
+            raise
+
+    def search_neighbors(self, point_ids: List[int], limit: int, vector_version: str,
+                         batch_size: int = 256) -> Dict[int, List[Tuple[int, float]]]:
+        """
+        Tìm láng giềng gần nhất của các point đã có trong collection (truy vấn theo ID, không tải vector về)
+        Args:
+            point_ids: Danh sách ID của point
+            limit: Số láng giềng mỗi point (bản thân point không có trong kết quả)
+            vector_version: Phiên bản vector dùng để tính độ tương đồng
+            batch_size: Số truy vấn mỗi lần gọi query_batch_points
+        Returns:
+            Dictionary với key là ID của point, value là danh sách (ID láng giềng, độ tương đồng) giảm dần
+        """
+        try:
+            def query_batch():
+                using = self.resolve_vector_name(vector_version)
+                neighbors: Dict[int, List[Tuple[int, float]]] = {}
+                for start in range(0, len(point_ids), batch_size):
+                    batch = [int(point_id) for point_id in point_ids[start:start + batch_size]]
+                    responses = self.client.query_batch_points(
+                        collection_name=self.collection_name,
+                        requests=[models.QueryRequest(query=point_id, using=using, limit=limit, with_payload=False)
+                                  for point_id in batch]
+                    )
+                    for point_id, response in zip(batch, responses):
+                        neighbors[point_id] = [(int(hit.id), float(hit.score)) for hit in response.points]
+                return neighbors
+
+            return self._with_vector_layout(query_batch)
+        except Exception as e:
+            logger.error(f"Lỗi khi tìm láng giềng của points: {str(e)}")
+            raise
+
     def search_by_filename(self, query_string: str, limit: int = 10) -> List[Dict[str, Any]]:
         """
         Tìm kiếm các vector có file_name chứa query_string (so sánh không phân biệt hoa/thường)
@@ -248,21 +899,8 @@ class QdrantManager:
                 limit=limit,
                 with_payload=True
             )
-            # Chuyển đổi kết quả
-            results = []
-            for point in result[0]:
-                results.append({
-                    "file_name": point.payload["file_name"],
-                    "file_type": point.payload["file_type"],
-                    "file_size_kb": point.payload["file_size_kb"],
-                    "sample_rate": point.payload["sample_rate"],
-                    "channel": point.payload["channel"],
-                    "samples": point.payload["samples"],
-                    "duration": point.payload["duration"],
-                    "subtype": point.payload["subtype"],
-                    "similarity": 1.0  # Giả định similarity = 1.0 vì là tìm kiếm chính xác
-                })
-            return results
+            # Chuyển đổi kết quả, giả định similarity = 1.0 vì là tìm kiếm chính xác
+            return [payload_to_result(point.payload, 1.0) for point in result[0]]
         except Exception as e:
             logger.error(f"Lỗi khi tìm kiếm theo file_name: {str(e)}")
             raise
@@ -275,10 +913,23 @@ class QdrantManager:
         """
         try:
             collection_info = self.client.get_collection(collection_name=self.collection_name)
+            points_count = getattr(collection_info, 'points_count', 0)
+            # Số point đã có vector của từng phiên bản (phiên bản đang backfill sẽ ít hơn points_count)
+            vectors = {}
+            for version in self.get_vector_sizes(refresh=True):
+                if version:
+                    vectors[version] = self.client.count(
+                        collection_name=self.collection_name,
+                        count_filter=models.Filter(must=[models.HasVectorCondition(has_vector=version)]),
+                        exact=True
+                    ).count
+                else:
+                    vectors[LEGACY_VECTOR_VERSION] = points_count
             return {
                 "name": self.collection_name,
-                "points_count": getattr(collection_info, 'points_count', 0),
-                "status": collection_info.status
+                "points_count": points_count,
+                "status": collection_info.status,
+                "vectors": vectors
             }
         except UnexpectedResponse:
             # Collection không tồn tại
@@ -0,0 +1,153 @@
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+from qdrant_client.http import models
+
+from app.config import (TOP_K, SEARCH_VECTOR_VERSION, SEARCH_BATCHING_ENABLED, SEARCH_BATCH_WINDOW_MS, SEARCH_BATCH_MAX_SIZE,
+                        SEARCH_BATCH_MAX_INFLIGHT)
+from app.database.qdrant_manager import QdrantManager
+from app.utils.metrics import QDRANT_SEARCH_SECONDS, SEARCH_BATCH_SIZE, SEARCH_BATCH_WAIT_SECONDS
+from app.utils.profiling import run_in_threadpool, current_profiler, attach_thread
+
+logger = logging.getLogger(__name__)
+
+
+class SearchBatcher:
+    """
+    Gom các truy vấn search_similar đồng thời thành một lần gọi query_batch_points.
+    Khi tải thấp, truy vấn được gửi ngay (không chờ); khi có tải đồng thời, truy vấn
+    được gom trong tối đa window_ms hoặc đến khi đủ max_batch_size.
+    """
+
+    def __init__(self, qdrant_manager: QdrantManager, enabled: bool = SEARCH_BATCHING_ENABLED,
+                 window_ms: float = SEARCH_BATCH_WINDOW_MS, max_batch_size: int = SEARCH_BATCH_MAX_SIZE,
+                 max_inflight: int = SEARCH_BATCH_MAX_INFLIGHT):
+        self.qdrant_manager = qdrant_manager
+        self.enabled = enabled
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_inflight = max_inflight
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._inflight: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._last_batch_size = 0
+
+    def _ensure_worker(self):
+        """ Khởi tạo hàng đợi và worker trên event loop hiện tại """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker is not None and not self._worker.done():
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._inflight = asyncio.Semaphore(self.max_inflight)
+        # Context rỗng: worker dùng chung cho mọi request, không mang contextvars (query_id, profile)
+        # của request đầu tiên
+        self._worker = loop.create_task(self._run(), context=contextvars.Context())
+
+    async def search_similar(self, query_vector: Union[np.ndarray, int], top_k: int = TOP_K, offset: int = 0,
+                             score_threshold: Optional[float] = None,
+                             query_filter: Optional[models.Filter] = None,
+                             vector_version: str = SEARCH_VECTOR_VERSION,
+                             search_params: Optional[models.SearchParams] = None) -> List[Dict[str, Any]]:
+        """
+        Tìm kiếm các vectors tương tự nhất (cùng tham số với QdrantManager.search_similar)
+
+        Raises:
+            VectorVersionNotFound: Collection không có phiên bản vector này (chỉ truy vấn này bị lỗi,
+                các truy vấn khác trong cùng batch vẫn nhận kết quả)
+        """
+        query = {
+            "query_vector": query_vector,
+            "top_k": top_k,
+            "offset": offset,
+            "score_threshold": score_threshold,
+            "query_filter": query_filter,
+            "vector_version": vector_version,
+            "search_params": search_params
+        }
+        if not self.enabled:
+            with QDRANT_SEARCH_SECONDS.labels(kind="single").time():
+                return await run_in_threadpool(self.qdrant_manager.search_similar, **query)
+
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._queue.put_nowait((query, future, time.perf_counter(), current_profiler()))
+        return await future
+
+    async def _run(self):
+        """ Vòng lặp gom truy vấn thành batch """
+        while True:
+            # Khi đủ số batch đang chạy, truy vấn mới tự tích lũy trong hàng đợi
+            await self._inflight.acquire()
+            batch = [await self._queue.get()]
+            # Chỉ chờ gom thêm khi đang có tải đồng thời để không tăng độ trễ lúc tải thấp
+            under_load = self._last_batch_size > 1 or not self._queue.empty()
+            deadline = self._loop.time() + self.window
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - self._loop.time()
+                if not under_load or remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self._last_batch_size = len(batch)
+            self._loop.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch: List[tuple]):
+        """ Gửi một batch đến Qdrant và trả kết quả về cho từng truy vấn """
+        try:
+            dispatched_at = time.perf_counter()
+            SEARCH_BATCH_SIZE.observe(len(batch))
+            for _, _, enqueued_at, _ in batch:
+                SEARCH_BATCH_WAIT_SECONDS.observe(dispatched_at - enqueued_at)
+            queries = [query for query, _, _, _ in batch]
+            # Thời gian của batch được tính cho mọi request đang được profile trong batch
+            search_batch = attach_thread(self.qdrant_manager.search_similar_batch,
+                                         {profiler for _, _, _, profiler in batch})
+            # Phiên bản vector được kiểm tra trong thread của batch (có thể phải đọc cấu trúc collection từ Qdrant),
+            # truy vấn không hợp lệ chỉ làm lỗi future của chính nó
+            with QDRANT_SEARCH_SECONDS.labels(kind="batch").time():
+                results = await run_in_threadpool(search_batch, queries, True)
+            for (_, future, _, _), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        except Exception as e:
+            logger.error(f"Lỗi khi tìm kiếm batch {len(batch)} truy vấn: {str(e)}")
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._inflight.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Lấy thống kê kích thước batch và thời gian chờ thêm (tóm tắt từ các histogram trong /metrics)
+        Returns:
+            Dict thống kê
+        """
+        batches = SEARCH_BATCH_SIZE.count
+        queries = int(SEARCH_BATCH_SIZE.sum)
+        return {
+            "enabled": self.enabled,
+            "batches": batches,
+            "queries": queries,
+            "avg_batch_size": queries / batches if batches else 0.0,
+            "avg_wait_seconds": SEARCH_BATCH_WAIT_SECONDS.sum / queries if queries else 0.0,
+            "batch_size_buckets": {
+                "+Inf" if bound == float("inf") else str(int(bound)): count
+                for bound, count in SEARCH_BATCH_SIZE.cumulative_counts()
+            },
+        }
@@ -1,14 +1,51 @@
+import hashlib
+import json
 import os
 import numpy as np
 import librosa
 import logging
-from typing import Tuple, List, Dict, Union
+from typing import Tuple, List, Dict, Union, Optional
 import soundfile as sf
+import soxr
+from scipy.ndimage import maximum_filter
 
-from app.config import SAMPLE_RATE, N_MFCC, HOP_LENGTH, N_FFT
+from app.config import SAMPLE_RATE, N_MFCC, HOP_LENGTH, N_FFT, PEAKS_BINS, FEATURE_VECTOR_VERSIONS, \
+    SEARCH_VECTOR_VERSION, SEQUENCE_N_COEFFS, SEQUENCE_POOL, SEQUENCE_MAX_FRAMES, LANDMARK_PEAKS_PER_SECOND, \
+    LANDMARK_FAN_OUT
+from app.utils.metrics import AUDIO_DECODE_SECONDS, FEATURE_EXTRACTION_SECONDS
+from app.utils.audio_utils import get_category
+from app.utils.landmark_utils import LANDMARK_DTYPE, get_landmarks_path, write_landmarks
+from app.utils.peaks_utils import get_peaks_path, write_peaks
+from app.utils.preview_utils import write_preview
+from app.utils.sequence_utils import get_sequence_path, write_sequence
 
 logger = logging.getLogger(__name__)
 
+# Các phiên bản vector đặc trưng: danh sách thành phần được nối lại theo thứ tự rồi chuẩn hóa L2.
+# Không sửa phiên bản đã có (vector trong collection sẽ không còn so sánh được), hãy thêm phiên bản mới
+FEATURE_VERSIONS = {
+    "v1": ["mfcc_mean", "spectral_contrast_mean", "chroma_mean"],
+    "v2": ["mfcc_mean", "mfcc_std", "spectral_contrast_mean", "chroma_mean"],
+}
+
+# Landmark: vùng lân cận (số bin tần số, số frame) khi tìm đỉnh phổ, ngưỡng (dB so với đỉnh lớn nhất),
+# vùng ghép cặp với đỉnh neo (độ lệch frame tối đa vừa 6 bit của hash, độ lệch bin tần số tối đa)
+LANDMARK_NEIGHBORHOOD = (15, 7)
+LANDMARK_FLOOR_DB = -60.0
+LANDMARK_MAX_DT = 63
+LANDMARK_MAX_DF = 256
+
+
+def combine_components(components: Dict[str, np.ndarray], versions: List[str]) -> Dict[str, np.ndarray]:
+    """ Nối các thành phần đặc trưng theo FEATURE_VERSIONS của từng phiên bản rồi chuẩn hóa L2 """
+    vectors = {}
+    for version in versions:
+        # Kết hợp các đặc trưng và chuẩn hóa
+        combined_features = np.concatenate([components[component] for component in FEATURE_VERSIONS[version]])
+        vectors[version] = combined_features / np.linalg.norm(combined_features)
+    return vectors
+
+
 class AudioFeatureExtractor:
     """
     Trích xuất đặc trưng từ file audio
@@ -20,6 +57,39 @@ class AudioFeatureExtractor:
         self.hop_length = HOP_LENGTH
         self.n_fft = N_FFT
 
+    def fingerprint(self, version: str = SEARCH_VECTOR_VERSION) -> Dict:
+        """
+        Cấu hình của một phiên bản vector; vector chỉ so sánh được với nhau khi fingerprint giống nhau
+
+        Args:
+            version: Phiên bản vector (key của FEATURE_VERSIONS)
+
+        Returns:
+            Dictionary chứa cấu hình, hash SHA-1 của cấu hình, phiên bản vector và phiên bản librosa
+            (chỉ để tham khảo)
+        """
+        config = {
+            "features": FEATURE_VERSIONS[version],
+            "sample_rate": self.sr,
+            "n_mfcc": self.n_mfcc,
+            "hop_length": self.hop_length,
+            "n_fft": self.n_fft,
+        }
+        config["hash"] = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()
+        config["version"] = version
+        config["librosa"] = librosa.__version__
+        return config
+
+    def vector_size(self, version: str) -> int:
+        """ Số chiều của vector thuộc phiên bản version """
+        sizes = {
+            "mfcc_mean": self.n_mfcc,
+            "mfcc_std": self.n_mfcc,
+            "spectral_contrast_mean": 7,  # 6 dải tần + 1 (mặc định của librosa)
+            "chroma_mean": 12,
+        }
+        return sum(sizes[component] for component in FEATURE_VERSIONS[version])
+
     def load_audio(self, file_path: str) -> Tuple[np.ndarray, int]:
         """
         Đọc file audio từ đường dẫn
@@ -37,33 +107,44 @@ class AudioFeatureExtractor:
             logger.error(f"Không thể đọc file audio: {file_path}. Lỗi: {str(e)}")
             raise
 
-    def extract_mfcc(self, y: np.ndarray, sr: int) -> np.ndarray:
+    def extract_mfcc_frames(self, y: np.ndarray, sr: int) -> np.ndarray:
         """
-        Trích xuất MFCC (Mel-Frequency Cepstral Coefficients) từ audio signal
+        Trích xuất MFCC (Mel-Frequency Cepstral Coefficients) theo từng frame từ audio signal
 
         Args:
             y: Audio time series
             sr: Sample rate
 
         Returns:
-            MFCC features
+            Ma trận MFCC kích thước (n_mfcc, số frame)
         """
         try:
             # Nếu là stereo, lấy kênh đầu tiên
             y_mono = y if y.ndim == 1 else y[0]
-            mfccs = librosa.feature.mfcc(
+            return librosa.feature.mfcc(
                 y=y_mono,
                 sr=sr,
                 n_mfcc=self.n_mfcc,
                 hop_length=self.hop_length,
                 n_fft=self.n_fft
             )
-            mfccs_mean = np.mean(mfccs, axis=1)
-            return mfccs_mean
         except Exception as e:
             logger.error(f"Không thể trích xuất MFCC. Lỗi: {str(e)}")
             raise
 
+    def extract_mfcc(self, y: np.ndarray, sr: int) -> np.ndarray:
+        """
+        Trích xuất MFCC (Mel-Frequency Cepstral Coefficients) từ audio signal
+
+        Args:
+            y: Audio time series
+            sr: Sample rate
+
+        Returns:
+            MFCC features
+        """
+        return np.mean(self.extract_mfcc_frames(y, sr), axis=1)
+
     def extract_spectral_contrast(self, y: np.ndarray, sr: int) -> np.ndarray:
         """
         Trích xuất spectral contrast từ audio signal
@@ -96,30 +177,171 @@ class AudioFeatureExtractor:
         chroma_mean = np.mean(chroma, axis=1)
         return chroma_mean
 
-    def extract_features(self, file_path: str) -> Dict:
+    def compute_peaks(self, y: np.ndarray, bins: int = PEAKS_BINS) -> np.ndarray:
+        """
+        Tính waveform rút gọn (min/max của từng đoạn) để frontend vẽ mà không cần tải file audio
+
+        Args:
+            y: Audio time series (mono hoặc nhiều kênh)
+            bins: Số đoạn của waveform
+
+        Returns:
+            Mảng int8 kích thước (bins, 2) chứa cặp min/max, biên độ [-1, 1] ánh xạ sang [-127, 127]
+        """
+        y_mono = librosa.to_mono(y)
+        if y_mono.size == 0:
+            return np.zeros((bins, 2), dtype=np.int8)
+        bins = min(bins, y_mono.size)
+        # Chỉ số bắt đầu của mỗi đoạn, tăng ngặt vì bins <= số mẫu
+        starts = np.linspace(0, y_mono.size, bins, endpoint=False).astype(np.int64)
+        peaks = np.stack([np.minimum.reduceat(y_mono, starts), np.maximum.reduceat(y_mono, starts)], axis=1)
+        return np.round(np.clip(peaks, -1.0, 1.0) * 127).astype(np.int8)
+
+    def compute_sequence(self, mfccs: np.ndarray) -> np.ndarray:
+        """
+        Tính chuỗi đặc trưng theo frame (dùng cho re-rank bằng DTW) từ ma trận MFCC
+
+        Args:
+            mfccs: Ma trận MFCC kích thước (n_mfcc, số frame)
+
+        Returns:
+            Mảng float16 kích thước (số frame, SEQUENCE_N_COEFFS): bỏ hệ số 0, trừ trung bình theo hệ số,
+            gộp mỗi SEQUENCE_POOL frame, giữ tối đa SEQUENCE_MAX_FRAMES frame đầu, mỗi frame chuẩn hóa L2
+        """
+        coeffs = mfccs[1:SEQUENCE_N_COEFFS + 1]
+        coeffs = coeffs - np.mean(coeffs, axis=1, keepdims=True)
+        n_frames = min(max(coeffs.shape[1] // SEQUENCE_POOL, 1), SEQUENCE_MAX_FRAMES)
+        pooled = np.stack([
+            np.mean(coeffs[:, i * SEQUENCE_POOL:(i + 1) * SEQUENCE_POOL], axis=1) for i in range(n_frames)
+        ])
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.maximum(norms, 1e-8)).astype(np.float16)
+
+    def compute_landmarks(self, y: np.ndarray) -> np.ndarray:
+        """
+        Tính fingerprint dạng landmark: các đỉnh cục bộ của phổ (giữ tối đa LANDMARK_PEAKS_PER_SECOND đỉnh mạnh
+        nhất mỗi giây), mỗi đỉnh neo ghép với LANDMARK_FAN_OUT đỉnh ngay sau nó thành một hash 26 bit
+        (bin tần số của hai đỉnh, mỗi bin 10 bit, và độ lệch frame 6 bit). Hash không phụ thuộc vị trí trong
+        file nên một đoạn trích cũng cho cùng các hash với vị trí lệch một khoảng cố định
+
+        Args:
+            y: Audio time series (mono hoặc nhiều kênh)
+
+        Returns:
+            Mảng LANDMARK_DTYPE (hash, frame của đỉnh neo)
+        """
+        y_mono = librosa.to_mono(y)
+        if y_mono.size < self.n_fft:
+            return np.zeros(0, dtype=LANDMARK_DTYPE)
+        spectrum = librosa.amplitude_to_db(
+            np.abs(librosa.stft(y_mono, n_fft=self.n_fft, hop_length=self.hop_length)), ref=np.max)
+        is_peak = (spectrum == maximum_filter(spectrum, size=LANDMARK_NEIGHBORHOOD)) & \
+            (spectrum > LANDMARK_FLOOR_DB)
+        freqs, frames = np.nonzero(is_peak)
+        strengths = spectrum[freqs, frames]
+
+        # Giữ các đỉnh mạnh nhất trong từng giây để mật độ đều theo thời gian
+        frames_per_second = max(int(round(self.sr / self.hop_length)), 1)
+        blocks = frames // frames_per_second
+        order = np.lexsort((-strengths, blocks))
+        _, block_starts, block_index = np.unique(blocks[order], return_index=True, return_inverse=True)
+        keep = order[np.arange(order.size) - block_starts[block_index] < LANDMARK_PEAKS_PER_SECOND]
+        freqs, frames = freqs[keep], frames[keep]
+        order = np.lexsort((freqs, frames))
+        freqs, frames = freqs[order], frames[order]
+
+        hashes, offsets = [], []
+        ends = np.searchsorted(frames, frames + LANDMARK_MAX_DT, side="right")
+        for i in range(frames.size):
+            paired = 0
+            for j in range(i + 1, ends[i]):
+                dt = frames[j] - frames[i]
+                if dt == 0 or abs(int(freqs[j]) - int(freqs[i])) > LANDMARK_MAX_DF:
+                    continue
+                hashes.append(((int(freqs[i]) >> 1) << 16) | ((int(freqs[j]) >> 1) << 6) | int(dt))
+                offsets.append(int(frames[i]))
+                paired += 1
+                if paired == LANDMARK_FAN_OUT:
+                    break
+        landmarks = np.zeros(len(hashes), dtype=LANDMARK_DTYPE)
+        landmarks["hash"] = hashes
+        landmarks["offset"] = offsets
+        return landmarks
+
+    def extract_vectors(self, y: np.ndarray, sr: int, versions: Optional[List[str]] = None,
+                        mfccs: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """
+        Tính vector đặc trưng của nhiều phiên bản từ audio signal, mỗi thành phần chỉ được tính một lần
+
+        Args:
+            y: Audio time series
+            sr: Sample rate
+            versions: Các phiên bản cần tính (mặc định FEATURE_VECTOR_VERSIONS)
+            mfccs: Ma trận MFCC đã tính sẵn (extract_mfcc_frames), nếu có
+
+        Returns:
+            Dictionary với key là phiên bản, value là vector đặc trưng đã chuẩn hóa L2
+        """
+        versions = versions or FEATURE_VECTOR_VERSIONS
+        needed = {component for version in versions for component in FEATURE_VERSIONS[version]}
+        components = {}
+        if needed & {"mfcc_mean", "mfcc_std"}:
+            if mfccs is None:
+                mfccs = self.extract_mfcc_frames(y, sr)
+            components["mfcc_mean"] = np.mean(mfccs, axis=1)
+            components["mfcc_std"] = np.std(mfccs, axis=1)
+        if "spectral_contrast_mean" in needed:
+            components["spectral_contrast_mean"] = self.extract_spectral_contrast(y, sr)
+        if "chroma_mean" in needed:
+            components["chroma_mean"] = self.extract_chroma(y, sr)
+        return combine_components(components, versions)
+
+    def extract_vector(self, y: np.ndarray, sr: int, version: str = SEARCH_VECTOR_VERSION) -> np.ndarray:
+        """
+        Tính vector đặc trưng của một phiên bản (v1: MFCC + spectral contrast + chroma) từ audio signal
+
+        Args:
+            y: Audio time series
+            sr: Sample rate
+            version: Phiên bản vector
+
+        Returns:
+            Vector đặc trưng đã chuẩn hóa L2
+        """
+        return self.extract_vectors(y, sr, [version])[version]
+
+    def extract_features(self, file_path: str, build_preview: bool = False,
+                         peaks_path: Optional[str] = None, versions: Optional[List[str]] = None,
+                         sequence_path: Optional[str] = None, landmarks_path: Optional[str] = None,
+                         signal: Optional[Tuple[np.ndarray, int]] = None) -> Dict:
         """
         Trích xuất đặc trưng và metadata từ file audio
 
         Args:
-            file_path: Đường dẫn đến file audio
+            file_path: Đường dẫn đến file audio (category được lấy từ thư mục chứa file)
+            build_preview: Nếu True, tạo luôn bản preview từ tín hiệu đã giải mã
+            peaks_path: Nếu có, tính waveform peaks từ tín hiệu đã giải mã và ghi ra đường dẫn này
+            versions: Các phiên bản vector cần tính (mặc định FEATURE_VECTOR_VERSIONS)
+            sequence_path: Nếu có, tính chuỗi đặc trưng theo frame (re-rank) và ghi ra đường dẫn này
+            landmarks_path: Nếu có, tính fingerprint landmark và ghi ra đường dẫn này
+            signal: Tín hiệu (y, sr) đã giải mã từ file_path (bỏ qua bước giải mã)
 
         Returns:
-            Dictionary chứa vector đặc trưng và metadata
+            Dictionary chứa các vector đặc trưng theo phiên bản ("vectors") và metadata
         """
         try:
             # Đọc file audio
-            y, sr = self.load_audio(file_path)
+            if signal is not None:
+                y, sr = signal
+            else:
+                with AUDIO_DECODE_SECONDS.time():
+                    y, sr = self.load_audio(file_path)
 
             # Trích xuất các đặc trưng
-            mfcc_features = self.extract_mfcc(y, sr)
-            contrast_features = self.extract_spectral_contrast(y, sr)
-            chroma_features = self.extract_chroma(y, sr)
-
-            # Kết hợp các đặc trưng
-            combined_features = np.concatenate([mfcc_features, contrast_features, chroma_features])
-
-            # Chuẩn hóa vector đặc trưng
-            feature_vector = combined_features / np.linalg.norm(combined_features)
+            with FEATURE_EXTRACTION_SECONDS.time():
+                # Ma trận MFCC được dùng chung cho vector và chuỗi đặc trưng
+                mfccs = self.extract_mfcc_frames(y, sr) if sequence_path else None
+                feature_vectors = self.extract_vectors(y, sr, versions, mfccs=mfccs)
 
             # Lấy metadata
             file_name = os.path.basename(file_path)
@@ -127,15 +349,38 @@ class AudioFeatureExtractor:
             file_size_kb = os.path.getsize(file_path) / 1024  # Kích thước file (KB)
             duration = librosa.get_duration(y=y, sr=sr)  # Thời lượng (giây)
             channel = 1 if y.ndim == 1 else y.shape[0]  # Số kênh (mono/stereo)
-            samples = y.shape[-1]  # Tổng số mẫu
-            sample_rate = sr  # Tần số lấy mẫu
 
-            # Lấy subtype bằng soundfile
+            # Lấy subtype, tần số lấy mẫu và số mẫu gốc của file bằng soundfile
+            # (y đã được resample về SAMPLE_RATE nên không dùng sr để lọc theo tần số lấy mẫu)
             with sf.SoundFile(file_path) as f:
                 subtype = f.subtype
+                sample_rate = f.samplerate  # Tần số lấy mẫu
+                samples = f.frames  # Tổng số mẫu
+
+            # Tạo bản preview từ tín hiệu đã giải mã, tránh phải đọc lại file
+            if build_preview:
+                try:
+                    write_preview(y, sr, file_name)
+                except Exception as e:
+                    logger.warning(f"Không thể tạo bản preview cho {file_path}: {str(e)}")
+            if peaks_path:
+                try:
+                    write_peaks(self.compute_peaks(y), peaks_path)
+                except Exception as e:
+                    logger.warning(f"Không thể tạo waveform peaks cho {file_path}: {str(e)}")
+            if sequence_path:
+                try:
+                    write_sequence(self.compute_sequence(mfccs), sequence_path)
+                except Exception as e:
+                    logger.warning(f"Không thể tạo chuỗi đặc trưng cho {file_path}: {str(e)}")
+            if landmarks_path:
+                try:
+                    write_landmarks(self.compute_landmarks(y), landmarks_path)
+                except Exception as e:
+                    logger.warning(f"Không thể tạo fingerprint landmark cho {file_path}: {str(e)}")
 
             return {
-                "vector": feature_vector,
+                "vectors": feature_vectors,
                 "file_name": file_name,
                 "file_type": file_type,
                 "file_size_kb": file_size_kb,
@@ -143,18 +388,25 @@ class AudioFeatureExtractor:
                 "channel": int(channel),
                 "samples": int(samples),
                 "duration": float(duration),
-                "subtype": subtype
+                "subtype": subtype,
+                "category": get_category(file_path)
             }
         except Exception as e:
             logger.error(f"Không thể trích xuất đặc trưng từ file {file_path}. Lỗi: {str(e)}")
             raise
 
-    def process_audio_directory(self, directory_path: str) -> Dict[str, Dict]:
+    def process_audio_directory(self, directory_path: str, build_preview: bool = False,
+                                build_peaks: bool = False, build_sequences: bool = False,
+                                build_landmarks: bool = False) -> Dict[str, Dict]:
         """
         Xử lý tất cả các file audio trong thư mục và trích xuất đặc trưng cùng metadata
 
         Args:
             directory_path: Đường dẫn đến thư mục chứa file audio
+            build_preview: Nếu True, tạo bản preview cho từng file
+            build_peaks: Nếu True, tạo waveform peaks cho từng file
+            build_sequences: Nếu True, tạo chuỗi đặc trưng theo frame (re-rank) cho từng file
+            build_landmarks: Nếu True, tạo fingerprint landmark cho từng file
 
         Returns:
             Dictionary với key là đường dẫn file, value là dict chứa vector và metadata
@@ -168,11 +420,123 @@ class AudioFeatureExtractor:
                     file_path = os.path.join(root, file)
                     try:
                         # Trích xuất đặc trưng và metadata
-                        features = self.extract_features(file_path)
+                        peaks_path = get_peaks_path(file) if build_peaks else None
+                        sequence_path = get_sequence_path(file) if build_sequences else None
+                        landmarks_path = get_landmarks_path(file) if build_landmarks else None
+                        features = self.extract_features(file_path, build_preview=build_preview,
+                                                         peaks_path=peaks_path, sequence_path=sequence_path,
+                                                         landmarks_path=landmarks_path)
                         feature_dict[file_path] = features
                         logger.info(f"Đã trích xuất đặc trưng từ: {file_path}")
                     except Exception as e:
                         logger.error(f"Lỗi khi xử lý file {file_path}: {str(e)}")
                         continue
 
-        return feature_dict
\ No newline at end of file
+        return feature_dict
+
+    def create_accumulator(self, input_sr: int, channels: int = 1,
+                           versions: Optional[List[str]] = None) -> "StreamingFeatureAccumulator":
+        """ Tạo bộ tích lũy đặc trưng cho audio nhận theo từng đoạn (tìm kiếm tăng dần) """
+        return StreamingFeatureAccumulator(self, input_sr, channels=channels, versions=versions)
+
+
+class StreamingFeatureAccumulator:
+    """
+    Tích lũy đặc trưng của audio nhận theo từng đoạn (ví dụ đang ghi âm): resample liên tục, chỉ tính STFT cho
+    các frame mới rồi cộng dồn tổng (và tổng bình phương) của MFCC, spectral contrast, chroma theo frame.
+    vectors() là trung bình chạy, xấp xỉ extract_vectors trên phần tín hiệu đã nhận (không có padding ở hai đầu,
+    chroma không ước lượng tuning); final_vectors() tính chính xác trên toàn bộ tín hiệu.
+    """
+
+    def __init__(self, extractor: AudioFeatureExtractor, input_sr: int, channels: int = 1,
+                 versions: Optional[List[str]] = None):
+        self.extractor = extractor
+        self.sr = extractor.sr
+        self.channels = channels
+        self.versions = versions or FEATURE_VECTOR_VERSIONS
+        needed = {component for version in self.versions for component in FEATURE_VERSIONS[version]}
+        self.needs_mfcc = bool(needed & {"mfcc_mean", "mfcc_std"})
+        self.needs_contrast = "spectral_contrast_mean" in needed
+        self.needs_chroma = "chroma_mean" in needed
+        self.resampler = soxr.ResampleStream(input_sr, self.sr, 1, dtype="float32") if input_sr != self.sr else None
+        self.mel_basis = librosa.filters.mel(sr=self.sr, n_fft=extractor.n_fft)
+        # Mẫu chưa đủ để tạo frame mới (giữ lại n_fft - hop_length mẫu cuối để các frame chồng lên nhau)
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.chunks: List[np.ndarray] = []
+        self.samples = 0
+        self.frames = 0
+        self.sums: Dict[str, np.ndarray] = {}
+
+    @property
+    def duration(self) -> float:
+        """ Thời lượng đã nhận (giây) """
+        return self.samples / self.sr
+
+    def add(self, samples: np.ndarray, last: bool = False) -> int:
+        """
+        Thêm một đoạn audio
+
+        Args:
+            samples: Mẫu float32 trong [-1, 1], xen kẽ các kênh (chỉ dùng kênh đầu tiên như extract_vectors)
+            last: Đoạn cuối cùng (xả phần còn lại của bộ resample)
+
+        Returns:
+            Số frame mới được tích lũy
+        """
+        y = np.asarray(samples, dtype=np.float32)
+        y = y[:len(y) - len(y) % self.channels].reshape(-1, self.channels)[:, 0]
+        if self.resampler is not None:
+            y = self.resampler.resample_chunk(y, last=last)
+        self.chunks.append(y)
+        self.samples += len(y)
+        self.pending = np.concatenate([self.pending, y])
+
+        n_fft, hop_length = self.extractor.n_fft, self.extractor.hop_length
+        if len(self.pending) < n_fft:
+            return 0
+        n_frames = (len(self.pending) - n_fft) // hop_length + 1
+        S = np.abs(librosa.stft(self.pending[:(n_frames - 1) * hop_length + n_fft], n_fft=n_fft,
+                                hop_length=hop_length, center=False))
+        self.pending = self.pending[n_frames * hop_length:]
+        self._accumulate(S)
+        return n_frames
+
+    def _accumulate(self, S: np.ndarray):
+        """ Cộng dồn đặc trưng của các frame mới từ phổ biên độ S """
+        power = S ** 2
+        features = {}
+        if self.needs_mfcc:
+            mfccs = librosa.feature.mfcc(S=librosa.power_to_db(self.mel_basis @ power), n_mfcc=self.extractor.n_mfcc)
+            features["mfcc"] = mfccs
+            features["mfcc_sq"] = mfccs ** 2
+        if self.needs_contrast:
+            features["contrast"] = librosa.feature.spectral_contrast(S=S, sr=self.sr, n_fft=self.extractor.n_fft)
+        if self.needs_chroma:
+            features["chroma"] = librosa.feature.chroma_stft(S=power, sr=self.sr, n_fft=self.extractor.n_fft,
+                                                            tuning=0.0)
+        for name, values in features.items():
+            self.sums[name] = self.sums.get(name, 0) + np.sum(values, axis=1)
+        self.frames += S.shape[1]
+
+    def vectors(self) -> Optional[Dict[str, np.ndarray]]:
+        """ Vector đặc trưng từ các giá trị trung bình chạy, None nếu chưa đủ một frame """
+        if self.frames == 0:
+            return None
+        components = {}
+        if self.needs_mfcc:
+            mean = self.sums["mfcc"] / self.frames
+            components["mfcc_mean"] = mean
+            components["mfcc_std"] = np.sqrt(np.maximum(self.sums["mfcc_sq"] / self.frames - mean ** 2, 0))
+        if self.needs_contrast:
+            components["spectral_contrast_mean"] = self.sums["contrast"] / self.frames
+        if self.needs_chroma:
+            components["chroma_mean"] = self.sums["chroma"] / self.frames
+        return combine_components(components, self.versions)
+
+    def signal(self) -> np.ndarray:
+        """ Toàn bộ tín hiệu đã nhận (mono, ở sample rate của bộ trích xuất) """
+        return np.concatenate(self.chunks) if self.chunks else np.zeros(0, dtype=np.float32)
+
+    def final_vectors(self) -> Dict[str, np.ndarray]:
+        """ Vector đặc trưng tính lại trên toàn bộ tín hiệu (giống extract_vectors) """
+        return self.extractor.extract_vectors(self.signal(), self.sr, self.versions)
@@ -0,0 +1,4 @@
+# app/indexing/__init__.py:
+"""
+Indexing dataset audio vào vector database
+"""
\ No newline at end of file
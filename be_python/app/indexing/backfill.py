@@ -0,0 +1,172 @@
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from qdrant_client.http import models
+
+from app.config import AUDIO_DATASET_PATH, INDEX_BATCH_SIZE
+from app.database.qdrant_manager import QdrantManager, LEGACY_VECTOR_VERSION
+from app.feature_extractor import AudioFeatureExtractor, FEATURE_VERSIONS
+from app.indexing.manifest import IndexManifest
+from app.landmark_index import build_landmark_index
+from app.utils.landmark_utils import get_landmarks_path, write_landmarks
+
+logger = logging.getLogger(__name__)
+
+
+def add_vector_version(qdrant_manager: QdrantManager, vector_size: int, vector_version: str,
+                       batch_size: int = 256, keep_old: bool = False) -> QdrantManager:
+    """
+    Qdrant không cho thêm named vector vào collection đã có: sao chép point (payload và các vector hiện có,
+    vector không tên kiểu cũ thành LEGACY_VECTOR_VERSION) sang collection mới có thêm phiên bản vector_version
+    rồi chuyển alias. Collection cũ vẫn phục vụ tìm kiếm trong lúc sao chép; point được ghi vào collection cũ
+    trong lúc đó sẽ không có ở collection mới (chạy scripts/reindex.py sau đó để bổ sung).
+
+    Args:
+        qdrant_manager: QdrantManager của alias đang phục vụ
+        vector_size: Kích thước vector của phiên bản mới
+        vector_version: Phiên bản mới
+        batch_size: Số point mỗi lần sao chép
+        keep_old: Giữ lại collection cũ sau khi chuyển alias
+
+    Returns:
+        QdrantManager của alias (đã trỏ tới collection mới)
+    """
+    alias_name = qdrant_manager.collection_name
+    vector_sizes = {version or LEGACY_VECTOR_VERSION: size
+                    for version, size in qdrant_manager.get_vector_sizes(refresh=True).items()}
+    vector_sizes[vector_version] = vector_size
+    build_manager = QdrantManager(f"{alias_name}_{time.strftime('%Y%m%d_%H%M%S')}")
+    build_manager.create_collection(vector_sizes)
+
+    copied, offset = 0, None
+    while True:
+        points, offset = qdrant_manager.client.scroll(collection_name=alias_name, limit=batch_size, offset=offset,
+                                                      with_payload=True, with_vectors=True)
+        if points:
+            build_manager.client.upsert(collection_name=build_manager.collection_name, points=[
+                models.PointStruct(
+                    id=point.id,
+                    vector=point.vector if isinstance(point.vector, dict) else {LEGACY_VECTOR_VERSION: point.vector},
+                    payload=point.payload
+                )
+                for point in points
+            ])
+            copied += len(points)
+        if offset is None:
+            break
+    logger.info(f"Đã sao chép {copied} points sang {build_manager.collection_name} (thêm vector {vector_version})")
+
+    build_manager.swap_alias(alias_name, delete_old=not keep_old)
+    return QdrantManager(alias_name)
+
+
+def backfill_vectors(vector_version: str, directory_path: str = AUDIO_DATASET_PATH,
+                     manifest: Optional[IndexManifest] = None,
+                     feature_extractor: Optional[AudioFeatureExtractor] = None,
+                     qdrant_manager: Optional[QdrantManager] = None, batch_size: int = INDEX_BATCH_SIZE,
+                     keep_old: bool = False) -> Dict[str, int]:
+    """
+    Bổ sung dần một phiên bản vector cho các point chưa có (tìm kiếm vẫn phục vụ bằng các phiên bản khác).
+    Chỉ xử lý point chưa có vector này nên có thể dừng và chạy lại bất cứ lúc nào.
+    File của point được lấy từ manifest (point không có trong manifest bị bỏ qua).
+
+    Args:
+        vector_version: Phiên bản cần bổ sung (key của FEATURE_VERSIONS)
+        directory_path: Thư mục dataset
+        manifest: Manifest ánh xạ file -> ID của point
+        feature_extractor: Bộ trích xuất đặc trưng
+        qdrant_manager: QdrantManager của alias đang phục vụ
+        batch_size: Số point mỗi lần ghi
+        keep_old: Giữ lại collection cũ nếu phải tạo collection mới để thêm phiên bản
+
+    Returns:
+        Thống kê số point đã cập nhật, bỏ qua và lỗi
+    """
+    if vector_version not in FEATURE_VERSIONS:
+        raise ValueError(f"Phiên bản vector không hợp lệ: {vector_version}")
+    manifest = manifest or IndexManifest.load()
+    feature_extractor = feature_extractor or AudioFeatureExtractor()
+    qdrant_manager = qdrant_manager or QdrantManager()
+    start_time = time.time()
+
+    stats = {"updated": 0, "skipped": 0, "failed": 0, "migrated": 0}
+    if vector_version not in qdrant_manager.get_vector_sizes(refresh=True):
+        if "" in qdrant_manager.get_vector_sizes() and vector_version == LEGACY_VECTOR_VERSION:
+            logger.info(f"Collection kiểu cũ đã có vector {vector_version} (vector không tên)")
+            return stats
+        qdrant_manager = add_vector_version(qdrant_manager, feature_extractor.vector_size(vector_version),
+                                            vector_version, keep_old=keep_old)
+        stats["migrated"] = 1
+
+    file_paths = {entry["point_id"]: rel_path for rel_path, entry in manifest.entries.items()}
+    missing = models.Filter(must_not=[models.HasVectorCondition(has_vector=vector_version)])
+    offset = None
+    while True:
+        # Phân trang theo ID: point vừa được cập nhật không ảnh hưởng tới các trang sau
+        points, offset = qdrant_manager.client.scroll(collection_name=qdrant_manager.collection_name,
+                                                      scroll_filter=missing, limit=batch_size, offset=offset,
+                                                      with_payload=False, with_vectors=False)
+        vectors = {}
+        for point in points:
+            rel_path = file_paths.get(point.id)
+            if rel_path is None:
+                stats["skipped"] += 1
+                continue
+            file_path = os.path.join(directory_path, *rel_path.split("/"))
+            try:
+                y, sr = feature_extractor.load_audio(file_path)
+                vectors[point.id] = feature_extractor.extract_vector(y, sr, vector_version)
+            except Exception as e:
+                logger.error(f"Lỗi khi xử lý file {file_path}: {str(e)}")
+                stats["failed"] += 1
+        qdrant_manager.update_vectors(vectors, vector_version)
+        stats["updated"] += len(vectors)
+        if points:
+            logger.info(f"Backfill {vector_version}: đã cập nhật {stats['updated']} points")
+        if offset is None:
+            break
+
+    logger.info(f"Hoàn thành backfill {vector_version} trong {time.time() - start_time:.2f} giây: {stats}")
+    return stats
+
+
+def backfill_landmarks(directory_path: str = AUDIO_DATASET_PATH, manifest: Optional[IndexManifest] = None,
+                       feature_extractor: Optional[AudioFeatureExtractor] = None,
+                       qdrant_manager: Optional[QdrantManager] = None) -> Dict[str, int]:
+    """
+    Tạo file landmark cho các file trong manifest chưa có (dataset được index trước khi có fingerprint landmark)
+    rồi gộp lại index landmark. File đã có landmark được bỏ qua nên có thể dừng và chạy lại.
+
+    Args:
+        directory_path: Thư mục dataset
+        manifest: Manifest của dataset
+        feature_extractor: Bộ trích xuất đặc trưng
+        qdrant_manager: QdrantManager của alias đang phục vụ
+
+    Returns:
+        Thống kê số file đã tạo landmark, đã có sẵn và lỗi, cùng thống kê của index
+    """
+    manifest = manifest or IndexManifest.load()
+    feature_extractor = feature_extractor or AudioFeatureExtractor()
+    start_time = time.time()
+
+    stats = {"created": 0, "existing": 0, "failed": 0}
+    for rel_path in sorted(manifest.entries):
+        landmarks_path = get_landmarks_path(os.path.basename(rel_path))
+        if landmarks_path.exists():
+            stats["existing"] += 1
+            continue
+        file_path = os.path.join(directory_path, *rel_path.split("/"))
+        try:
+            y, _ = feature_extractor.load_audio(file_path)
+            write_landmarks(feature_extractor.compute_landmarks(y), landmarks_path)
+            stats["created"] += 1
+        except Exception as e:
+            logger.error(f"Lỗi khi xử lý file {file_path}: {str(e)}")
+            stats["failed"] += 1
+    logger.info(f"Đã tạo landmark trong {time.time() - start_time:.2f} giây: {stats}")
+
+    stats.update(build_landmark_index(qdrant_manager))
+    return stats
@@ -0,0 +1,63 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.config import INDEX_CHECKPOINT_PATH
+
+
+class IndexCheckpoint:
+    """
+    Checkpoint của một lần index toàn bộ dataset: collection đang được build, các file đã được
+    upsert xong (theo batch, cùng định dạng entry với IndexManifest) và ID tiếp theo.
+    Ghi nguyên tử sau mỗi batch để có thể chạy tiếp (--resume).
+    """
+
+    def __init__(self, collection_name: str, dataset_path: str, path: Path = INDEX_CHECKPOINT_PATH):
+        self.path = Path(path)
+        self.collection_name = collection_name
+        self.dataset_path = str(dataset_path)
+        # Đường dẫn tương đối -> {size, mtime_ns, sha1, point_id}
+        self.completed: Dict[str, Dict] = {}
+        self.next_id = 0
+        self.started_at = time.time()
+
+    @classmethod
+    def load(cls, path: Path = INDEX_CHECKPOINT_PATH) -> Optional["IndexCheckpoint"]:
+        """ Đọc checkpoint, None nếu chưa có """
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        checkpoint = cls(data["collection_name"], data["dataset_path"], path)
+        checkpoint.completed = data.get("completed", {})
+        checkpoint.next_id = int(data.get("next_id", 0))
+        checkpoint.started_at = data.get("started_at", checkpoint.started_at)
+        return checkpoint
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f"{self.path.suffix}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "collection_name": self.collection_name,
+                "dataset_path": self.dataset_path,
+                "next_id": self.next_id,
+                "started_at": self.started_at,
+                "completed": self.completed,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def mark_completed(self, entries: Dict[str, Dict], next_id: int):
+        """ Ghi nhận một batch đã upsert xong """
+        self.completed.update(entries)
+        self.next_id = next_id
+        self.save()
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.config import INDEX_MANIFEST_PATH
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac', '.ogg')
+
+
+def file_sha1(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """ Hash SHA-1 của nội dung file (đọc theo chunk) """
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scan_directory(directory_path: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Liệt kê các file audio trong thư mục
+
+    Args:
+        directory_path: Thư mục gốc của dataset
+
+    Returns:
+        Dictionary với key là đường dẫn tương đối (dạng posix), value là (size, mtime_ns)
+    """
+    files = {}
+    for root, _, names in os.walk(directory_path):
+        for name in names:
+            if not name.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+            file_path = os.path.join(root, name)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            files[Path(os.path.relpath(file_path, directory_path)).as_posix()] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+@dataclass
+class ManifestDiff:
+    """ Khác biệt giữa thư mục dataset và manifest (đường dẫn tương đối) """
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    # File có mtime thay đổi nhưng nội dung giữ nguyên (chỉ cập nhật manifest): đường dẫn -> sha1
+    touched: Dict[str, str] = field(default_factory=dict)
+
+
+class IndexManifest:
+    """
+    Manifest của các file đã index: path -> {size, mtime_ns, sha1, point_id}.
+    Point được chèn từ file ngoài dataset (scripts/index_new_data.py) được ghi riêng trong external
+    để Reindexer không xóa như point mồ côi. Lưu dạng JSON, ghi nguyên tử (file tạm + os.replace).
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Path = INDEX_MANIFEST_PATH):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict] = {}
+        # point_id (dạng chuỗi vì là key JSON) -> đường dẫn file nguồn ngoài dataset
+        self.external: Dict[str, str] = {}
+        self.next_id = 0
+
+    @classmethod
+    def load(cls, path: Path = INDEX_MANIFEST_PATH) -> "IndexManifest":
+        manifest = cls(path)
+        try:
+            with open(manifest.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return manifest
+        manifest.entries = data.get("files", {})
+        manifest.external = data.get("external", {})
+        manifest.next_id = int(data.get("next_id", 0))
+        return manifest
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f"{self.path.suffix}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "next_id": self.next_id, "files": self.entries,
+                       "external": self.external}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def allocate_id(self) -> int:
+        """ Cấp ID point mới """
+        point_id = self.next_id
+        self.next_id += 1
+        return point_id
+
+    def reserve_ids(self, point_ids) -> None:
+        """ Đảm bảo ID mới cấp không trùng với các ID đã có """
+        for point_id in point_ids:
+            self.next_id = max(self.next_id, int(point_id) + 1)
+
+    def set(self, rel_path: str, size: int, mtime_ns: int, sha1: str, point_id: int):
+        self.entries[rel_path] = {"size": size, "mtime_ns": mtime_ns, "sha1": sha1, "point_id": point_id}
+
+    def add_external(self, point_id: int, file_path: str):
+        """ Ghi nhận point được chèn từ file ngoài dataset """
+        self.external[str(int(point_id))] = str(file_path)
+
+    def external_ids(self) -> Set[int]:
+        return {int(point_id) for point_id in self.external}
+
+    def point_ids(self) -> Dict[int, str]:
+        """ Ánh xạ point_id -> đường dẫn tương đối """
+        return {entry["point_id"]: rel_path for rel_path, entry in self.entries.items()}
+
+    def diff(self, directory_path: str, scanned: Optional[Dict[str, Tuple[int, int]]] = None,
+             only: Optional[Set[str]] = None) -> ManifestDiff:
+        """
+        So sánh thư mục dataset với manifest. File có size/mtime thay đổi được hash lại,
+        chỉ coi là thay đổi khi hash khác.
+
+        Args:
+            directory_path: Thư mục gốc của dataset
+            scanned: Kết quả scan_directory (quét lại nếu không truyền)
+            only: Chỉ xét các đường dẫn này khi tìm file đã bị xóa (None: toàn bộ manifest)
+
+        Returns:
+            ManifestDiff
+        """
+        scanned = scan_directory(directory_path) if scanned is None else scanned
+        diff = ManifestDiff()
+        for rel_path, (size, mtime_ns) in sorted(scanned.items()):
+            entry = self.entries.get(rel_path)
+            if entry is None:
+                diff.added.append(rel_path)
+            elif entry["size"] != size or entry["mtime_ns"] != mtime_ns:
+                if entry["size"] == size:
+                    sha1 = file_sha1(os.path.join(directory_path, rel_path))
+                    if sha1 == entry["sha1"]:
+                        diff.touched[rel_path] = sha1
+                        continue
+                diff.changed.append(rel_path)
+        known = set(self.entries) if only is None else set(self.entries) & only
+        diff.removed = sorted(known - set(scanned))
+        return diff
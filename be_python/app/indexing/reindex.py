@@ -0,0 +1,259 @@
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from app.config import AUDIO_DATASET_PATH
+from app.database.qdrant_manager import QdrantManager
+from app.feature_extractor import AudioFeatureExtractor
+from app.knn_graph import update_knn_graph, patch_knn_graph
+from app.landmark_index import build_landmark_index, update_landmark_index
+from app.indexing.manifest import IndexManifest, ManifestDiff, scan_directory, file_sha1, AUDIO_EXTENSIONS
+from app.utils.landmark_utils import get_landmarks_path
+from app.utils.peaks_utils import get_peaks_path
+from app.utils.preview_utils import get_preview_path
+from app.utils.sequence_utils import get_sequence_path
+
+logger = logging.getLogger(__name__)
+
+
+class Reindexer:
+    """
+    Đồng bộ collection với thư mục dataset dựa trên manifest: chỉ trích xuất file mới hoặc đã thay đổi,
+    upsert với ID cũ (file thay đổi giữ nguyên ID) và xóa point của file đã bị xóa.
+    Point có sẵn trong collection nhưng chưa có trong manifest (ví dụ do index_dataset.py tạo)
+    được nhận lại theo file_name thay vì trích xuất lại. Point của file ngoài dataset
+    (manifest.external, do index_new_data.py ghi) không bị nhận lại hay xóa.
+    Đồng bộ một phần (watcher) không quét lại collection: ánh xạ ID -> file_name được giữ trong bộ nhớ,
+    index landmark và đồ thị láng giềng chỉ được cập nhật cho các point thay đổi.
+    """
+
+    def __init__(self, directory_path: str = AUDIO_DATASET_PATH, manifest: Optional[IndexManifest] = None,
+                 feature_extractor: Optional[AudioFeatureExtractor] = None,
+                 qdrant_manager: Optional[QdrantManager] = None, build_sidecars: bool = True,
+                 batch_size: int = 64):
+        self.directory_path = str(directory_path)
+        self.manifest = manifest or IndexManifest.load()
+        self.feature_extractor = feature_extractor or AudioFeatureExtractor()
+        self.qdrant_manager = qdrant_manager or QdrantManager()
+        self.build_sidecars = build_sidecars
+        self.batch_size = batch_size
+        # ID -> file_name của mọi point trong collection, nạp ở lần đồng bộ đầu tiên
+        self._point_file_names: Optional[Dict[int, str]] = None
+
+    def _load_point_file_names(self, refresh: bool = False) -> Dict[int, str]:
+        """
+        Ánh xạ ID -> file_name của collection; chỉ quét lại collection khi refresh, lần đầu
+        hoặc khi có point được chèn từ bên ngoài (ID lớn nhất của collection vượt quá ánh xạ)
+        """
+        point_file_names = self._point_file_names
+        if (refresh or not point_file_names
+                or self.qdrant_manager.get_next_id() > max(point_file_names) + 1):
+            point_file_names = self._point_file_names = self.qdrant_manager.get_point_file_names()
+        return point_file_names
+
+    def _abs_path(self, rel_path: str) -> str:
+        return os.path.join(self.directory_path, *rel_path.split("/"))
+
+    def _stat_files(self, rel_paths: Iterable[str]) -> Dict[str, tuple]:
+        """ (size, mtime_ns) của các file audio còn tồn tại trong danh sách """
+        scanned = {}
+        for rel_path in rel_paths:
+            if not rel_path.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+            try:
+                stat = os.stat(self._abs_path(rel_path))
+            except FileNotFoundError:
+                continue
+            scanned[rel_path] = (stat.st_size, stat.st_mtime_ns)
+        return scanned
+
+    def _reconcile(self, diff: ManifestDiff, point_file_names: Dict[int, str]):
+        """
+        Đối chiếu manifest với collection: entry trỏ tới point không còn hoặc khác file_name
+        (collection đã bị tạo lại) được coi là file mới để nhận lại/trích xuất lại
+        """
+        for rel_path, entry in list(self.manifest.entries.items()):
+            if rel_path in diff.removed:
+                continue
+            if point_file_names.get(entry["point_id"]) != os.path.basename(rel_path):
+                del self.manifest.entries[rel_path]
+                diff.touched.pop(rel_path, None)
+                if rel_path in diff.changed:
+                    diff.changed.remove(rel_path)
+                diff.added.append(rel_path)
+
+    def _adopt(self, diff: ManifestDiff, point_file_names: Dict[int, str],
+               scanned: Dict[str, tuple]) -> int:
+        """ Nhận các point chưa thuộc manifest có file_name trùng với file mới """
+        claimed = set(self.manifest.point_ids()) | self.manifest.external_ids()
+        unclaimed: Dict[str, list] = {}
+        for point_id, file_name in sorted(point_file_names.items()):
+            if point_id not in claimed:
+                unclaimed.setdefault(file_name, []).append(point_id)
+        adopted = []
+        for rel_path in diff.added:
+            ids = unclaimed.get(os.path.basename(rel_path))
+            if ids:
+                size, mtime_ns = scanned[rel_path]
+                self.manifest.set(rel_path, size, mtime_ns, file_sha1(self._abs_path(rel_path)), ids.pop(0))
+                adopted.append(rel_path)
+        diff.added = [rel_path for rel_path in diff.added if rel_path not in set(adopted)]
+        return len(adopted)
+
+    def _remove_sidecars(self, rel_path: str):
+        """
+        Xóa bản preview, waveform peaks, chuỗi đặc trưng và landmark nếu không còn file nào cùng tên trong manifest
+        """
+        file_name = os.path.basename(rel_path)
+        if any(os.path.basename(other) == file_name for other in self.manifest.entries):
+            return
+        for path in (get_preview_path(file_name), get_peaks_path(file_name), get_sequence_path(file_name),
+                     get_landmarks_path(file_name)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def remove_files(self, rel_paths: Iterable[str]) -> int:
+        """ Xóa point và entry manifest của các file đã bị xóa khỏi dataset """
+        rel_paths = [rel_path for rel_path in rel_paths if rel_path in self.manifest.entries]
+        if not rel_paths:
+            return 0
+        self.qdrant_manager.delete_points([self.manifest.entries[rel_path]["point_id"] for rel_path in rel_paths])
+        for rel_path in rel_paths:
+            del self.manifest.entries[rel_path]
+            if self.build_sidecars:
+                self._remove_sidecars(rel_path)
+        self.manifest.save()
+        return len(rel_paths)
+
+    def index_files(self, rel_paths: Iterable[str], scanned: Dict[str, tuple]) -> Dict[str, int]:
+        """
+        Trích xuất và upsert các file mới/thay đổi theo batch, lưu manifest sau mỗi batch
+
+        Args:
+            rel_paths: Đường dẫn tương đối của các file cần index
+            scanned: (size, mtime_ns) của các file
+
+        Returns:
+            Số file đã index và số file lỗi
+        """
+        indexed = failed = 0
+        batch: Dict[int, Dict] = {}
+        pending: Dict[str, tuple] = {}
+
+        def flush():
+            if batch:
+                self.qdrant_manager.upsert_points(batch)
+                for rel_path, (size, mtime_ns, sha1, point_id) in pending.items():
+                    self.manifest.set(rel_path, size, mtime_ns, sha1, point_id)
+                self.manifest.save()
+                batch.clear()
+                pending.clear()
+
+        for rel_path in rel_paths:
+            file_path = self._abs_path(rel_path)
+            entry = self.manifest.entries.get(rel_path)
+            try:
+                sha1 = file_sha1(file_path)
+                file_name = os.path.basename(rel_path)
+                peaks_path = get_peaks_path(file_name) if self.build_sidecars else None
+                sequence_path = get_sequence_path(file_name) if self.build_sidecars else None
+                landmarks_path = get_landmarks_path(file_name) if self.build_sidecars else None
+                features = self.feature_extractor.extract_features(
+                    file_path, build_preview=self.build_sidecars, peaks_path=peaks_path, sequence_path=sequence_path,
+                    landmarks_path=landmarks_path)
+            except Exception as e:
+                # Không ghi vào manifest để lần reindex sau thử lại
+                logger.error(f"Lỗi khi xử lý file {file_path}: {str(e)}")
+                failed += 1
+                continue
+            point_id = entry["point_id"] if entry else self.manifest.allocate_id()
+            size, mtime_ns = scanned[rel_path]
+            batch[point_id] = features
+            pending[rel_path] = (size, mtime_ns, sha1, point_id)
+            indexed += 1
+            if len(batch) >= self.batch_size:
+                flush()
+        flush()
+        return {"indexed": indexed, "failed": failed}
+
+    def sync(self, rel_paths: Optional[Iterable[str]] = None, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Đồng bộ collection với dataset
+
+        Args:
+            rel_paths: Chỉ đồng bộ các đường dẫn tương đối này (None: toàn bộ dataset, kèm xóa point mồ côi)
+            dry_run: Chỉ tính khác biệt, không thay đổi gì
+
+        Returns:
+            Thống kê số file theo từng loại thay đổi
+        """
+        start_time = time.time()
+        full_scan = rel_paths is None
+        if full_scan:
+            scanned = scan_directory(self.directory_path)
+            diff = self.manifest.diff(self.directory_path, scanned)
+        else:
+            requested = {Path(rel_path).as_posix() for rel_path in rel_paths}
+            scanned = self._stat_files(requested)
+            diff = self.manifest.diff(self.directory_path, scanned, only=requested)
+        point_file_names = self._load_point_file_names(refresh=full_scan)
+        self.manifest.reserve_ids(point_file_names)
+        if full_scan:
+            self._reconcile(diff, point_file_names)
+
+        stats = {"added": len(diff.added), "changed": len(diff.changed), "removed": len(diff.removed),
+                 "touched": len(diff.touched), "adopted": 0, "orphans": 0, "indexed": 0, "failed": 0}
+        if dry_run:
+            logger.info(f"Khác biệt (dry run): {stats}")
+            return stats
+
+        stats["adopted"] = self._adopt(diff, point_file_names, scanned)
+        stats["added"] = len(diff.added)
+        for rel_path, sha1 in diff.touched.items():
+            entry = self.manifest.entries[rel_path]
+            size, mtime_ns = scanned[rel_path]
+            self.manifest.set(rel_path, size, mtime_ns, sha1, entry["point_id"])
+
+        removed_ids = {self.manifest.entries[rel_path]["point_id"] for rel_path in diff.removed}
+        changed_ids = [self.manifest.entries[rel_path]["point_id"] for rel_path in diff.changed]
+        self.remove_files(diff.removed)
+        stats.update(self.index_files(diff.changed + diff.added, scanned))
+
+        orphans = []
+        if full_scan:
+            # Point không thuộc file nào trong manifest (file đã bị xóa trước khi có manifest),
+            # trừ point của file ngoài dataset; bỏ các point ngoài dataset không còn trong collection
+            self.manifest.external = {point_id: file_path for point_id, file_path in self.manifest.external.items()
+                                      if int(point_id) in point_file_names}
+            orphans = sorted(set(point_file_names) - set(self.manifest.point_ids()) - removed_ids
+                             - self.manifest.external_ids())
+            self.qdrant_manager.delete_points(orphans)
+            stats["orphans"] = len(orphans)
+        self.manifest.save()
+
+        # Cập nhật ánh xạ trong bộ nhớ theo các point vừa ghi/xóa
+        indexed_ids = {self.manifest.entries[rel_path]["point_id"]: os.path.basename(rel_path)
+                       for rel_path in diff.changed + diff.added if rel_path in self.manifest.entries}
+        for point_id in removed_ids | set(orphans):
+            point_file_names.pop(point_id, None)
+        point_file_names.update(indexed_ids)
+
+        if stats["indexed"] or stats["removed"] or stats["adopted"] or stats["orphans"]:
+            if full_scan:
+                if self.build_sidecars:
+                    # Gộp lại index landmark để API nhận diện được file mới và bỏ file đã xóa
+                    build_landmark_index(self.qdrant_manager)
+                # Cập nhật tăng dần đồ thị láng giềng cho /related
+                update_knn_graph(self.qdrant_manager, changed_ids=changed_ids)
+            else:
+                # Batch nhỏ của watcher: chỉ xử lý các point thay đổi, không đọc lại cả collection
+                if self.build_sidecars:
+                    update_landmark_index(indexed_ids, removed_ids, self.qdrant_manager)
+                patch_knn_graph(self.qdrant_manager, added_ids=set(indexed_ids) - set(changed_ids),
+                                changed_ids=changed_ids, removed_ids=removed_ids)
+        logger.info(f"Hoàn thành reindex trong {time.time() - start_time:.2f} giây: {stats}")
+        return stats
@@ -0,0 +1,183 @@
+import json
+import logging
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from app.config import INDEX_MANIFEST_PATH, QDRANT_COLLECTION_NAME, QDRANT_LOCATION
+from app.database.qdrant_manager import QdrantManager, LEGACY_VECTOR_VERSION
+from app.feature_extractor import AudioFeatureExtractor, FEATURE_VERSIONS
+
+logger = logging.getLogger(__name__)
+
+# Phiên bản 2: một file vector cho mỗi phiên bản vector đặc trưng (phiên bản 1 chỉ có vectors.npy)
+SNAPSHOT_VERSION = 2
+SUPPORTED_SNAPSHOT_VERSIONS = (1, 2)
+# Các file trong thư mục snapshot
+VECTORS_FILE = "vectors_{version}.npy"  # float32 (N, D), đọc bằng np.load(mmap_mode="r"), NaN nếu point chưa có
+LEGACY_VECTORS_FILE = "vectors.npy"  # snapshot phiên bản 1
+IDS_FILE = "ids.npy"  # int64 (N,)
+PAYLOADS_FILE = "payloads.json"  # dạng cột: {trường: [giá trị của từng point]}
+MANIFEST_FILE = "manifest.json"
+INDEX_MANIFEST_FILE = "index_manifest.json"
+
+
+def export_snapshot(output_dir: str, qdrant_manager: Optional[QdrantManager] = None,
+                    batch_size: int = 1000) -> Dict:
+    """
+    Xuất toàn bộ vectors và payload của collection ra thư mục snapshot
+
+    Args:
+        output_dir: Thư mục đích (được tạo nếu chưa có)
+        qdrant_manager: QdrantManager của collection cần xuất (mặc định: alias QDRANT_COLLECTION_NAME)
+        batch_size: Số point mỗi lần scroll
+
+    Returns:
+        Nội dung manifest của snapshot
+    """
+    qdrant_manager = qdrant_manager or QdrantManager()
+    client = qdrant_manager.client
+    collection_name = qdrant_manager.collection_name
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    vector_sizes = qdrant_manager.get_vector_sizes(refresh=True)
+    count = client.count(collection_name=collection_name, exact=True).count
+    # Ghi vectors trực tiếp vào file .npy (memmap) để không giữ toàn bộ trong bộ nhớ
+    vectors = {}
+    for name, size in vector_sizes.items():
+        version = name or LEGACY_VECTOR_VERSION
+        vectors[name] = np.lib.format.open_memmap(output_dir / VECTORS_FILE.format(version=version), mode="w+",
+                                                  dtype=np.float32, shape=(count, size))
+        # Point chưa được backfill phiên bản này giữ giá trị NaN
+        vectors[name][:] = np.nan
+    ids = np.empty(count, dtype=np.int64)
+    payloads: List[Dict] = []
+
+    row, offset = 0, None
+    while row < count:
+        points, offset = client.scroll(collection_name=collection_name, limit=batch_size, offset=offset,
+                                       with_payload=True, with_vectors=True)
+        for point in points[:count - row]:
+            point_vectors = point.vector if isinstance(point.vector, dict) else {"": point.vector}
+            for name, vector in point_vectors.items():
+                vectors[name][row] = vector
+            ids[row] = point.id
+            payloads.append(point.payload)
+            row += 1
+        if offset is None:
+            break
+    for array in vectors.values():
+        array.flush()
+    del vectors
+    # Nếu collection bị xóa bớt trong lúc xuất, chỉ row dòng đầu của vectors.npy là hợp lệ (manifest["count"])
+    np.save(output_dir / IDS_FILE, ids[:row])
+    keys = sorted({key for payload in payloads for key in payload})
+    with open(output_dir / PAYLOADS_FILE, "w", encoding="utf-8") as f:
+        json.dump({key: [payload.get(key) for payload in payloads] for key in keys}, f, ensure_ascii=False)
+
+    if INDEX_MANIFEST_PATH.exists():
+        shutil.copyfile(INDEX_MANIFEST_PATH, output_dir / INDEX_MANIFEST_FILE)
+
+    feature_extractor = AudioFeatureExtractor()
+    versions = [name or LEGACY_VECTOR_VERSION for name in vector_sizes]
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "collection": qdrant_manager.get_alias_target(collection_name) or collection_name,
+        "count": row,
+        "vectors": {name or LEGACY_VECTOR_VERSION: size for name, size in vector_sizes.items()},
+        "distance": "Cosine",
+        "extractor": {version: feature_extractor.fingerprint(version) for version in versions},
+        "created_at": time.time(),
+    }
+    with open(output_dir / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    logger.info(f"Đã xuất {row} vectors từ {collection_name} vào {output_dir}")
+    return manifest
+
+
+def _iter_payloads(columns: Dict[str, List], count: int) -> Iterator[Dict]:
+    """ Dựng lại payload của từng point từ dạng cột """
+    keys = list(columns)
+    for row in range(count):
+        yield {key: columns[key][row] for key in keys if columns[key][row] is not None}
+
+
+def _iter_vectors(vectors: Dict[str, np.ndarray], count: int) -> Iterator[Dict[str, Any]]:
+    """ Named vectors của từng point, bỏ qua phiên bản point chưa có (NaN) """
+    for row in range(count):
+        yield {version: array[row] for version, array in vectors.items() if not np.isnan(array[row, 0])}
+
+
+def _load_vectors(input_dir: Path, manifest: Dict) -> Dict[str, np.ndarray]:
+    """ Mở các file vector của snapshot (memmap) theo phiên bản """
+    count = manifest["count"]
+    if manifest["version"] == 1:
+        return {LEGACY_VECTOR_VERSION: np.load(input_dir / LEGACY_VECTORS_FILE, mmap_mode="r")[:count]}
+    return {version: np.load(input_dir / VECTORS_FILE.format(version=version), mmap_mode="r")[:count]
+            for version in manifest["vectors"]}
+
+
+def import_snapshot(input_dir: str, alias_name: str = QDRANT_COLLECTION_NAME, batch_size: int = 1024,
+                    parallel: int = 4, force: bool = False, keep_old: bool = False) -> str:
+    """
+    Nạp snapshot vào một collection mới rồi chuyển alias sang collection đó (như index_dataset.py)
+
+    Args:
+        input_dir: Thư mục snapshot
+        alias_name: Alias mà API truy vấn
+        batch_size: Số point mỗi lần upsert
+        parallel: Số tiến trình upsert song song (chỉ áp dụng với Qdrant server)
+        force: Bỏ qua kiểm tra fingerprint của bộ trích xuất
+        keep_old: Giữ lại collection cũ sau khi chuyển alias
+
+    Returns:
+        Tên collection mới
+    """
+    input_dir = Path(input_dir)
+    with open(input_dir / MANIFEST_FILE, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") not in SUPPORTED_SNAPSHOT_VERSIONS:
+        raise ValueError(f"Phiên bản snapshot không được hỗ trợ: {manifest.get('version')}")
+    extractors = manifest["extractor"]
+    if manifest["version"] == 1:
+        extractors = {LEGACY_VECTOR_VERSION: extractors}
+    feature_extractor = AudioFeatureExtractor()
+    for version, fingerprint in extractors.items():
+        compatible = version in FEATURE_VERSIONS and \
+            fingerprint["hash"] == feature_extractor.fingerprint(version)["hash"]
+        if not compatible and not force:
+            raise ValueError(f"Vector {version} của snapshot được tạo bởi bộ trích xuất có cấu hình khác, "
+                             f"vector truy vấn sẽ không so sánh được (dùng --force để bỏ qua)")
+
+    count = manifest["count"]
+    vectors = _load_vectors(input_dir, manifest)
+    ids = np.load(input_dir / IDS_FILE)[:count]
+    with open(input_dir / PAYLOADS_FILE, encoding="utf-8") as f:
+        columns = json.load(f)
+
+    collection_name = f"{alias_name}_{time.strftime('%Y%m%d_%H%M%S')}"
+    qdrant_manager = QdrantManager(collection_name)
+    qdrant_manager.create_collection({version: array.shape[1] for version, array in vectors.items()})
+    # Qdrant trong tiến trình không hỗ trợ upload song song nhiều tiến trình
+    parallel = 1 if QDRANT_LOCATION else parallel
+    start_time = time.time()
+    qdrant_manager.client.upload_collection(
+        collection_name=collection_name,
+        vectors=_iter_vectors(vectors, count),
+        payload=_iter_payloads(columns, count),
+        ids=(int(point_id) for point_id in ids),
+        batch_size=batch_size,
+        parallel=parallel,
+        wait=True
+    )
+    logger.info(f"Đã nạp {count} vectors vào {collection_name} trong {time.time() - start_time:.2f} giây")
+
+    qdrant_manager.swap_alias(alias_name, delete_old=not keep_old)
+    if (input_dir / INDEX_MANIFEST_FILE).exists():
+        INDEX_MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(input_dir / INDEX_MANIFEST_FILE, INDEX_MANIFEST_PATH)
+    return collection_name
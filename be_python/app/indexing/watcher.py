@@ -0,0 +1,242 @@
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.config import INGEST_DEBOUNCE_SECONDS, INGEST_POLL_INTERVAL, INGEST_BATCH_SIZE
+from app.indexing.manifest import scan_directory, AUDIO_EXTENSIONS
+from app.indexing.reindex import Reindexer
+from app.utils.metrics import REGISTRY
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog là tùy chọn, không có thì dùng polling
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+INGEST_LAG_SECONDS = REGISTRY.histogram(
+    "ingest_lag_seconds", "Thời gian từ khi phát hiện thay đổi đến khi file được index",
+    buckets=(0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+INGEST_FILES = REGISTRY.counter(
+    "ingest_files_total", "Số file đã xử lý bởi watcher theo kết quả", labelnames=("result",))
+INGEST_SYNC_SECONDS = REGISTRY.histogram(
+    "ingest_sync_seconds", "Thời gian xử lý một batch thay đổi")
+INGEST_QUEUE_DEPTH = REGISTRY.gauge(
+    "ingest_queue_depth", "Số file đang chờ được index")
+INGEST_OLDEST_PENDING_SECONDS = REGISTRY.gauge(
+    "ingest_oldest_pending_seconds", "Thời gian chờ của file cũ nhất trong hàng đợi")
+
+
+class _EventHandler(FileSystemEventHandler):
+    """ Chuyển sự kiện của watchdog (inotify/FSEvents/...) thành thông báo cho watcher """
+
+    def __init__(self, watcher: "DatasetWatcher"):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for path in (event.src_path, getattr(event, "dest_path", None)):
+            if path:
+                self.watcher.notify(path)
+
+
+class DatasetWatcher:
+    """
+    Theo dõi thư mục dataset và index liên tục các file mới/thay đổi/bị xóa.
+    Dùng watchdog (inotify) nếu được cài, ngược lại quét định kỳ. Mỗi file chỉ được xử lý khi
+    kích thước và mtime không đổi trong debounce_seconds (tránh đọc file đang được ghi dở),
+    các file sẵn sàng được gom thành batch và đưa qua Reindexer.sync.
+    """
+
+    def __init__(self, reindexer: Reindexer, debounce_seconds: float = INGEST_DEBOUNCE_SECONDS,
+                 poll_interval: float = INGEST_POLL_INTERVAL, batch_size: int = INGEST_BATCH_SIZE,
+                 use_watchdog: bool = True):
+        self.reindexer = reindexer
+        self.directory_path = reindexer.directory_path
+        self.debounce = debounce_seconds
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.mode = "watchdog" if use_watchdog and Observer is not None else "polling"
+        if use_watchdog and Observer is None:
+            logger.warning(f"Chưa cài watchdog (pip install watchdog), chuyển sang quét định kỳ mỗi "
+                           f"{poll_interval} giây: file mới được index chậm hơn và mỗi lần quét phải stat "
+                           f"toàn bộ dataset")
+        # rel_path -> {"first_seen", "last_change", "stat"}
+        self._pending: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._snapshot: Optional[Dict[str, tuple]] = None
+        self._observer = None
+        self.last_sync_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def _stat(self, rel_path: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(os.path.join(self.directory_path, rel_path))
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def notify(self, path: str, stat: Optional[tuple] = None):
+        """ Ghi nhận một file (đường dẫn tuyệt đối) vừa được tạo/sửa/xóa """
+        if not path.lower().endswith(AUDIO_EXTENSIONS):
+            return
+        rel_path = Path(os.path.relpath(path, self.directory_path)).as_posix()
+        if rel_path.startswith("../"):
+            return
+        now = time.time()
+        stat = self._stat(rel_path) if stat is None else stat
+        with self._lock:
+            entry = self._pending.setdefault(rel_path, {"first_seen": now})
+            entry["last_change"] = now
+            entry["stat"] = stat
+            INGEST_QUEUE_DEPTH.set(len(self._pending))
+
+    def oldest_pending_seconds(self) -> float:
+        with self._lock:
+            if not self._pending:
+                return 0.0
+            return time.time() - min(entry["first_seen"] for entry in self._pending.values())
+
+    def _poll(self):
+        """ Quét thư mục và so sánh với lần quét trước (chế độ polling) """
+        scanned = scan_directory(self.directory_path)
+        if self._snapshot is not None:
+            for rel_path, stat in scanned.items():
+                if self._snapshot.get(rel_path) != stat:
+                    self.notify(os.path.join(self.directory_path, rel_path), stat)
+            for rel_path in set(self._snapshot) - set(scanned):
+                self.notify(os.path.join(self.directory_path, rel_path))
+        self._snapshot = scanned
+
+    def _take_ready(self) -> Dict[str, float]:
+        """ Lấy ra tối đa batch_size file đã ổn định trong debounce_seconds (rel_path -> thời điểm phát hiện) """
+        now = time.time()
+        ready = []
+        with self._lock:
+            for rel_path, entry in sorted(self._pending.items(), key=lambda item: item[1]["first_seen"]):
+                if now - entry["last_change"] < self.debounce:
+                    continue
+                stat = self._stat(rel_path)
+                if stat != entry["stat"]:
+                    # File vẫn đang được ghi: chờ thêm một khoảng debounce
+                    entry["stat"], entry["last_change"] = stat, now
+                    continue
+                ready.append(rel_path)
+                if len(ready) >= self.batch_size:
+                    break
+            first_seen = {rel_path: self._pending.pop(rel_path)["first_seen"] for rel_path in ready}
+            INGEST_QUEUE_DEPTH.set(len(self._pending))
+            return first_seen
+
+    def process_ready(self) -> int:
+        """ Index một batch các file đã sẵn sàng, trả về số file trong batch """
+        first_seen = self._take_ready()
+        batch = list(first_seen)
+        if not batch:
+            return 0
+        try:
+            with INGEST_SYNC_SECONDS.time():
+                stats = self.reindexer.sync(rel_paths=batch)
+            self.last_error = None
+        except Exception as e:
+            # Đưa lại vào hàng đợi để thử lại ở lần sau
+            logger.error(f"Lỗi khi index batch {len(batch)} file: {str(e)}")
+            self.last_error = str(e)
+            for rel_path in batch:
+                self.notify(os.path.join(self.directory_path, rel_path))
+            return len(batch)
+        now = time.time()
+        for seen_at in first_seen.values():
+            INGEST_LAG_SECONDS.observe(now - seen_at)
+        INGEST_FILES.labels(result="indexed").inc(stats["indexed"])
+        INGEST_FILES.labels(result="removed").inc(stats["removed"])
+        INGEST_FILES.labels(result="failed").inc(stats["failed"])
+        self.last_sync_at = now
+        return len(batch)
+
+    def start(self):
+        """ Bắt đầu theo dõi (watchdog) hoặc chụp trạng thái ban đầu (polling) """
+        if self.mode == "watchdog":
+            self._observer = Observer()
+            self._observer.schedule(_EventHandler(self), self.directory_path, recursive=True)
+            self._observer.start()
+        else:
+            self._poll()
+        logger.info(f"Bắt đầu theo dõi {self.directory_path} (chế độ: {self.mode})")
+
+    def run(self):
+        """ Vòng lặp chính, chạy đến khi stop() được gọi """
+        self.start()
+        next_poll = time.time() + self.poll_interval
+        tick = max(min(self.debounce / 2, self.poll_interval, 1.0), 0.05)
+        try:
+            while not self._stop.is_set():
+                if self.mode == "polling" and time.time() >= next_poll:
+                    self._poll()
+                    next_poll = time.time() + self.poll_interval
+                # Xử lý liên tục khi còn batch đầy, nghỉ khi hàng đợi trống
+                while self.process_ready() >= self.batch_size and not self._stop.is_set():
+                    pass
+                INGEST_OLDEST_PENDING_SECONDS.set(self.oldest_pending_seconds())
+                self._stop.wait(tick)
+        finally:
+            if self._observer is not None:
+                self._observer.stop()
+                self._observer.join()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self) -> Dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "directory": self.directory_path,
+            "mode": self.mode,
+            "queue_depth": pending,
+            "oldest_pending_seconds": round(self.oldest_pending_seconds(), 3),
+            "last_sync_at": self.last_sync_at,
+            "last_error": self.last_error,
+            "indexed_files": len(self.reindexer.manifest.entries),
+        }
+
+
+def start_status_server(watcher: DatasetWatcher, host: str, port: int) -> ThreadingHTTPServer:
+    """
+    HTTP server nhỏ (thread riêng) phục vụ /status (JSON) và /metrics (Prometheus) của watcher
+    """
+
+    class StatusHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/status":
+                body = json.dumps(watcher.status(), ensure_ascii=False).encode("utf-8")
+                content_type = "application/json"
+            elif self.path == "/metrics":
+                body = REGISTRY.render().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), StatusHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Status server: http://{host}:{port}/status")
+    return server
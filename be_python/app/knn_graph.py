@@ -0,0 +1,302 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import KNN_GRAPH_PATH, KNN_K, KNN_VECTOR_VERSION, KNN_BLOCK_SIZE
+from app.database.qdrant_manager import QdrantManager
+
+logger = logging.getLogger(__name__)
+
+
+def graph_dtype(k: int) -> np.dtype:
+    """ Một dòng của đồ thị: ID của k láng giềng gần nhất (-1 nếu trống) và độ tương đồng cosine tương ứng """
+    return np.dtype([("ids", "<i4", (k,)), ("scores", "<f2", (k,))])
+
+
+def load_vectors(qdrant_manager: QdrantManager, vector_version: str = KNN_VECTOR_VERSION,
+                 batch_size: int = 1000) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Đọc vector của toàn bộ points (bỏ qua point chưa có phiên bản vector này)
+
+    Returns:
+        (ID của points (int64, tăng dần), ma trận vector float32 đã chuẩn hóa L2)
+    """
+    vector_name = qdrant_manager.resolve_vector_name(vector_version)
+    ids, vectors, offset = [], [], None
+    while True:
+        points, offset = qdrant_manager.client.scroll(
+            collection_name=qdrant_manager.collection_name, limit=batch_size, offset=offset,
+            with_payload=False, with_vectors=[vector_name] if vector_name else True)
+        for point in points:
+            vector = point.vector.get(vector_name) if isinstance(point.vector, dict) else point.vector
+            if vector is not None:
+                ids.append(point.id)
+                vectors.append(vector)
+        if offset is None:
+            break
+    if not ids:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 0), dtype=np.float32)
+    ids = np.asarray(ids, dtype=np.int64)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    order = np.argsort(ids)
+    vectors = vectors[order]
+    return ids[order], vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-8)
+
+
+def _top_k(similarities: np.ndarray, candidate_ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """ k cột có độ tương đồng lớn nhất của từng dòng, đã sắp xếp giảm dần (ID -1 nếu thiếu ứng viên) """
+    rows = similarities.shape[0]
+    ids = np.full((rows, k), -1, dtype=np.int32)
+    scores = np.zeros((rows, k), dtype=np.float16)
+    n = min(k, similarities.shape[1])
+    if n == 0:
+        return ids, scores
+    top = np.argpartition(-similarities, n - 1, axis=1)[:, :n]
+    top_scores = np.take_along_axis(similarities, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    valid = np.isfinite(top_scores)
+    ids[:, :n] = np.where(valid, candidate_ids[top], -1)
+    scores[:, :n] = np.where(valid, top_scores, 0)
+    return ids, scores
+
+
+def _compute_rows(graph: np.ndarray, rows: np.ndarray, ids: np.ndarray, vectors: np.ndarray,
+                  positions: np.ndarray, block_size: int):
+    """ Tính lại toàn bộ láng giềng của các point rows (so với mọi point), theo từng block """
+    k = graph.dtype["ids"].shape[0]
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        similarities = vectors[positions[block]] @ vectors.T
+        # Bỏ chính point đó
+        similarities[np.arange(len(block)), positions[block]] = -np.inf
+        graph["ids"][block], graph["scores"][block] = _top_k(similarities, ids, k)
+
+
+def _top_k_per_row(similarities: np.ndarray, candidate_ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """ Như _top_k nhưng mỗi dòng có danh sách ID ứng viên riêng """
+    positions, scores = _top_k(similarities, np.arange(similarities.shape[1]), k)
+    ids = np.where(positions >= 0, np.take_along_axis(candidate_ids, np.maximum(positions, 0), axis=1), -1)
+    return ids.astype(np.int32), scores
+
+
+def _merge_rows(graph: np.ndarray, rows: np.ndarray, candidates: np.ndarray, vectors: np.ndarray,
+                positions: np.ndarray, block_size: int):
+    """ Gộp các point candidates (mới hoặc đã thay đổi) vào danh sách láng giềng hiện có của các point rows """
+    k = graph.dtype["ids"].shape[0]
+    candidate_vectors = vectors[positions[candidates]]
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        current_ids = graph["ids"][block].astype(np.int64)
+        current = np.where(current_ids >= 0, graph["scores"][block].astype(np.float32), -np.inf)
+        similarities = np.concatenate([current, vectors[positions[block]] @ candidate_vectors.T], axis=1)
+        merged_ids = np.concatenate([current_ids, np.broadcast_to(candidates, (len(block), len(candidates)))], axis=1)
+        top_ids, graph["scores"][block] = _top_k_per_row(similarities, merged_ids, k)
+        graph["ids"][block] = top_ids
+
+
+def _write_graph(graph: np.ndarray, graph_path: Path):
+    """ Ghi đồ thị ra file tạm rồi đổi tên (API đang đọc đồ thị cũ không bị ảnh hưởng) """
+    graph_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = graph_path.with_name(f"{graph_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, graph)
+    os.replace(tmp_path, graph_path)
+
+
+def update_knn_graph(qdrant_manager: Optional[QdrantManager] = None, changed_ids: Iterable[int] = (),
+                     full: bool = False, graph_path: Path = KNN_GRAPH_PATH, k: int = KNN_K,
+                     vector_version: str = KNN_VECTOR_VERSION, block_size: int = KNN_BLOCK_SIZE) -> Dict[str, int]:
+    """
+    Cập nhật đồ thị k láng giềng gần nhất của collection. Dòng thứ i của đồ thị là láng giềng của point có ID i
+    (ID của point được cấp tăng dần nên tra cứu là truy cập trực tiếp theo chỉ số).
+    Chỉ tính lại dòng của point mới, point có vector thay đổi và point có láng giềng đã bị xóa/thay đổi;
+    các dòng còn lại chỉ được gộp thêm point mới làm ứng viên. Tạo lại toàn bộ nếu chưa có đồ thị hoặc k khác.
+
+    Args:
+        qdrant_manager: QdrantManager của collection (mặc định: alias QDRANT_COLLECTION_NAME)
+        changed_ids: ID của các point đã được trích xuất lại (giữ ID cũ)
+        full: Tạo lại toàn bộ đồ thị
+        graph_path: Đường dẫn file đồ thị
+        k: Số láng giềng mỗi point
+        vector_version: Phiên bản vector dùng để tính độ tương đồng
+        block_size: Số dòng tính trong một lần nhân ma trận
+
+    Returns:
+        Thống kê số point, số dòng tính lại và số dòng được gộp thêm
+    """
+    qdrant_manager = qdrant_manager or QdrantManager()
+    graph_path = Path(graph_path)
+    start_time = time.time()
+    ids, vectors = load_vectors(qdrant_manager, vector_version)
+    size = int(ids[-1]) + 1 if len(ids) else 0
+    # Vị trí trong ma trận vector của từng ID (-1 nếu point không tồn tại)
+    positions = np.full(size, -1, dtype=np.int64)
+    positions[ids] = np.arange(len(ids))
+
+    old = np.load(graph_path) if not full and graph_path.exists() else None
+    graph = np.zeros(size, dtype=graph_dtype(k))
+    graph["ids"] = -1
+    if old is not None and old.dtype == graph.dtype:
+        graph[:min(len(old), size)] = old[:size]
+    known = graph["ids"][:, 0] >= 0
+
+    exists = positions >= 0
+    changed = np.zeros(size, dtype=bool)
+    changed_ids = np.asarray([point_id for point_id in changed_ids if 0 <= point_id < size], dtype=np.int64)
+    changed[changed_ids] = True
+    # Dòng của point đã bị xóa được xóa trắng
+    graph["ids"][~exists] = -1
+    graph["scores"][~exists] = 0
+    new = exists & (~known | changed)
+    # Point có láng giềng đã bị xóa hoặc đã thay đổi vector phải tính lại toàn bộ
+    # (invalid[size] cho ID láng giềng vượt quá ID lớn nhất hiện có)
+    invalid = np.concatenate([~exists | changed, [True]])
+    neighbor_ids = graph["ids"].astype(np.int64)
+    stale = (neighbor_ids >= 0) & invalid[np.clip(neighbor_ids, 0, size)]
+    to_recompute = new | (exists & stale.any(axis=1))
+    recompute = np.flatnonzero(to_recompute)
+    merge = np.flatnonzero(exists & ~to_recompute)
+    candidates = np.flatnonzero(new)
+
+    if len(recompute):
+        _compute_rows(graph, recompute, ids, vectors, positions, block_size)
+    if len(merge) and len(candidates):
+        _merge_rows(graph, merge, candidates, vectors, positions, block_size)
+    _write_graph(graph, graph_path)
+
+    stats = {"points": int(len(ids)), "recomputed": int(len(recompute)),
+             "merged": int(len(merge)) if len(candidates) else 0}
+    logger.info(f"Đã cập nhật đồ thị {k} láng giềng trong {time.time() - start_time:.2f} giây: {stats}")
+    return stats
+
+
+def _insert_neighbor(graph: np.ndarray, row: int, neighbor: int, score: float):
+    """ Chèn một láng giềng vào dòng đã sắp xếp giảm dần nếu lọt vào top k (bỏ qua nếu đã có) """
+    ids, scores = graph["ids"][row], graph["scores"][row]
+    if neighbor in ids:
+        return False
+    filled = int((ids >= 0).sum())
+    if filled == len(ids) and score <= scores[-1]:
+        return False
+    position = int(np.searchsorted(-scores[:filled].astype(np.float32), -score, side="right"))
+    ids[position + 1:] = ids[position:-1].copy()
+    scores[position + 1:] = scores[position:-1].copy()
+    ids[position], scores[position] = neighbor, score
+    return True
+
+
+def patch_knn_graph(qdrant_manager: Optional[QdrantManager] = None, added_ids: Iterable[int] = (),
+                    changed_ids: Iterable[int] = (), removed_ids: Iterable[int] = (),
+                    graph_path: Path = KNN_GRAPH_PATH, k: int = KNN_K, vector_version: str = KNN_VECTOR_VERSION,
+                    block_size: int = KNN_BLOCK_SIZE) -> Dict[str, int]:
+    """
+    Cập nhật đồ thị cho một batch thay đổi nhỏ (watcher) mà không tải vector của cả collection:
+    láng giềng của point mới/thay đổi và của các dòng trỏ tới point bị xóa/thay đổi được lấy bằng truy vấn
+    Qdrant theo ID, sau đó point mới/thay đổi được gộp vào dòng của chính các láng giềng đó
+    (độ tương đồng cosine đối xứng). Dòng khác không được xét nên đồ thị là xấp xỉ, update_knn_graph
+    (reindex toàn bộ) tính lại chính xác. Dùng update_knn_graph nếu chưa có đồ thị hoặc k khác.
+
+    Args:
+        qdrant_manager: QdrantManager của collection (mặc định: alias QDRANT_COLLECTION_NAME)
+        added_ids: ID của các point mới
+        changed_ids: ID của các point đã được trích xuất lại (giữ ID cũ)
+        removed_ids: ID của các point đã bị xóa
+        graph_path: Đường dẫn file đồ thị
+        k: Số láng giềng mỗi point
+        vector_version: Phiên bản vector dùng để tính độ tương đồng
+        block_size: Số truy vấn trong một lần gọi Qdrant
+
+    Returns:
+        Thống kê số dòng tính lại và số dòng được gộp thêm
+    """
+    qdrant_manager = qdrant_manager or QdrantManager()
+    graph_path = Path(graph_path)
+    old = np.load(graph_path) if graph_path.exists() else None
+    if old is None or old.dtype != graph_dtype(k):
+        return update_knn_graph(qdrant_manager, changed_ids=changed_ids, graph_path=graph_path, k=k,
+                                vector_version=vector_version, block_size=block_size)
+    start_time = time.time()
+    removed = {int(point_id) for point_id in removed_ids}
+    updated = {int(point_id) for point_id in (*added_ids, *changed_ids)} - removed
+    size = max(len(old), max(updated) + 1 if updated else 0)
+    graph = np.zeros(size, dtype=old.dtype)
+    graph["ids"] = -1
+    graph[:len(old)] = old
+
+    cleared = np.asarray([point_id for point_id in removed if point_id < size], dtype=np.int64)
+    graph["ids"][cleared] = -1
+    graph["scores"][cleared] = 0
+    # Dòng có láng giềng đã bị xóa hoặc đã thay đổi vector phải tính lại
+    invalid = np.zeros(size + 1, dtype=bool)
+    invalid[[point_id for point_id in removed | updated if point_id < size]] = True
+    neighbor_ids = graph["ids"].astype(np.int64)
+    stale = ((neighbor_ids >= 0) & invalid[np.clip(neighbor_ids, 0, size)]).any(axis=1)
+    recompute = sorted(updated | {int(row) for row in np.flatnonzero(stale)})
+
+    neighbors = qdrant_manager.search_neighbors(recompute, k, vector_version, batch_size=block_size)
+    for row, row_neighbors in neighbors.items():
+        graph["ids"][row] = -1
+        graph["scores"][row] = 0
+        for position, (neighbor, score) in enumerate(row_neighbors[:k]):
+            graph["ids"][row, position], graph["scores"][row, position] = neighbor, score
+    merged = set()
+    for point_id in updated:
+        for neighbor, score in neighbors.get(point_id, []):
+            # Dòng vừa tính lại đã xét mọi point hiện có
+            if neighbor < size and neighbor not in neighbors and _insert_neighbor(graph, neighbor, point_id, score):
+                merged.add(neighbor)
+    _write_graph(graph, graph_path)
+
+    stats = {"recomputed": len(neighbors), "merged": len(merged)}
+    logger.info(f"Đã cập nhật đồ thị {k} láng giềng (tăng dần) trong {time.time() - start_time:.2f} giây: {stats}")
+    return stats
+
+
+class KnnGraph:
+    """
+    Tra cứu láng giềng gần nhất đã tính trước (memory-map, truy cập trực tiếp theo ID của point).
+    Đồ thị được nạp lại khi file thay đổi (sau khi reindex)
+    """
+
+    def __init__(self, graph_path: Path = KNN_GRAPH_PATH):
+        self.graph_path = Path(graph_path)
+        self._graph: Optional[np.ndarray] = None
+        self._mtime_ns: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> int:
+        """ Nạp (lại) đồ thị nếu file đã thay đổi, trả về số dòng của đồ thị """
+        try:
+            mtime_ns = os.stat(self.graph_path).st_mtime_ns
+        except FileNotFoundError:
+            self._graph, self._mtime_ns = None, None
+            return 0
+        with self._lock:
+            if mtime_ns != self._mtime_ns:
+                self._graph = np.load(self.graph_path, mmap_mode="r")
+                self._mtime_ns = mtime_ns
+                logger.info(f"Đã nạp đồ thị láng giềng: {len(self._graph)} dòng")
+            return len(self._graph)
+
+    def neighbors(self, point_id: int) -> Optional[List[Tuple[int, float]]]:
+        """
+        Láng giềng của một point theo độ tương đồng giảm dần
+
+        Returns:
+            Danh sách (ID, độ tương đồng), None nếu point chưa có trong đồ thị
+        """
+        self.load()
+        graph = self._graph
+        if graph is None or not 0 <= point_id < len(graph):
+            return None
+        row = graph[point_id]
+        if row["ids"][0] < 0:
+            return None
+        return [(int(neighbor), float(score)) for neighbor, score in zip(row["ids"], row["scores"]) if neighbor >= 0]
@@ -0,0 +1,199 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.config import LANDMARK_INDEX_PATH, LANDMARK_MIN_MATCHES, LANDMARK_MIN_RATIO, SAMPLE_RATE, HOP_LENGTH
+from app.database.qdrant_manager import QdrantManager
+from app.utils.landmark_utils import get_landmarks_path, load_landmarks
+
+logger = logging.getLogger(__name__)
+
+# Một dòng của index đảo ngược: hash, ID của point và frame của đỉnh neo trong file
+INDEX_DTYPE = np.dtype([("hash", "<u4"), ("point_id", "<u4"), ("offset", "<u4")])
+# Hash xuất hiện nhiều hơn số lần này (khoảng lặng, tone đơn) không giúp phân biệt file nên bị bỏ qua khi khớp
+MAX_HASH_OCCURRENCES = 2000
+
+
+def _load_part(point_id: int, file_name: Optional[str]) -> Optional[np.ndarray]:
+    """ Các dòng index của một point, None nếu point chưa có file landmark """
+    landmarks = load_landmarks(get_landmarks_path(file_name)) if file_name else None
+    if landmarks is None:
+        return None
+    part = np.empty(len(landmarks), dtype=INDEX_DTYPE)
+    part["hash"] = landmarks["hash"]
+    part["point_id"] = point_id
+    part["offset"] = landmarks["offset"]
+    return part
+
+
+def _write_index(index: np.ndarray, index_path: Path):
+    """ Ghi index ra file tạm rồi đổi tên (API đang đọc index cũ không bị ảnh hưởng) """
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, index)
+    os.replace(tmp_path, index_path)
+
+
+def build_landmark_index(qdrant_manager: Optional[QdrantManager] = None,
+                         index_path: Path = LANDMARK_INDEX_PATH) -> Dict[str, int]:
+    """
+    Gộp file landmark của các point trong collection thành index đảo ngược sắp xếp theo hash
+    (một file .npy, ghi ra file tạm rồi đổi tên nên API đang đọc index cũ không bị ảnh hưởng)
+
+    Args:
+        qdrant_manager: QdrantManager của collection (mặc định: alias QDRANT_COLLECTION_NAME)
+        index_path: Đường dẫn file index
+
+    Returns:
+        Thống kê số point đã gộp, số point chưa có file landmark và số landmark
+    """
+    qdrant_manager = qdrant_manager or QdrantManager()
+    start_time = time.time()
+    parts, missing = [], 0
+    for point_id, file_name in sorted(qdrant_manager.get_point_file_names().items()):
+        part = _load_part(point_id, file_name)
+        if part is None:
+            missing += 1
+            continue
+        parts.append(part)
+    index = np.concatenate(parts) if parts else np.zeros(0, dtype=INDEX_DTYPE)
+    index = index[np.argsort(index["hash"], kind="stable")]
+    _write_index(index, Path(index_path))
+
+    stats = {"points": len(parts), "missing": missing, "landmarks": int(index.size)}
+    logger.info(f"Đã tạo index landmark trong {time.time() - start_time:.2f} giây: {stats}")
+    return stats
+
+
+def update_landmark_index(point_file_names: Dict[int, str], removed_ids: Iterable[int] = (),
+                          qdrant_manager: Optional[QdrantManager] = None,
+                          index_path: Path = LANDMARK_INDEX_PATH) -> Dict[str, int]:
+    """
+    Cập nhật index cho một batch thay đổi (watcher): bỏ dòng của point bị xóa/thay đổi và chèn landmark
+    của point mới/thay đổi vào đúng vị trí theo hash, chỉ đọc file landmark của các point này.
+    Tạo lại toàn bộ bằng build_landmark_index nếu chưa có index.
+
+    Args:
+        point_file_names: ID -> file_name của các point mới hoặc đã thay đổi
+        removed_ids: ID của các point đã bị xóa
+        qdrant_manager: QdrantManager của collection (chỉ dùng khi phải tạo lại toàn bộ)
+        index_path: Đường dẫn file index
+
+    Returns:
+        Thống kê số point đã gộp, số point chưa có file landmark và số landmark
+    """
+    index_path = Path(index_path)
+    if not index_path.exists():
+        return build_landmark_index(qdrant_manager, index_path)
+    start_time = time.time()
+    index = np.load(index_path)
+    dropped = np.asarray(sorted({*point_file_names, *removed_ids}), dtype=np.uint32)
+    if len(dropped):
+        index = index[~np.isin(index["point_id"], dropped)]
+    parts, missing = [], 0
+    for point_id, file_name in sorted(point_file_names.items()):
+        part = _load_part(point_id, file_name)
+        if part is None:
+            missing += 1
+            continue
+        parts.append(part)
+    if parts:
+        added = np.concatenate(parts)
+        added = added[np.argsort(added["hash"], kind="stable")]
+        index = np.insert(index, np.searchsorted(index["hash"], added["hash"], side="right"), added)
+    _write_index(index, index_path)
+
+    stats = {"points": len(parts), "missing": missing, "landmarks": int(index.size)}
+    logger.info(f"Đã cập nhật index landmark trong {time.time() - start_time:.2f} giây: {stats}")
+    return stats
+
+
+class LandmarkIndex:
+    """
+    Tra cứu fingerprint landmark trên index đảo ngược (memory-map, tìm nhị phân theo hash). Các hash khớp
+    được bỏ phiếu theo (point, độ lệch frame giữa file và truy vấn): file chứa truy vấn (nguyên file hoặc
+    đoạn trích) có nhiều hash cùng một độ lệch, độ lệch đó là vị trí của truy vấn trong file.
+    Index được nạp lại khi file index thay đổi (sau khi reindex)
+    """
+
+    def __init__(self, index_path: Path = LANDMARK_INDEX_PATH, min_matches: int = LANDMARK_MIN_MATCHES,
+                 min_ratio: float = LANDMARK_MIN_RATIO):
+        self.index_path = Path(index_path)
+        self.min_matches = min_matches
+        self.min_ratio = min_ratio
+        self._index: Optional[np.ndarray] = None
+        self._mtime_ns: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> int:
+        """ Nạp (lại) index nếu file đã thay đổi, trả về số landmark trong index """
+        try:
+            mtime_ns = os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            self._index, self._mtime_ns = None, None
+            return 0
+        with self._lock:
+            if mtime_ns != self._mtime_ns:
+                self._index = np.load(self.index_path, mmap_mode="r")
+                self._mtime_ns = mtime_ns
+                logger.info(f"Đã nạp index landmark: {len(self._index)} landmark")
+        return len(self._index)
+
+    def match(self, landmarks: np.ndarray, limit: int = 1) -> List[Dict[str, Any]]:
+        """
+        Tìm các file chứa đoạn audio có fingerprint landmarks
+
+        Args:
+            landmarks: Landmark của truy vấn (AudioFeatureExtractor.compute_landmarks)
+            limit: Số file tối đa
+
+        Returns:
+            Danh sách {"point_id", "offset" (giây, vị trí bắt đầu của truy vấn trong file), "matches"
+            (số hash khớp), "score" (tỉ lệ landmark của truy vấn khớp)}, theo số hash khớp giảm dần
+        """
+        self.load()
+        index = self._index
+        if index is None or len(index) == 0 or len(landmarks) == 0:
+            return []
+        hashes = index["hash"]
+        starts = np.searchsorted(hashes, landmarks["hash"], side="left")
+        counts = np.searchsorted(hashes, landmarks["hash"], side="right") - starts
+        counts[counts > MAX_HASH_OCCURRENCES] = 0
+        total = int(counts.sum())
+        if total == 0:
+            return []
+        # Vị trí trong index của mọi dòng khớp: starts[i], starts[i] + 1, ..., starts[i] + counts[i] - 1
+        rows = index[np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)]
+        deltas = rows["offset"].astype(np.int64) - np.repeat(landmarks["offset"].astype(np.int64), counts)
+        keys = (rows["point_id"].astype(np.int64) << 32) | (deltas + (1 << 31))
+        keys, votes = np.unique(keys, return_counts=True)
+        # Ranh giới frame của đoạn trích lệch so với file gốc nên cộng thêm phiếu của độ lệch kề bên (+-1 frame)
+        smoothed = votes.copy()
+        for shift in (-1, 1):
+            neighbors = np.searchsorted(keys, keys + shift)
+            found = (neighbors < len(keys)) & (keys[np.minimum(neighbors, len(keys) - 1)] == keys + shift)
+            smoothed[found] += votes[neighbors[found]]
+
+        threshold = max(self.min_matches, self.min_ratio * len(landmarks))
+        results, seen = [], set()
+        for i in np.argsort(-smoothed, kind="stable"):
+            if smoothed[i] < threshold or len(results) >= limit:
+                break
+            point_id = int(keys[i] >> 32)
+            if point_id in seen:
+                continue
+            seen.add(point_id)
+            delta = int(keys[i] & 0xFFFFFFFF) - (1 << 31)
+            results.append({
+                "point_id": point_id,
+                "offset": delta * HOP_LENGTH / SAMPLE_RATE,
+                "matches": int(smoothed[i]),
+                "score": min(float(smoothed[i]) / len(landmarks), 1.0)
+            })
+        return results
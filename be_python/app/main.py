@@ -2,27 +2,25 @@ import logging
 import os
 import sys
 import asyncio
+import time
 from pathlib import Path
 import uvicorn
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from app.api.router import router
-from app.utils.audio_utils import clean_temp_files
-from app.config import TEMP_DIR, TEMP_FILE_TTL_MINUTES
-
-# Cấu hình logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler("app.log", encoding="utf-8")
-    ]
-)
+from app.api.router import router, get_feature_extractor, get_qdrant_manager, get_search_batcher
+from app.warmup import run_warmup, warmup_state
+from app.utils.temp_registry import temp_registry
+from app.utils.metrics import REGISTRY, InFlightRequestsMiddleware
+from app.utils.logging_setup import setup_logging, RequestContextMiddleware
+from app.config import TEMP_DIR, TEMP_FILE_TTL_MINUTES, PROFILING_ENABLED, APP_WORKERS, MULTI_WORKER, \
+    RESULT_CACHE_BACKEND, WARMUP_ENABLED
+
+# Cấu hình logging (ghi qua hàng đợi, file log JSON xoay vòng)
+setup_logging()
 logger = logging.getLogger("app")
 logger.info("Đang khởi tạo file main.py")
 
@@ -40,6 +38,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(InFlightRequestsMiddleware)
+app.add_middleware(RequestContextMiddleware)
+
+# Chỉ gắn middleware profiling khi được bật để không tốn chi phí khi tắt
+if PROFILING_ENABLED:
+    from app.utils.profiling import ProfilingMiddleware
+    app.add_middleware(ProfilingMiddleware)
+
 app.include_router(router, prefix="/api")
 
 @app.exception_handler(Exception)
@@ -58,23 +64,49 @@ async def root():
         "docs": "/docs",
         "api_endpoints": {
             "search": "/api/search",
+            "search_stream": "/api/search/stream (WebSocket)",
             "reload": "/api/search/result/{query_id}",
             "stream": "/api/stream/{file_path}",
+            "peaks": "/api/peaks/{file_path}",
+            "metrics": "/metrics",
+            "health": "/health",
+            "ready": "/ready",
             "metadata": "/api/metadata/{file_path}",
         }
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """ Metrics theo Prometheus text format """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/health")
+async def health():
+    """ Liveness: tiến trình đang chạy """
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """ Readiness: chỉ trả về 200 khi warm-up đã hoàn tất """
+    status_code = 200 if warmup_state.ready else 503
+    return JSONResponse(status_code=status_code, content=warmup_state.to_dict())
+
 async def periodic_clean_temp_files():
+    ttl_seconds = TEMP_FILE_TTL_MINUTES * 60
     while True:
         try:
-            clean_temp_files()
-            await asyncio.sleep(TEMP_FILE_TTL_MINUTES*60)  # Giảm để kiểm tra
+            await temp_registry.purge_expired()
+            # Ngủ đến thời điểm hết hạn sớm nhất (file mới đăng ký luôn hết hạn sau TTL)
+            next_expiry = temp_registry.next_expiry()
+            delay = ttl_seconds if next_expiry is None else next_expiry - time.time()
+            await asyncio.sleep(min(max(delay, 1.0), ttl_seconds))
         except Exception as e:
             logger.error(f"Lỗi khi chạy tác vụ định kỳ xóa file tạm: {str(e)}")
             await asyncio.sleep(10)
 
 # Biến toàn cục để lưu task
 background_task = None
+warmup_task = None
 
 @app.on_event("startup")
 async def startup_event():
@@ -84,9 +116,20 @@ async def startup_event():
             logger.error(f"Không có quyền ghi vào {TEMP_DIR}")
             raise RuntimeError(f"Không có quyền ghi vào {TEMP_DIR}")
         logger.info(f"TEMP_DIR: {TEMP_DIR}")
-        clean_temp_files()
+        if MULTI_WORKER and RESULT_CACHE_BACKEND == "memory":
+            logger.warning("Chạy nhiều worker (APP_WORKERS/WEB_CONCURRENCY/gunicorn) với cache trong bộ nhớ: "
+                           "/api/search/result có thể trả về 404, hãy đặt RESULT_CACHE_BACKEND=sqlite")
+        # Đăng ký file tạm còn sót từ lần chạy trước hoặc của worker khác, chỉ xóa khi không còn được gia hạn
+        temp_registry.scan_existing()
         global background_task
         background_task = asyncio.create_task(periodic_clean_temp_files())
+        # Warm-up chạy nền, /ready trả về 503 cho đến khi xong
+        global warmup_task
+        if WARMUP_ENABLED:
+            warmup_task = asyncio.create_task(
+                run_warmup(get_feature_extractor(), get_qdrant_manager(), get_search_batcher()))
+        else:
+            warmup_state.ready = True
     except Exception as e:
         logger.error(f"Lỗi trong startup: {str(e)}")
         raise
@@ -97,10 +140,15 @@ async def shutdown_event():
         global background_task
         if background_task:
             background_task.cancel()
-        clean_temp_files()
+        if warmup_task:
+            warmup_task.cancel()
+        # Cache SQLite còn dùng được sau khi tiến trình tắt: giữ file tạm của các kết quả còn trong cache
+        await temp_registry.purge_all(keep_alive_queries=RESULT_CACHE_BACKEND != "memory")
     except Exception as e:
         logger.error(f"Lỗi trong shutdown: {str(e)}")
         raise
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True, log_level="debug")
\ No newline at end of file
+    # reload chỉ hỗ trợ một worker; log_config=None để log của uvicorn đi qua hàng đợi của setup_logging
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=APP_WORKERS == 1, workers=APP_WORKERS,
+                log_level="debug", log_config=None)
\ No newline at end of file
@@ -0,0 +1,98 @@
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.config import RERANK_BUDGET_MS, RERANK_BAND, RERANK_WEIGHT
+from app.utils.metrics import RERANK_SECONDS, RERANK_CANDIDATES_TOTAL
+from app.utils.sequence_utils import get_sequence_path, load_sequence
+
+logger = logging.getLogger(__name__)
+
+
+def banded_dtw(query: np.ndarray, candidate: np.ndarray, band: float = RERANK_BAND) -> float:
+    """
+    DTW giữa hai chuỗi frame đã chuẩn hóa L2, giới hạn trong dải Sakoe-Chiba quanh đường chéo
+
+    Args:
+        query: Chuỗi (n, d)
+        candidate: Chuỗi (m, d)
+        band: Nửa độ rộng dải, tỉ lệ so với độ dài chuỗi dài hơn
+
+    Returns:
+        Khoảng cách cosine trung bình trên đường căn chỉnh (chia cho n + m), trong khoảng [0, 2]
+    """
+    query = np.asarray(query, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    n, m = len(query), len(candidate)
+    cost = 1.0 - query @ candidate.T
+    # Dải quanh đường chéo đã co giãn theo tỉ lệ m / n; rộng ít nhất bằng độ dốc để luôn có đường đi
+    slope = (m - 1) / max(n - 1, 1)
+    width = max(int(band * max(n, m)), int(np.ceil(slope)), 1)
+    # previous[j + 1] = D[i - 1, j], previous[0] là biên (0 ở hàng đầu tiên để bắt đầu từ (0, 0))
+    previous = np.full(m + 1, np.inf, dtype=np.float32)
+    previous[0] = 0.0
+    for i in range(n):
+        center = i * slope
+        lo, hi = max(int(center - width), 0), min(int(center + width) + 1, m)
+        row_cost = cost[i, lo:hi]
+        # Bước chéo (D[i - 1, j - 1]) hoặc dọc (D[i - 1, j]) từ hàng trước
+        step = row_cost + np.minimum(previous[lo:hi], previous[lo + 1:hi + 1])
+        # Bước ngang trong cùng hàng: D[j] = S[j] + min_{k <= j}(step[k] - S[k]) với S là tổng tích lũy của chi phí
+        prefix = np.cumsum(row_cost)
+        current = np.full(m + 1, np.inf, dtype=np.float32)
+        current[lo + 1:hi + 1] = prefix + np.minimum.accumulate(step - prefix)
+        previous = current
+    return float(previous[m] / (n + m))
+
+
+class Reranker:
+    """
+    Giai đoạn hai của tìm kiếm: sắp xếp lại các ứng viên từ Qdrant bằng DTW trên chuỗi đặc trưng theo frame
+    (float16, memory-map từ SEQUENCE_DIR). Ứng viên được so sánh theo thứ tự độ tương đồng vector cho đến khi
+    hết thời gian cho phép; ứng viên chưa so sánh hoặc không có chuỗi đặc trưng giữ thứ tự cũ, xếp sau.
+    """
+
+    def __init__(self, budget_ms: float = RERANK_BUDGET_MS, band: float = RERANK_BAND,
+                 weight: float = RERANK_WEIGHT):
+        self.budget = budget_ms / 1000
+        self.band = band
+        self.weight = weight
+
+    def rerank(self, query_sequence: Optional[np.ndarray], candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Sắp xếp lại danh sách kết quả của QdrantManager.search_similar
+
+        Args:
+            query_sequence: Chuỗi đặc trưng của file truy vấn (None: giữ nguyên thứ tự)
+            candidates: Các ứng viên theo thứ tự độ tương đồng vector
+
+        Returns:
+            Danh sách mới, ứng viên đã so sánh có thêm "rerank_score"
+            (RERANK_WEIGHT * độ tương đồng DTW + phần còn lại * độ tương đồng vector)
+        """
+        if query_sequence is None or not candidates:
+            return list(candidates)
+        start_time = time.perf_counter()
+        deadline = start_time + self.budget
+        scored, unscored = [], []
+        for candidate in candidates:
+            if time.perf_counter() >= deadline:
+                unscored.append(candidate)
+                RERANK_CANDIDATES_TOTAL.labels(result="skipped").inc()
+                continue
+            sequence = load_sequence(get_sequence_path(candidate["file_name"]))
+            if sequence is None or len(sequence) == 0:
+                unscored.append(candidate)
+                RERANK_CANDIDATES_TOTAL.labels(result="missing").inc()
+                continue
+            similarity = 1.0 - banded_dtw(query_sequence, sequence, self.band)
+            score = self.weight * similarity + (1 - self.weight) * candidate["similarity"]
+            scored.append({**candidate, "rerank_score": score})
+            RERANK_CANDIDATES_TOTAL.labels(result="scored").inc()
+        scored.sort(key=lambda item: item["rerank_score"], reverse=True)
+        elapsed = time.perf_counter() - start_time
+        RERANK_SECONDS.observe(elapsed)
+        logger.debug(f"Re-rank {len(scored)}/{len(candidates)} ứng viên trong {elapsed * 1000:.1f} ms")
+        return scored + unscored
@@ -1,20 +1,22 @@
-import asyncio
+import hashlib
 import logging
 import os
 import tempfile
 import time
-from typing import Generator
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Mapping, Optional, Tuple
 
+import anyio
 import soundfile as sf
 from fastapi import UploadFile
+from starlette.background import BackgroundTask
+from starlette.responses import FileResponse, Response
+from starlette.types import Receive, Scope, Send
 
-from app.config import TEMP_DIR, CHUNK_SIZE,TEMP_FILE_TTL_MINUTES
+from app.config import TEMP_DIR, CHUNK_SIZE, AUDIO_DATASET_PATH
+from app.utils.metrics import STREAM_BYTES_SERVED, UPLOAD_SAVE_SECONDS, UPLOAD_SIZE_BYTES
 
 logger = logging.getLogger(__name__)
-# Tập hợp để theo dõi các file đang được stream
-active_streams = set()
-# Khóa để đảm bảo tính đồng bộ khi truy cập active_streams
-active_streams_lock = asyncio.Lock()
 
 async def save_upload_file(upload_file: UploadFile) -> str:
     """
@@ -32,9 +34,12 @@ async def save_upload_file(upload_file: UploadFile) -> str:
         temp_file = TEMP_DIR / f"{next(tempfile._get_candidate_names())}{file_extension}"
 
         # Lưu nội dung file
+        start_time = time.perf_counter()
         with open(temp_file, "wb") as f:
             content = await upload_file.read()
             f.write(content)
+        UPLOAD_SAVE_SECONDS.observe(time.perf_counter() - start_time)
+        UPLOAD_SIZE_BYTES.observe(len(content))
 
         logger.info(f"Đã lưu file upload tạm thời: {temp_file}")
         return str(temp_file)
@@ -43,23 +48,207 @@ async def save_upload_file(upload_file: UploadFile) -> str:
         raise
 
 
-def file_iterator(file_path: str, chunk_size: int = CHUNK_SIZE) -> Generator[bytes, None, None]:
+class AudioFileResponse(FileResponse):
     """
-    Tạo iterator để đọc file theo chunks
+    FileResponse hỗ trợ một khoảng byte (206 Partial Content, để trình duyệt tua trong thẻ <audio>)
+    và gửi file bằng sendfile (zero-copy) nếu ASGI server hỗ trợ extension "http.response.pathsend"
+    hoặc "http.response.zerocopysend". uvicorn (bản trong requirements.txt) không hỗ trợ extension nào
+    trong hai extension này nên file được đọc theo chunk lớn trong thread pool để không chặn event loop;
+    chạy app bằng Granian (granian --interface asgi app.main:app, hỗ trợ pathsend) để dùng sendfile.
+    pathsend chỉ gửi được cả file nên request có Range luôn được đọc theo chunk.
+    """
+    chunk_size = CHUNK_SIZE
+
+    def __init__(self, *args, stream_type: str = "file", byte_range: Optional[Tuple[int, int]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Nhãn của metric stream_bytes_served
+        self.stream_type = stream_type
+        # Khoảng byte được gửi (start, end), end tính cả byte cuối; None: cả file
+        self.byte_range = byte_range
+        if byte_range is not None and self.stat_result is not None:
+            start, end = byte_range
+            self.status_code = 206
+            self.headers["content-length"] = str(end - start + 1)
+            self.headers["content-range"] = f"bytes {start}-{end}/{self.stat_result.st_size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.send_header_only or self.stat_result is None:
+            await super().__call__(scope, receive, send)
+            return
+
+        start, end = self.byte_range or (0, self.stat_result.st_size - 1)
+        count = end - start + 1
+        extensions = scope.get("extensions") or {}
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if "http.response.pathsend" in extensions and self.byte_range is None:
+            await send({"type": "http.response.pathsend", "path": os.fspath(self.path)})
+        elif "http.response.zerocopysend" in extensions:
+            file = await anyio.to_thread.run_sync(open, self.path, "rb")
+            try:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": start,
+                    "count": count,
+                    "more_body": False,
+                })
+            finally:
+                await anyio.to_thread.run_sync(file.close)
+        else:
+            await self.send_chunks(send, start, count)
+        STREAM_BYTES_SERVED.labels(type=self.stream_type).observe(count)
+        if self.background is not None:
+            await self.background()
+
+    async def send_chunks(self, send: Send, start: int, count: int):
+        """ Đọc count byte từ vị trí start theo chunk trong thread pool và gửi lần lượt """
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(start)
+            remaining = count
+            more_body = count > 0
+            while more_body:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                # File bị cắt ngắn trong lúc gửi: kết thúc response với phần đã đọc
+                remaining = remaining - len(chunk) if chunk else 0
+                more_body = remaining > 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+            if count == 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def parse_byte_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Đọc header Range dạng một khoảng byte: bytes=start-end, bytes=start- hoặc bytes=-số byte cuối
+
+    Args:
+        range_header: Giá trị header Range
+        size: Kích thước file
+
+    Returns:
+        (start, end), end tính cả byte cuối; None nếu không có Range hoặc Range không được hỗ trợ
+        (sai cú pháp, nhiều khoảng), khi đó trả về cả file
+
+    Raises:
+        ValueError: Khoảng nằm ngoài file (416 Range Not Satisfiable)
+    """
+    if not range_header:
+        return None
+    unit, _, byte_range = range_header.partition("=")
+    first, separator, last = byte_range.strip().partition("-")
+    if unit.strip().lower() != "bytes" or not separator or not (first or last) or \
+            not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if not first:
+        # Số byte cuối của file
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise ValueError("Khoảng byte rỗng")
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("Khoảng byte nằm ngoài file")
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def build_etag(stat_result: os.stat_result) -> str:
+    """
+    Tạo ETag từ thời gian sửa đổi và kích thước file (không cần đọc nội dung file)
+    """
+    etag_base = f"{stat_result.st_mtime_ns}-{stat_result.st_size}"
+    return f'"{hashlib.md5(etag_base.encode()).hexdigest()}"'
+
+
+def is_not_modified(request_headers: Mapping[str, str], etag: str, last_modified: float) -> bool:
+    """
+    Kiểm tra conditional request (If-None-Match / If-Modified-Since)
+
+    Args:
+        request_headers: Headers của request
+        etag: ETag hiện tại của file
+        last_modified: Thời gian sửa đổi của file (timestamp)
+
+    Returns:
+        True nếu client đã có bản mới nhất (trả về 304)
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match được ưu tiên hơn If-Modified-Since (RFC 9110)
+        if if_none_match.strip() == "*":
+            return True
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in tags
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def create_file_response(
+        file_path: str,
+        request_headers: Mapping[str, str],
+        media_type: str,
+        cache_control: str,
+        background: Optional[BackgroundTask] = None,
+        stream_type: str = "file"
+) -> Response:
+    """
+    Tạo response trả về file kèm ETag/Last-Modified/Cache-Control,
+    trả về 304 Not Modified nếu client đã cache bản mới nhất, 206 nếu client yêu cầu một khoảng byte (Range)
 
     Args:
         file_path: Đường dẫn đến file
-        chunk_size: Kích thước của mỗi chunk
+        request_headers: Headers của request
+        media_type: Content-Type của file
+        cache_control: Giá trị header Cache-Control
+        background: Tác vụ chạy sau khi gửi xong response
+        stream_type: Loại file (nhãn của metric stream_bytes_served)
 
     Returns:
-        Generator cho các chunks của file
+        AudioFileResponse hoặc Response 304/416
     """
-    with open(file_path, 'rb') as f:
-        while True:
-            chunk = f.read(chunk_size)
-            if not chunk:
-                break
-            yield chunk
+    stat_result = os.stat(file_path)
+    etag = build_etag(stat_result)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+    }
+
+    if is_not_modified(request_headers, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers, background=background)
+
+    headers["Accept-Ranges"] = "bytes"
+    # If-Range: chỉ trả về một phần nếu client đang giữ đúng phiên bản hiện tại của file
+    byte_range = None
+    if_range = request_headers.get("if-range")
+    if if_range is None or if_range.strip() == etag:
+        try:
+            byte_range = parse_byte_range(request_headers.get("range"), stat_result.st_size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{stat_result.st_size}"
+            return Response(status_code=416, headers=headers, background=background)
+
+    return AudioFileResponse(
+        file_path,
+        headers=headers,
+        media_type=media_type,
+        filename=os.path.basename(file_path),
+        stat_result=stat_result,
+        content_disposition_type="inline",
+        background=background,
+        stream_type=stream_type,
+        byte_range=byte_range
+    )
 
 
 def get_audio_metadata(file_path: str) -> dict:
@@ -87,32 +276,40 @@ def get_audio_metadata(file_path: str) -> dict:
             "error": str(e)
         }
 
-def clean_temp_files(older_than_minutes: float = TEMP_FILE_TTL_MINUTES, max_retries: int = 3, retry_delay: float = 1.0):
+def find_dataset_file(file_name: str) -> Optional[str]:
     """
-    Xóa các file tạm thời cũ hơn một khoảng thời gian nhất định
+    Tìm đường dẫn đầy đủ của file trong AUDIO_DATASET_PATH theo tên file
+
     Args:
-        older_than_minutes: Số phút, file cũ hơn sẽ bị xóa
-        max_retries: Số lần thử lại nếu xóa thất bại
-        retry_delay: Thời gian chờ giữa các lần thử (giây)
-    """
-    current_time = time.time()
-    for file in TEMP_DIR.glob("*"):
-        if file.is_file():
-            file_age = current_time - file.stat().st_mtime
-            file_path = str(file)
-            # Chỉ xóa nếu file không đang được stream và đủ tuổi
-            if file_age > older_than_minutes * 60 and file_path not in active_streams:
-                for attempt in range(max_retries):
-                    try:
-                        os.remove(file)
-                        logger.info(f"Đã xóa file tạm thời: {file}")
-                        break
-                    except OSError as e:
-                        if attempt < max_retries - 1:
-                            logger.warning(f"Thử lại xóa file {file} (lần {attempt + 1}): {str(e)}")
-                            time.sleep(retry_delay)
-                        else:
-                            logger.error(f"Không thể xóa file tạm thời {file} sau {max_retries} lần thử: {str(e)}")
+        file_name: Tên file cần tìm
+
+    Returns:
+        Đường dẫn đến file hoặc None nếu không tìm thấy
+    """
+    for root, _, files in os.walk(AUDIO_DATASET_PATH):
+        if file_name in files:
+            return os.path.join(root, file_name)
+    return None
+
+
+def get_category(file_path: str, dataset_path: str = AUDIO_DATASET_PATH) -> Optional[str]:
+    """
+    Lấy category của file dataset từ tên thư mục (ví dụ Dataset/Bassoon/x.wav -> "Bassoon")
+
+    Args:
+        file_path: Đường dẫn đến file audio
+        dataset_path: Thư mục gốc của dataset
+
+    Returns:
+        Tên thư mục con cấp một của dataset chứa file; với file nằm ngoài dataset là tên thư mục cha;
+        None nếu file nằm trực tiếp trong thư mục gốc
+    """
+    rel_path = os.path.relpath(os.path.abspath(file_path), os.path.abspath(dataset_path))
+    parts = rel_path.split(os.sep)
+    if parts[0] == os.pardir:
+        return os.path.basename(os.path.dirname(os.path.abspath(file_path))) or None
+    return parts[0] if len(parts) > 1 else None
+
 
 def get_audio_filename(file_path: str) -> str:
     """
@@ -0,0 +1,60 @@
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app.config import LANDMARK_DIR, TEMP_DIR
+
+logger = logging.getLogger(__name__)
+
+# Mỗi landmark: hash của cặp đỉnh phổ và frame của đỉnh neo
+LANDMARK_DTYPE = np.dtype([("hash", "<u4"), ("offset", "<u4")])
+
+
+def get_landmarks_path(file_name: str, temp: bool = False) -> Path:
+    """
+    Lấy đường dẫn file landmark (fingerprint) của một file audio
+
+    Args:
+        file_name: Tên file audio (file dataset hoặc file tạm)
+        temp: Nếu True, file nằm trong TEMP_DIR và bị xóa cùng file tạm
+
+    Returns:
+        Đường dẫn đến file landmark (.npy)
+    """
+    return (TEMP_DIR if temp else LANDMARK_DIR) / f"{file_name}.lm.npy"
+
+
+def write_landmarks(landmarks: np.ndarray, landmarks_path: Path) -> str:
+    """
+    Ghi danh sách landmark (LANDMARK_DTYPE) ra file .npy
+
+    Args:
+        landmarks: Danh sách landmark
+        landmarks_path: Đường dẫn file
+
+    Returns:
+        Đường dẫn file
+    """
+    landmarks_path = Path(landmarks_path)
+    # Ghi ra file tạm rồi đổi tên để tiến trình gộp index không đọc phải file ghi dở
+    tmp_path = landmarks_path.with_name(f"{landmarks_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(landmarks, dtype=LANDMARK_DTYPE))
+    os.replace(tmp_path, landmarks_path)
+    return str(landmarks_path)
+
+
+def load_landmarks(landmarks_path: Path) -> Optional[np.ndarray]:
+    """
+    Đọc danh sách landmark của một file
+
+    Returns:
+        Mảng LANDMARK_DTYPE, None nếu file không tồn tại
+    """
+    try:
+        return np.load(landmarks_path)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,194 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+
+from app.config import LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE, LOG_SAMPLING, MULTI_WORKER
+from app.utils.metrics import REGISTRY
+
+# Ngữ cảnh của request hiện tại, được gắn vào mọi log record
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+query_id_var: ContextVar[Optional[str]] = ContextVar("query_id", default=None)
+
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    "log_records_dropped_total", "Số log record bị bỏ do hàng đợi log đầy")
+
+# Các thuộc tính chuẩn của LogRecord, phần còn lại (truyền qua extra=...) được đưa vào JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class ContextFilter(logging.Filter):
+    """ Gắn request_id/query_id của request hiện tại vào record (chạy trong thread gọi log) """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.query_id = query_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Chỉ giữ lại một tỉ lệ log của các logger ồn ào (ví dụ log stream), log WARNING trở lên luôn được giữ
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rates.get(record.name)
+        return rate is None or random.random() < rate
+
+
+# Formatter dùng để định dạng exception trước khi record được đưa vào hàng đợi
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+
+class DroppingQueueHandler(QueueHandler):
+    """ QueueHandler không bao giờ chặn: bỏ record khi hàng đợi đầy """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Chuẩn bị record để đưa vào hàng đợi: ghép args vào message, chuyển exception thành chuỗi (exc_text)
+        nhưng không gộp vào message như QueueHandler.prepare để JsonFormatter ghi traceback vào khóa riêng
+        """
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        # Traceback không pickle được và đã có trong exc_text
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class JsonFormatter(logging.Formatter):
+    """ Định dạng log record thành một dòng JSON """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and value is not None:
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        if record.stack_info:
+            data["stack_info"] = record.stack_info
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def parse_sampling(value: str) -> Dict[str, float]:
+    """ Đọc cấu hình sampling dạng "logger=rate,logger=rate" """
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+def get_log_file() -> str:
+    """
+    Đường dẫn file log của tiến trình hiện tại: khi chạy nhiều worker mỗi worker ghi một file riêng
+    (app.log -> app.<pid>.log) vì RotatingFileHandler không an toàn khi nhiều tiến trình cùng ghi và xoay vòng
+    """
+    if not MULTI_WORKER:
+        return LOG_FILE
+    root, ext = os.path.splitext(LOG_FILE)
+    return f"{root}.{os.getpid()}{ext}"
+
+
+_listener: Optional[QueueListener] = None
+
+# Logger của uvicorn tự gắn StreamHandler ghi đồng bộ, được chuyển sang hàng đợi của root
+_UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+def setup_logging(level: int = logging.INFO):
+    """
+    Cấu hình logging không chặn: handler của root chỉ đưa record vào hàng đợi,
+    một thread riêng ghi ra stdout và file JSON (xoay vòng theo kích thước).
+    Log của uvicorn (kể cả access log) cũng đi qua hàng đợi thay vì ghi trực tiếp trên event loop.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    file_handler = RotatingFileHandler(get_log_file(), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                       encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter())
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    queue_handler.addFilter(SamplingFilter(parse_sampling(LOG_SAMPLING)))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+    for name in _UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(queue_handler.queue, stream_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware gán request_id (từ header X-Request-ID hoặc tạo mới) cho log và response
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode())]
+            await send(message)
+
+        request_token = request_id_var.set(request_id)
+        query_token = query_id_var.set(None)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(request_token)
+            query_id_var.reset(query_token)
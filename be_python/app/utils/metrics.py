@@ -0,0 +1,261 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Các mốc mặc định cho histogram thời gian (giây)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Các mốc cho histogram kích thước (bytes)
+SIZE_BUCKETS = tuple(1024 * 2 ** i for i in range(4, 17, 2))  # 16KB .. 64MB
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    """ Định dạng label theo Prometheus text format """
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Lớp cơ sở cho các metric, hỗ trợ label qua labels(...)
+    """
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+
+    def labels(self, **labels: str) -> "_Metric":
+        """ Lấy metric con ứng với bộ giá trị label """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._new_child()
+                    # Metric con dùng labelnames của metric cha khi xuất dữ liệu
+                    child.labelnames = self.labelnames
+                    self._children[key] = child
+        return child
+
+    def _new_child(self) -> "_Metric":
+        raise NotImplementedError
+
+    def _samples(self, labelvalues: Tuple[str, ...]) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        if self.labelnames:
+            for labelvalues, child in list(self._children.items()):
+                lines.extend(child._samples(labelvalues))
+        else:
+            lines.extend(self._samples(()))
+        return lines
+
+
+class Counter(_Metric):
+    """ Bộ đếm chỉ tăng """
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+
+    def _new_child(self) -> "Counter":
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def _samples(self, labelvalues: Tuple[str, ...]) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(self.value)}"]
+
+
+class Gauge(_Metric):
+    """ Giá trị tăng/giảm tùy ý, hoặc được tính bằng callback tại thời điểm scrape """
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+        self.callback = callback
+
+    def _new_child(self) -> "Gauge":
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def _samples(self, labelvalues: Tuple[str, ...]) -> List[str]:
+        value = self.callback() if self.callback is not None else self.value
+        return [f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    """ Histogram với các mốc cố định, observe có chi phí O(log số mốc) """
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Phần tử cuối là mốc +Inf
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.bucket_counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> "_Timer":
+        """ Context manager đo thời gian thực thi và ghi vào histogram """
+        return _Timer(self)
+
+    def cumulative_counts(self) -> List[Tuple[float, int]]:
+        """ Danh sách (mốc, số lượng tích lũy) bao gồm mốc +Inf """
+        result, total = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.bucket_counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def _samples(self, labelvalues: Tuple[str, ...]) -> List[str]:
+        lines = []
+        for bound, count in self.cumulative_counts():
+            le = 'le="' + _format_value(bound) + '"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, le)} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labelvalues)} {_format_value(self.sum)}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, labelvalues)} {self.count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class MetricsRegistry:
+    """
+    Tập hợp các metric và xuất ra Prometheus text format
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} đã được đăng ký")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+              callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Metric của các bước xử lý
+UPLOAD_SIZE_BYTES = REGISTRY.histogram(
+    "audio_upload_size_bytes", "Kích thước file upload (bytes)", buckets=SIZE_BUCKETS)
+UPLOAD_SAVE_SECONDS = REGISTRY.histogram(
+    "audio_upload_save_seconds", "Thời gian lưu file upload vào thư mục tạm")
+AUDIO_DECODE_SECONDS = REGISTRY.histogram(
+    "audio_decode_seconds", "Thời gian giải mã và resample file audio")
+FEATURE_EXTRACTION_SECONDS = REGISTRY.histogram(
+    "audio_feature_extraction_seconds", "Thời gian trích xuất vector đặc trưng (không gồm giải mã)")
+QDRANT_SEARCH_SECONDS = REGISTRY.histogram(
+    "qdrant_search_seconds", "Thời gian một lần gọi tìm kiếm Qdrant", labelnames=("kind",))
+RESPONSE_SERIALIZATION_SECONDS = REGISTRY.histogram(
+    "search_response_serialization_seconds", "Thời gian serialize response tìm kiếm")
+STREAM_BYTES_SERVED = REGISTRY.histogram(
+    "stream_bytes_served", "Số bytes đã gửi của mỗi response file", labelnames=("type",), buckets=SIZE_BUCKETS)
+SEARCH_BATCH_SIZE = REGISTRY.histogram(
+    "search_batch_size", "Số truy vấn trong mỗi batch gửi đến Qdrant", buckets=(1, 2, 4, 8, 16, 32, 64))
+SEARCH_BATCH_WAIT_SECONDS = REGISTRY.histogram(
+    "search_batch_wait_seconds", "Thời gian truy vấn chờ trong hàng đợi trước khi được gửi theo batch",
+    buckets=(0.0001, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1))
+RERANK_SECONDS = REGISTRY.histogram(
+    "rerank_seconds", "Thời gian re-rank (DTW) các ứng viên của một truy vấn")
+RERANK_CANDIDATES_TOTAL = REGISTRY.counter(
+    "rerank_candidates_total", "Số ứng viên re-rank theo kết quả: scored, missing (không có chuỗi đặc trưng), "
+    "skipped (hết thời gian)", labelnames=("result",))
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests_total", "Số lần truy cập cache theo kết quả hit/miss", labelnames=("cache", "result"))
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight", "Số request HTTP đang được xử lý")
+
+
+def record_cache(cache: str, hit: bool):
+    """ Ghi nhận một lần truy cập cache """
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+class InFlightRequestsMiddleware:
+    """
+    ASGI middleware đếm số request HTTP đang xử lý (không bọc response body)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
@@ -0,0 +1,52 @@
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+
+from app.config import PEAKS_DIR, TEMP_DIR
+
+logger = logging.getLogger(__name__)
+
+
+def get_peaks_path(file_name: str, temp: bool = False) -> Path:
+    """
+    Lấy đường dẫn file peaks của một file audio
+
+    Args:
+        file_name: Tên file audio (file dataset hoặc file tạm)
+        temp: Nếu True, file peaks nằm trong TEMP_DIR và bị xóa cùng file tạm
+
+    Returns:
+        Đường dẫn đến file peaks
+    """
+    return (TEMP_DIR if temp else PEAKS_DIR) / f"{file_name}.peaks"
+
+
+def write_peaks(peaks: np.ndarray, peaks_path: Path) -> str:
+    """
+    Ghi peaks (int8, các cặp min/max liên tiếp) ra file nhị phân
+
+    Args:
+        peaks: Mảng int8 kích thước (bins, 2)
+        peaks_path: Đường dẫn file peaks
+
+    Returns:
+        Đường dẫn file peaks
+    """
+    peaks_path = Path(peaks_path)
+    # Ghi ra file tạm rồi đổi tên để request khác không đọc phải file ghi dở
+    tmp_path = peaks_path.with_name(f"{peaks_path.name}.{os.getpid()}.tmp")
+    np.ascontiguousarray(peaks, dtype=np.int8).tofile(tmp_path)
+    os.replace(tmp_path, peaks_path)
+    return str(peaks_path)
+
+
+def is_peaks_fresh(peaks_path: Path, source_path: str) -> bool:
+    """
+    Kiểm tra file peaks đã tồn tại và không cũ hơn file audio gốc
+    """
+    try:
+        return Path(peaks_path).stat().st_mtime >= os.path.getmtime(source_path)
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Dict
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from app.config import PREVIEW_DIR, PREVIEW_SAMPLE_RATE, PREVIEW_MAX_SECONDS
+from app.utils.metrics import record_cache
+from app.utils.profiling import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+# Khóa theo tên file để tránh nhiều request cùng tạo một bản preview
+_preview_locks: Dict[str, asyncio.Lock] = {}
+
+
+def get_preview_path(file_name: str) -> Path:
+    """
+    Lấy đường dẫn bản preview của một file dataset
+
+    Args:
+        file_name: Tên file audio gốc
+
+    Returns:
+        Đường dẫn đến file preview (.ogg)
+    """
+    return PREVIEW_DIR / f"{file_name}.ogg"
+
+
+def is_preview_fresh(preview_path: Path, source_path: str) -> bool:
+    """
+    Kiểm tra bản preview đã tồn tại và không cũ hơn file gốc
+    """
+    try:
+        return preview_path.stat().st_mtime >= os.path.getmtime(source_path)
+    except FileNotFoundError:
+        return False
+
+
+def write_preview(y: np.ndarray, sr: int, file_name: str) -> str:
+    """
+    Ghi bản preview (mono, sample rate thấp, OGG/Vorbis) từ tín hiệu đã giải mã
+
+    Args:
+        y: Audio time series (mono hoặc nhiều kênh)
+        sr: Sample rate của y
+        file_name: Tên file audio gốc
+
+    Returns:
+        Đường dẫn đến file preview
+    """
+    y_mono = librosa.to_mono(y)
+    # Cắt trước khi resample để không xử lý phần bị bỏ
+    y_mono = y_mono[:int(PREVIEW_MAX_SECONDS * sr)]
+    if sr != PREVIEW_SAMPLE_RATE:
+        y_mono = librosa.resample(y_mono, orig_sr=sr, target_sr=PREVIEW_SAMPLE_RATE)
+
+    preview_path = get_preview_path(file_name)
+    # Ghi ra file tạm rồi đổi tên để request khác không đọc phải file ghi dở
+    tmp_path = preview_path.with_name(f"{preview_path.name}.{os.getpid()}.tmp")
+    sf.write(tmp_path, np.clip(y_mono, -1.0, 1.0), PREVIEW_SAMPLE_RATE, format="OGG", subtype="VORBIS")
+    os.replace(tmp_path, preview_path)
+    logger.info(f"Đã tạo bản preview: {preview_path}")
+    return str(preview_path)
+
+
+def build_preview(source_path: str) -> str:
+    """
+    Giải mã file gốc và tạo bản preview
+
+    Args:
+        source_path: Đường dẫn đến file audio gốc
+
+    Returns:
+        Đường dẫn đến file preview
+    """
+    y, sr = librosa.load(source_path, sr=PREVIEW_SAMPLE_RATE, mono=True, duration=PREVIEW_MAX_SECONDS)
+    return write_preview(y, sr, os.path.basename(source_path))
+
+
+async def ensure_preview(source_path: str) -> str:
+    """
+    Trả về bản preview của file, tạo mới (ngoài event loop) nếu chưa có hoặc đã cũ
+
+    Args:
+        source_path: Đường dẫn đến file audio gốc
+
+    Returns:
+        Đường dẫn đến file preview
+    """
+    file_name = os.path.basename(source_path)
+    preview_path = get_preview_path(file_name)
+    if is_preview_fresh(preview_path, source_path):
+        record_cache("preview", hit=True)
+        return str(preview_path)
+
+    record_cache("preview", hit=False)
+    lock = _preview_locks.setdefault(file_name, asyncio.Lock())
+    async with lock:
+        # Request khác có thể đã tạo xong trong lúc chờ khóa
+        if not is_preview_fresh(preview_path, source_path):
+            await run_in_threadpool(build_preview, source_path)
+    _preview_locks.pop(file_name, None)
+    return str(preview_path)
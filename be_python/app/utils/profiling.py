@@ -0,0 +1,323 @@
+import functools
+import hmac
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from types import FrameType
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool as starlette_run_in_threadpool
+
+from app.config import ADMIN_TOKEN, PROFILE_SAMPLE_RATE, PROFILE_PATH_PREFIXES, PROFILE_DIR, PROFILE_RING_SIZE, \
+    PROFILE_INTERVAL_MS
+
+logger = logging.getLogger(__name__)
+
+# Định dạng profile được lưu: pstats (nhị phân, mở bằng pstats/snakeviz) và collapsed stack (flamegraph)
+PROFILE_FORMATS = {"pstats": ".prof", "collapsed": ".collapsed"}
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """ Kiểm tra token quản trị (so sánh thời gian hằng) """
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+# Profiler của request đang được profile; contextvars được copy sang thread pool nên công việc
+# mà request gửi sang thread pool (run_in_threadpool bên dưới) cũng được gắn vào profile
+_active_profiler: ContextVar[Optional["SamplingProfiler"]] = ContextVar("active_profiler", default=None)
+
+
+def current_profiler() -> Optional["SamplingProfiler"]:
+    """ Profiler của request hiện tại, None nếu request không được profile """
+    return _active_profiler.get()
+
+
+def attach_thread(func: Callable, profilers: Iterable["SamplingProfiler"]) -> Callable:
+    """ Bọc func để thread chạy func được lấy mẫu cho các profiler trong lúc func chạy """
+    profilers = [profiler for profiler in profilers if profiler is not None]
+    if not profilers:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Frame của wrapper là gốc của stack được ghi (bỏ phần vòng lặp của worker thread)
+        root = sys._getframe()
+        thread_id = threading.get_ident()
+        start_time = time.perf_counter()
+        for profiler in profilers:
+            profiler.attach(thread_id, root)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            for profiler in profilers:
+                profiler.detach(thread_id, elapsed)
+    return wrapper
+
+
+async def run_in_threadpool(func: Callable, *args, **kwargs):
+    """ starlette.concurrency.run_in_threadpool, gắn thread vào profile nếu request đang được profile """
+    return await starlette_run_in_threadpool(attach_thread(func, [current_profiler()]), *args, **kwargs)
+
+
+class SamplingProfiler:
+    """
+    Profiler lấy mẫu: một thread riêng đọc stack của mọi thread (sys._current_frames) mỗi interval_ms.
+    Chỉ ghi mẫu thuộc về request được profile:
+    - event loop: mẫu có frame gốc của request trong stack (bỏ các request khác chạy xen kẽ trên event loop)
+    - thread pool: thread đang chạy công việc do request gửi sang (attach_thread), kể cả truy vấn Qdrant
+      và xử lý tín hiệu; batch của SearchBatcher được tính cho mọi request được profile trong batch
+    Stack được ghi đầy đủ nên collapsed stack là chính xác; pstats được tổng hợp từ các mẫu
+    (số lần gọi là số mẫu, thời gian là tổng thời gian của các mẫu)
+    """
+
+    def __init__(self, root_frame: FrameType, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.loop_thread_id = threading.get_ident()
+        self.root_frame = root_frame
+        # Thread trong thread pool đang làm việc cho request -> frame gốc của công việc đó
+        self._threads: Dict[int, FrameType] = {}
+        self._lock = threading.Lock()
+        # Stack -> số mẫu và tổng thời gian (giây): mỗi mẫu được tính bằng thời gian thực kể từ mẫu trước
+        # (thread lấy mẫu phải chờ GIL nên chu kỳ thực tế thường dài hơn interval)
+        self.samples: Counter = Counter()
+        self.seconds: Counter = Counter()
+        self.sample_count = 0
+        # Tổng thời gian thực (giây) của công việc trong thread pool, đo trực tiếp
+        self.thread_seconds = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def attach(self, thread_id: int, root: FrameType):
+        with self._lock:
+            self._threads[thread_id] = root
+
+    def detach(self, thread_id: int, elapsed: float):
+        with self._lock:
+            self._threads.pop(thread_id, None)
+            self.thread_seconds += elapsed
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        last_time = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            elapsed, last_time = now - last_time, now
+            with self._lock:
+                threads = dict(self._threads)
+            stacks = [("event-loop",) + stack
+                      for stack in [self._stack(frames.get(self.loop_thread_id), self.root_frame)] if stack]
+            stacks += [("thread-pool",) + stack
+                       for stack in (self._stack(frames.get(thread_id), root) for thread_id, root in threads.items())
+                       if stack]
+            for stack in stacks:
+                self.samples[stack] += 1
+                self.seconds[stack] += elapsed
+            self.sample_count += 1
+
+    @staticmethod
+    def _stack(frame: Optional[FrameType], root: FrameType) -> Optional[Tuple]:
+        """ Stack từ frame gốc đến frame đang chạy, None nếu frame gốc không có trong stack """
+        functions = []
+        while frame is not None:
+            if frame is root:
+                return tuple(reversed(functions))
+            code = frame.f_code
+            functions.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        return None
+
+    def collapsed_stacks(self) -> List[str]:
+        """ Collapsed stack format (mỗi dòng: "frame1;frame2;...;frameN thời_gian_us") """
+        def label(function) -> str:
+            if isinstance(function, str):
+                return function
+            file_name, line, name = function
+            return f"{name} ({os.path.basename(file_name)}:{line})"
+
+        return [f"{';'.join(label(function) for function in stack)} {int(seconds * 1e6)}"
+                for stack, seconds in self.seconds.items()]
+
+    def pstats(self) -> pstats.Stats:
+        """ pstats.Stats tổng hợp từ các mẫu (mở bằng pstats/snakeviz như profile của cProfile) """
+        # func -> [số mẫu, số mẫu, self time, cumulative time, {caller: [...]}]
+        entries: Dict[Tuple, list] = {}
+        for stack, count in self.samples.items():
+            functions = stack[1:]
+            seconds = self.seconds[stack]
+            for depth, function in enumerate(functions):
+                entry = entries.setdefault(function, [0, 0, 0.0, 0.0, {}])
+                # Hàm đệ quy chỉ được tính một lần mỗi mẫu
+                if function not in functions[:depth]:
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += seconds
+                if depth > 0:
+                    caller = entry[4].setdefault(functions[depth - 1], [0, 0, 0.0, 0.0])
+                    caller[0] += count
+                    caller[1] += count
+                    caller[3] += seconds
+            if functions:
+                entries[functions[-1]][2] += seconds
+                caller = entries[functions[-1]][4].get(functions[-2]) if len(functions) > 1 else None
+                if caller is not None:
+                    caller[2] += seconds
+        stats = pstats.Stats()
+        stats.stats = {
+            function: (nc, cc, tt, ct, {caller: tuple(values) for caller, values in callers.items()})
+            for function, (nc, cc, tt, ct, callers) in entries.items()
+        }
+        return stats
+
+
+class ProfileStore:
+    """
+    Lưu profile trên đĩa theo kiểu vòng tròn (giữ tối đa ring_size profile mới nhất)
+    """
+
+    def __init__(self, directory: Path = PROFILE_DIR, ring_size: int = PROFILE_RING_SIZE):
+        self.directory = Path(directory)
+        self.ring_size = ring_size
+
+    def save(self, profiler: SamplingProfiler, meta: Dict) -> str:
+        """
+        Lưu một profile (pstats, collapsed stack và metadata)
+
+        Args:
+            profiler: Profiler đã dừng
+            meta: Thông tin request (method, path, thời gian xử lý, ...)
+
+        Returns:
+            ID của profile
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile_id = meta["id"]
+        base = self.directory / profile_id
+        profiler.pstats().dump_stats(f"{base}{PROFILE_FORMATS['pstats']}")
+        with open(f"{base}{PROFILE_FORMATS['collapsed']}", "w", encoding="utf-8") as f:
+            f.write("\n".join(profiler.collapsed_stacks()))
+        with open(f"{base}.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        self._trim()
+        return profile_id
+
+    def _trim(self):
+        """ Xóa các profile cũ nhất khi vượt quá ring_size """
+        # ID bắt đầu bằng timestamp (ms) nên sắp xếp theo tên là sắp xếp theo thời gian
+        profile_ids = sorted(path.stem for path in self.directory.glob("*.json"))
+        for profile_id in profile_ids[:-self.ring_size] if self.ring_size > 0 else profile_ids:
+            for suffix in (*PROFILE_FORMATS.values(), ".json"):
+                try:
+                    os.remove(self.directory / f"{profile_id}{suffix}")
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[Dict]:
+        """ Danh sách metadata các profile đang lưu, mới nhất trước """
+        profiles = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def get_path(self, profile_id: str, fmt: str = "pstats") -> Optional[Path]:
+        """ Đường dẫn file profile theo định dạng, None nếu không tồn tại """
+        if fmt not in PROFILE_FORMATS or os.path.basename(profile_id) != profile_id:
+            return None
+        path = self.directory / f"{profile_id}{PROFILE_FORMATS[fmt]}"
+        return path if path.exists() else None
+
+
+profile_store = ProfileStore()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profile request (SamplingProfiler) khi có header X-Profile hợp lệ hoặc được lấy mẫu.
+    Chỉ một request được profile tại một thời điểm; profile gồm code của request trên event loop và công việc
+    request gửi sang thread pool qua run_in_threadpool của module này, không gồm các request chạy đồng thời.
+    """
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 path_prefixes: tuple = PROFILE_PATH_PREFIXES, store: ProfileStore = profile_store):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.path_prefixes = path_prefixes
+        self.store = store
+        self._active = False
+
+    def _should_profile(self, scope) -> Optional[str]:
+        """ Trả về lý do profile ("header"/"sampled") hoặc None """
+        if self._active or not scope["path"].startswith(self.path_prefixes):
+            return None
+        for name, value in scope["headers"]:
+            if name == b"x-profile" and is_admin_token(value.decode("latin-1")):
+                return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        reason = self._should_profile(scope) if scope["type"] == "http" else None
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        self._active = True
+        profile_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        status = {"code": None}
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        profiler = SamplingProfiler(sys._getframe())
+        token = _active_profiler.set(profiler)
+        start_time = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop()
+            _active_profiler.reset(token)
+            self._active = False
+            meta = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status["code"],
+                "reason": reason,
+                "duration_seconds": round(time.perf_counter() - start_time, 6),
+                "thread_pool_seconds": round(profiler.thread_seconds, 6),
+                "samples": profiler.sample_count,
+                "interval_ms": profiler.interval * 1000,
+                "created_at": time.time(),
+            }
+            try:
+                await starlette_run_in_threadpool(self.store.save, profiler, meta)
+                logger.info(f"Đã lưu profile {profile_id} cho {scope['method']} {scope['path']}")
+            except Exception as e:
+                logger.error(f"Không thể lưu profile {profile_id}: {str(e)}")
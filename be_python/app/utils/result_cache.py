@@ -0,0 +1,120 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from cachetools import TTLCache
+
+from app.config import RESULT_CACHE_BACKEND, RESULT_CACHE_PATH, RESULT_CACHE_MAXSIZE, TEMP_FILE_TTL_MINUTES
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryResultCache:
+    """
+    Cache kết quả tìm kiếm trong bộ nhớ của tiến trình (chỉ dùng được khi chạy một worker).
+    Có khóa vì được gọi từ thread pool giống SQLiteResultCache.
+    """
+
+    def __init__(self, ttl_seconds: float, maxsize: int = RESULT_CACHE_MAXSIZE):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl_seconds)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            return self._cache.get(key)
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._cache[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._cache
+
+
+class SQLiteResultCache:
+    """
+    Cache kết quả tìm kiếm dùng chung giữa các worker trên cùng máy (SQLite ở chế độ WAL).
+    Giá trị được lưu dạng JSON kèm thời điểm hết hạn; mục hết hạn bị bỏ qua khi đọc
+    và được xóa định kỳ khi ghi. Các phương thức đều chặn (chờ khóa tối đa 5 giây)
+    nên phải gọi từ thread pool, không gọi trực tiếp trên event loop.
+    """
+
+    # Số lần ghi giữa hai lần xóa mục hết hạn
+    PURGE_EVERY = 100
+
+    def __init__(self, path: Path, ttl_seconds: float, maxsize: int = RESULT_CACHE_MAXSIZE):
+        self.path = Path(path)
+        self.ttl = ttl_seconds
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._writes = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_result_cache_expires_at ON result_cache (expires_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """ Mỗi thread dùng một connection riêng """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._connection().execute(
+            "SELECT value FROM result_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any):
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO result_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + self.ttl)
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.purge(connection)
+
+    def purge(self, connection: Optional[sqlite3.Connection] = None):
+        """ Xóa mục hết hạn và giới hạn số mục theo maxsize (xóa mục sắp hết hạn nhất) """
+        connection = connection or self._connection()
+        connection.execute("DELETE FROM result_cache WHERE expires_at <= ?", (time.time(),))
+        connection.execute(
+            "DELETE FROM result_cache WHERE key IN ("
+            "SELECT key FROM result_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,)
+        )
+
+    def __contains__(self, key: str) -> bool:
+        row = self._connection().execute(
+            "SELECT 1 FROM result_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row is not None
+
+
+def create_result_cache(ttl_seconds: float = TEMP_FILE_TTL_MINUTES * 60):
+    """
+    Tạo cache kết quả tìm kiếm theo RESULT_CACHE_BACKEND ("memory" hoặc "sqlite")
+    Args:
+        ttl_seconds: Thời gian sống của mỗi kết quả
+    Returns:
+        MemoryResultCache hoặc SQLiteResultCache
+    """
+    if RESULT_CACHE_BACKEND == "sqlite":
+        logger.info(f"Sử dụng cache kết quả SQLite dùng chung: {RESULT_CACHE_PATH}")
+        return SQLiteResultCache(RESULT_CACHE_PATH, ttl_seconds)
+    if RESULT_CACHE_BACKEND != "memory":
+        raise ValueError(f"RESULT_CACHE_BACKEND không hợp lệ: {RESULT_CACHE_BACKEND}")
+    return MemoryResultCache(ttl_seconds)
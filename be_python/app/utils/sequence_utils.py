@@ -0,0 +1,57 @@
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app.config import SEQUENCE_DIR, TEMP_DIR
+
+logger = logging.getLogger(__name__)
+
+
+def get_sequence_path(file_name: str, temp: bool = False) -> Path:
+    """
+    Lấy đường dẫn file chuỗi đặc trưng theo frame của một file audio
+
+    Args:
+        file_name: Tên file audio (file dataset hoặc file tạm)
+        temp: Nếu True, file nằm trong TEMP_DIR và bị xóa cùng file tạm
+
+    Returns:
+        Đường dẫn đến file chuỗi đặc trưng (.npy)
+    """
+    return (TEMP_DIR if temp else SEQUENCE_DIR) / f"{file_name}.seq.npy"
+
+
+def write_sequence(sequence: np.ndarray, sequence_path: Path) -> str:
+    """
+    Ghi chuỗi đặc trưng (float16, kích thước (số frame, số hệ số)) ra file .npy
+
+    Args:
+        sequence: Chuỗi đặc trưng
+        sequence_path: Đường dẫn file
+
+    Returns:
+        Đường dẫn file
+    """
+    sequence_path = Path(sequence_path)
+    # Ghi ra file tạm rồi đổi tên để request khác không đọc phải file ghi dở
+    tmp_path = sequence_path.with_name(f"{sequence_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(sequence, dtype=np.float16))
+    os.replace(tmp_path, sequence_path)
+    return str(sequence_path)
+
+
+def load_sequence(sequence_path: Path) -> Optional[np.ndarray]:
+    """
+    Đọc chuỗi đặc trưng dạng memory-map (chỉ các trang được dùng mới được nạp)
+
+    Returns:
+        Mảng float16 chỉ đọc, None nếu file không tồn tại
+    """
+    try:
+        return np.load(sequence_path, mmap_mode="r")
+    except FileNotFoundError:
+        return None
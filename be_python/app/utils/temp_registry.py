@@ -0,0 +1,227 @@
+import asyncio
+import heapq
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config import TEMP_DIR, TEMP_FILE_TTL_MINUTES, TEMP_LEASE_TIMEOUT_SECONDS
+from app.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+class TempFileRegistry:
+    """
+    Quản lý vòng đời file tạm bằng heap theo thời điểm hết hạn:
+    mỗi lần dọn dẹp chỉ xử lý các file đã hết hạn (O(số file hết hạn · log n)), không quét thư mục.
+    File đang được stream (có lease) hoặc thuộc query_id còn trong cache sẽ được gia hạn.
+
+    Khi chạy nhiều worker, lease và query_id chỉ nằm trong tiến trình đã tạo file; trạng thái dùng chung
+    là mtime của file: tiến trình sở hữu chạm (touch) file mỗi lần gia hạn, còn file do tiến trình khác tạo
+    (đăng ký qua scan_existing) chỉ bị xóa khi mtime đã cũ hơn 2·TTL và không bao giờ bị purge_all xóa.
+    Chỉ được gọi từ event loop nên không cần khóa (check_expired chạy trong thread pool nhưng chỉ đọc danh sách
+    được truyền vào).
+    """
+
+    def __init__(self, ttl_seconds: float = TEMP_FILE_TTL_MINUTES * 60,
+                 lease_timeout: float = TEMP_LEASE_TIMEOUT_SECONDS):
+        self.ttl = ttl_seconds
+        self.lease_timeout = lease_timeout
+        # path -> {"expires_at", "query_id", "owned", "leases", "lease_expires_at"}
+        self._entries: Dict[str, Dict] = {}
+        # (expires_at, path); phần tử cũ (expires_at khác entry hiện tại) bị bỏ qua khi pop
+        self._heap: List[Tuple[float, str]] = []
+        # Kiểm tra query_id còn trong cache kết quả hay không
+        self.is_query_alive: Callable[[str], bool] = lambda query_id: False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _schedule(self, path: str, expires_at: float):
+        self._entries[path]["expires_at"] = expires_at
+        heapq.heappush(self._heap, (expires_at, path))
+
+    def register(self, path: str, query_id: Optional[str] = None, expires_at: Optional[float] = None,
+                 owned: bool = True):
+        """
+        Đăng ký file tạm để tự động xóa khi hết hạn
+
+        Args:
+            path: Đường dẫn file tạm
+            query_id: query_id sở hữu file, file được giữ khi kết quả của query_id còn trong cache
+            expires_at: Thời điểm hết hạn (mặc định: hiện tại + TTL)
+            owned: File do tiến trình này tạo (False với file có sẵn, có thể thuộc worker khác)
+        """
+        path = str(path)
+        entry = self._entries.setdefault(path, {"leases": 0, "lease_expires_at": 0.0})
+        entry["query_id"] = query_id
+        entry["owned"] = owned
+        self._schedule(path, expires_at if expires_at is not None else time.time() + self.ttl)
+
+    def lease(self, path: str) -> bool:
+        """
+        Giữ file trong lúc stream, trả về False nếu file không được quản lý
+        """
+        entry = self._entries.get(str(path))
+        if entry is None:
+            return False
+        entry["leases"] += 1
+        entry["lease_expires_at"] = time.time() + self.lease_timeout
+        return True
+
+    def release(self, path: str):
+        """ Trả lease khi stream đã gửi xong """
+        entry = self._entries.get(str(path))
+        if entry is not None and entry["leases"] > 0:
+            entry["leases"] -= 1
+
+    def next_expiry(self) -> Optional[float]:
+        """ Thời điểm hết hạn sớm nhất, None nếu không có file nào """
+        return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, now: float) -> List[Tuple[str, float, Optional[str], bool]]:
+        """
+        Lấy ra các file đã đến hạn và không còn được stream. Entry vẫn được giữ lại:
+        check_expired quyết định gia hạn hay xóa, resolve_expired áp dụng kết quả.
+
+        Args:
+            now: Thời điểm hiện tại
+
+        Returns:
+            Danh sách (đường dẫn, thời điểm hết hạn, query_id, owned) của các file đến hạn
+        """
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, path = heapq.heappop(self._heap)
+            entry = self._entries.get(path)
+            if entry is None or entry["expires_at"] != expires_at:
+                continue
+            if entry["leases"] > 0 and now < entry["lease_expires_at"]:
+                # Đang được stream: kiểm tra lại sau một TTL (hoặc khi lease hết hạn nếu sớm hơn)
+                self._schedule(path, min(entry["lease_expires_at"], now + self.ttl))
+                continue
+            due.append((path, expires_at, entry["query_id"], entry["owned"]))
+        return due
+
+    def check_expired(self, due: List[Tuple[str, float, Optional[str], bool]], now: float) -> Dict[str, float]:
+        """
+        Tính thời điểm hết hạn mới cho các file đến hạn cần giữ lại.
+        Có thể chặn (is_query_alive truy vấn cache SQLite, stat/touch file) nên chạy trong thread pool,
+        chỉ đọc danh sách due, không đụng tới trạng thái của registry.
+
+        Returns:
+            path -> thời điểm hết hạn mới; file không có trong kết quả có thể xóa
+        """
+        renewed = {}
+        for path, _, query_id, owned in due:
+            try:
+                if owned:
+                    if query_id and self.is_query_alive(query_id):
+                        # Kết quả tìm kiếm vẫn còn trong cache: giữ thêm một TTL,
+                        # chạm file để worker khác (đã đăng ký file qua scan_existing) cũng giữ lại
+                        os.utime(path)
+                        renewed[path] = now + self.ttl
+                else:
+                    # File của tiến trình khác: chỉ xóa khi tiến trình sở hữu không còn gia hạn
+                    expires_at = os.stat(path).st_mtime + 2 * self.ttl
+                    if expires_at > now:
+                        renewed[path] = expires_at
+            except FileNotFoundError:
+                pass
+        return renewed
+
+    def resolve_expired(self, due: List[Tuple[str, float, Optional[str], bool]], renewed: Dict[str, float],
+                        now: float) -> List[str]:
+        """
+        Áp dụng kết quả của check_expired, bỏ qua file được đăng ký lại hoặc bắt đầu stream trong lúc kiểm tra
+
+        Returns:
+            Danh sách đường dẫn file cần xóa
+        """
+        expired = []
+        for path, expires_at, _, _ in due:
+            entry = self._entries.get(path)
+            if entry is None or entry["expires_at"] != expires_at:
+                continue
+            if path in renewed:
+                self._schedule(path, renewed[path])
+            elif entry["leases"] > 0 and now < entry["lease_expires_at"]:
+                self._schedule(path, entry["lease_expires_at"])
+            else:
+                del self._entries[path]
+                expired.append(path)
+        return expired
+
+    def scan_existing(self):
+        """
+        Đăng ký các file có sẵn trong TEMP_DIR (từ lần chạy trước hoặc của worker khác đang chạy),
+        hết hạn khi mtime cũ hơn 2·TTL. Chỉ chạy một lần khi khởi động.
+        """
+        with os.scandir(TEMP_DIR) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.path not in self._entries:
+                    self.register(entry.path, expires_at=entry.stat().st_mtime + 2 * self.ttl, owned=False)
+
+    async def purge_expired(self, max_retries: int = 3, retry_delay: float = 1.0) -> int:
+        """
+        Xóa các file đã hết hạn, thao tác xóa chạy ngoài event loop
+
+        Returns:
+            Số file đã xóa
+        """
+        now = time.time()
+        due = self.pop_expired(now)
+        renewed = await asyncio.to_thread(self.check_expired, due, now) if due else {}
+        paths = self.resolve_expired(due, renewed, time.time())
+        results = await asyncio.gather(*(remove_file(path, max_retries, retry_delay) for path in paths))
+        return sum(results)
+
+    async def purge_all(self, keep_alive_queries: bool = False) -> int:
+        """
+        Xóa các file do tiến trình này tạo và không đang được stream (dùng khi tắt ứng dụng)
+
+        Args:
+            keep_alive_queries: Giữ file của query_id còn trong cache (cache dùng chung còn sống sau tiến trình),
+                                file được giữ sẽ do worker khác hoặc lần chạy sau dọn qua scan_existing
+        """
+        owned = {path: entry["query_id"] for path, entry in self._entries.items()
+                 if entry["owned"] and entry["leases"] == 0}
+        alive = set()
+        if keep_alive_queries:
+            def find_alive():
+                return {query_id for query_id in set(owned.values()) if query_id and self.is_query_alive(query_id)}
+            alive = await asyncio.to_thread(find_alive)
+        paths = [path for path, query_id in owned.items() if query_id not in alive]
+        for path in paths:
+            self._entries.pop(path, None)
+        results = await asyncio.gather(*(remove_file(path, max_retries=1) for path in paths))
+        return sum(results)
+
+
+async def remove_file(path: str, max_retries: int = 3, retry_delay: float = 1.0) -> bool:
+    """
+    Xóa file trong thread pool, thử lại (không chặn event loop) nếu thất bại
+
+    Returns:
+        True nếu file đã bị xóa
+    """
+    for attempt in range(max_retries):
+        try:
+            await asyncio.to_thread(os.remove, path)
+            logger.info(f"Đã xóa file tạm thời: {path}")
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            if attempt < max_retries - 1:
+                logger.warning(f"Thử lại xóa file {path} (lần {attempt + 1}): {str(e)}")
+                await asyncio.sleep(retry_delay)
+            else:
+                logger.error(f"Không thể xóa file tạm thời {path} sau {max_retries} lần thử: {str(e)}")
+    return False
+
+
+temp_registry = TempFileRegistry()
+
+REGISTRY.gauge("temp_dir_files", "Số file tạm đang được quản lý", callback=lambda: len(temp_registry))
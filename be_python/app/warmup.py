@@ -0,0 +1,130 @@
+import io
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import librosa
+import numpy as np
+import soundfile as sf
+from starlette.concurrency import run_in_threadpool
+
+from app.config import SAMPLE_RATE, PREVIEW_SAMPLE_RATE
+from app.database.qdrant_manager import QdrantManager
+from app.database.search_batcher import SearchBatcher
+from app.feature_extractor import AudioFeatureExtractor
+
+logger = logging.getLogger(__name__)
+
+# Các hàm nạp trước (ví dụ index trong bộ nhớ) chạy ở cuối warm-up, theo thứ tự đăng ký
+_warmup_hooks: List[Tuple[str, Callable[[], Any]]] = []
+
+
+def register_warmup_hook(name: str, func: Callable[[], Any]):
+    """
+    Đăng ký một hàm chạy trong warm-up (trong thread pool), trước khi ứng dụng sẵn sàng
+
+    Args:
+        name: Tên bước, hiển thị trong /ready
+        func: Hàm không tham số
+    """
+    _warmup_hooks.append((name, func))
+
+
+class WarmupState:
+    """
+    Trạng thái warm-up: thời gian và lỗi (nếu có) của từng bước, ready khi đã chạy xong
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        duration = None
+        if self.started_at is not None and self.finished_at is not None:
+            duration = round(self.finished_at - self.started_at, 4)
+        return {"ready": self.ready, "duration_seconds": duration, "steps": self.steps}
+
+
+warmup_state = WarmupState()
+
+
+def make_synthetic_audio(sr: int, seconds: float = 2.0) -> np.ndarray:
+    """ Tín hiệu stereo tổng hợp (hợp âm và nhiễu nhẹ) để chạy thử pipeline trích xuất """
+    t = np.arange(int(sr * seconds)) / sr
+    tone = sum(np.sin(2 * np.pi * freq * t) for freq in (220.0, 277.2, 329.6)) / 3
+    noise = np.random.default_rng(0).normal(scale=0.01, size=t.size)
+    y = (0.5 * tone + noise).astype(np.float32)
+    return np.stack([y, y[::-1]])
+
+
+def warm_decode() -> Tuple[np.ndarray, int]:
+    """ Giải mã một file WAV trong bộ nhớ có sample rate khác SAMPLE_RATE (nạp soundfile và resampler) """
+    source_sr = 44100 if SAMPLE_RATE != 44100 else 48000
+    buffer = io.BytesIO()
+    sf.write(buffer, make_synthetic_audio(source_sr).T, source_sr, format="WAV")
+    buffer.seek(0)
+    return librosa.load(buffer, sr=SAMPLE_RATE, mono=False)
+
+
+def warm_extraction(feature_extractor: AudioFeatureExtractor, y: np.ndarray, sr: int) -> np.ndarray:
+    """ Chạy thử trích xuất đặc trưng, peaks và landmark (import lười, JIT của numba, filterbank) """
+    feature_extractor.compute_peaks(y)
+    feature_extractor.compute_landmarks(y)
+    librosa.get_duration(y=y, sr=sr)
+    return feature_extractor.extract_vector(y, sr)
+
+
+def warm_preview(y: np.ndarray, sr: int):
+    """ Chạy thử resample và mã hóa OGG/Vorbis như khi tạo bản preview (không ghi ra đĩa) """
+    y_mono = librosa.resample(librosa.to_mono(y), orig_sr=sr, target_sr=PREVIEW_SAMPLE_RATE)
+    sf.write(io.BytesIO(), y_mono, PREVIEW_SAMPLE_RATE, format="OGG", subtype="VORBIS")
+
+
+async def _run_step(name: str, func: Callable, *args) -> Any:
+    """ Chạy một bước warm-up trong thread pool, ghi nhận thời gian và lỗi """
+    start_time = time.perf_counter()
+    try:
+        result = await run_in_threadpool(func, *args)
+        warmup_state.steps[name] = {"seconds": round(time.perf_counter() - start_time, 4)}
+        return result
+    except Exception as e:
+        warmup_state.steps[name] = {"seconds": round(time.perf_counter() - start_time, 4), "error": str(e)}
+        logger.warning(f"Warm-up: bước {name} thất bại: {str(e)}")
+        return None
+
+
+async def run_warmup(feature_extractor: AudioFeatureExtractor, qdrant_manager: QdrantManager,
+                     batcher: SearchBatcher):
+    """
+    Làm nóng ứng dụng trước khi nhận traffic: giải mã, trích xuất đặc trưng tổng hợp, kết nối
+    vector store, một truy vấn thử qua batcher và các hook nạp trước index.
+    Lỗi của từng bước chỉ được ghi nhận, ứng dụng vẫn chuyển sang ready khi chạy xong.
+    """
+    warmup_state.started_at = time.time()
+    logger.info("Bắt đầu warm-up")
+
+    decoded = await _run_step("decode", warm_decode)
+    y, sr = decoded if decoded is not None else (make_synthetic_audio(SAMPLE_RATE), SAMPLE_RATE)
+    vector = await _run_step("extraction", warm_extraction, feature_extractor, y, sr)
+    await _run_step("preview", warm_preview, y, sr)
+
+    collection_info = await _run_step("vector_store", qdrant_manager.get_collection_info)
+    if vector is not None and collection_info and collection_info.get("points_count"):
+        start_time = time.perf_counter()
+        try:
+            await batcher.search_similar(vector, top_k=1)
+            warmup_state.steps["search"] = {"seconds": round(time.perf_counter() - start_time, 4)}
+        except Exception as e:
+            warmup_state.steps["search"] = {"seconds": round(time.perf_counter() - start_time, 4), "error": str(e)}
+            logger.warning(f"Warm-up: truy vấn thử thất bại: {str(e)}")
+
+    for name, func in _warmup_hooks:
+        await _run_step(name, func)
+
+    warmup_state.finished_at = time.time()
+    warmup_state.ready = True
+    logger.info(f"Warm-up hoàn tất sau {warmup_state.finished_at - warmup_state.started_at:.2f} giây",
+                extra={"timings": {name: step["seconds"] for name, step in warmup_state.steps.items()}})
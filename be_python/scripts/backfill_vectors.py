@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+# Đặt mã hóa stdout thành UTF-8 để tránh lỗi UnicodeEncodeError
+sys.stdout.reconfigure(encoding='utf-8')
+sys.stderr.reconfigure(encoding='utf-8')
+
+# Thêm thư mục gốc vào sys.path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.indexing.backfill import backfill_vectors
+from app.indexing.manifest import IndexManifest
+from app.config import AUDIO_DATASET_PATH, INDEX_MANIFEST_PATH, INDEX_BATCH_SIZE
+
+# Cấu hình logging với mã hóa UTF-8
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler("backfill_vectors.log", encoding='utf-8')
+    ]
+)
+
+logger = logging.getLogger("backfill_vectors")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Bổ sung một phiên bản vector đặc trưng cho các point chưa có, trong khi API vẫn phục vụ "
+                    "(có thể dừng và chạy lại)")
+    parser.add_argument("version", type=str, help="Phiên bản vector (ví dụ: v2)")
+    parser.add_argument("--directory", type=str, default=AUDIO_DATASET_PATH, help="Thư mục dataset")
+    parser.add_argument("--manifest", type=str, default=str(INDEX_MANIFEST_PATH), help="Đường dẫn file manifest")
+    parser.add_argument("--batch-size", type=int, default=INDEX_BATCH_SIZE, help="Số point mỗi lần ghi")
+    parser.add_argument("--keep-old", action="store_true",
+                        help="Giữ lại collection cũ nếu phải tạo collection mới để thêm phiên bản")
+    args = parser.parse_args()
+
+    try:
+        stats = backfill_vectors(args.version, directory_path=args.directory,
+                                 manifest=IndexManifest.load(Path(args.manifest)),
+                                 batch_size=args.batch_size, keep_old=args.keep_old)
+        logger.info(f"Đã cập nhật: {stats['updated']}, bỏ qua (không có trong manifest): {stats['skipped']}, "
+                    f"lỗi: {stats['failed']}")
+    except Exception as e:
+        logger.error(f"Lỗi khi backfill vector {args.version}: {str(e)}")
+        sys.exit(1)
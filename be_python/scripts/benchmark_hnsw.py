@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Đặt mã hóa stdout thành UTF-8 để tránh lỗi UnicodeEncodeError
+if hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8')
+if hasattr(sys.stderr, 'reconfigure'):
+    sys.stderr.reconfigure(encoding='utf-8')
+
+# Thêm thư mục gốc vào sys.path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from qdrant_client.http import models
+
+from app.config import QDRANT_LOCATION, SEARCH_VECTOR_VERSION, HNSW_M, HNSW_EF_CONSTRUCT, HNSW_FULL_SCAN_THRESHOLD
+from app.database.qdrant_manager import QdrantManager, build_search_params
+from app.knn_graph import load_vectors
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger("benchmark_hnsw")
+
+
+def parse_int_list(value: str) -> List[int]:
+    """ Đọc danh sách số nguyên phân tách bằng dấu phẩy """
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def exact_ground_truth(vectors: np.ndarray, query_positions: np.ndarray, k: int,
+                       block_size: int = 256) -> np.ndarray:
+    """
+    Top-k chính xác của từng truy vấn bằng brute force trên toàn bộ vector (đã chuẩn hóa L2, tích vô hướng
+    là độ tương đồng cosine), bỏ chính point truy vấn
+
+    Returns:
+        Vị trí trong ma trận vector của k láng giềng gần nhất, shape (số truy vấn, k)
+    """
+    truth = np.empty((len(query_positions), k), dtype=np.int64)
+    for start in range(0, len(query_positions), block_size):
+        block = query_positions[start:start + block_size]
+        similarities = vectors[block] @ vectors.T
+        similarities[np.arange(len(block)), block] = -np.inf
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(similarities, top, axis=1), axis=1, kind="stable")
+        truth[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+    return truth
+
+
+def create_bench_collection(qdrant_manager: QdrantManager, name: str, vector_name: Optional[str],
+                            ids: np.ndarray, vectors: np.ndarray, hnsw_config: models.HnswConfigDiff,
+                            batch_size: int = 256) -> float:
+    """
+    Tạo collection tạm chỉ chứa vector cần đo với cấu hình HNSW cho trước và chờ Qdrant xây xong chỉ mục
+
+    Returns:
+        Thời gian nạp và xây chỉ mục (giây)
+    """
+    client = qdrant_manager.client
+    vector_params = models.VectorParams(size=vectors.shape[1], distance=models.Distance.COSINE, on_disk=True)
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    start_time = time.perf_counter()
+    client.create_collection(
+        collection_name=name,
+        vectors_config={vector_name: vector_params} if vector_name else vector_params,
+        hnsw_config=hnsw_config,
+        # Xây chỉ mục HNSW cả với collection nhỏ (mặc định Qdrant chỉ xây khi segment lớn hơn 20000 KB)
+        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=1)
+    )
+    for start in range(0, len(ids), batch_size):
+        batch = vectors[start:start + batch_size]
+        client.upsert(
+            collection_name=name,
+            points=models.Batch(
+                ids=ids[start:start + batch_size].tolist(),
+                vectors={vector_name: batch.tolist()} if vector_name else batch.tolist()
+            ),
+            wait=True
+        )
+    # Qdrant local mode không xây chỉ mục (indexed_vectors_count luôn bằng 0)
+    if not QDRANT_LOCATION:
+        wait_for_index(qdrant_manager, name, len(ids))
+    return time.perf_counter() - start_time
+
+
+def wait_for_index(qdrant_manager: QdrantManager, name: str, points: int, timeout: float = 600.0):
+    """ Chờ collection về trạng thái green và mọi vector đã được đưa vào chỉ mục """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        info = qdrant_manager.client.get_collection(name)
+        if info.status == models.CollectionStatus.GREEN and (info.indexed_vectors_count or 0) >= points:
+            return
+        time.sleep(0.5)
+    logger.warning(f"Collection {name} chưa xây xong chỉ mục sau {timeout:.0f} giây, kết quả có thể chưa chính xác")
+
+
+def measure(qdrant_manager: QdrantManager, collection_name: str, vector_name: Optional[str], ids: np.ndarray,
+            vectors: np.ndarray, query_positions: np.ndarray, truth: np.ndarray, k: int,
+            search_params: Optional[models.SearchParams]) -> Dict[str, float]:
+    """
+    Truy vấn tuần tự từng vector và so sánh với top-k chính xác
+
+    Returns:
+        recall@k trung bình và độ trễ (ms) mỗi truy vấn
+    """
+    client = qdrant_manager.client
+    latencies, recalls = [], []
+    for position, expected in zip(query_positions, truth):
+        start_time = time.perf_counter()
+        response = client.query_points(
+            collection_name=collection_name,
+            query=vectors[position].tolist(),
+            using=vector_name,
+            limit=k + 1,
+            search_params=search_params,
+            with_payload=False
+        )
+        latencies.append(time.perf_counter() - start_time)
+        # Bỏ chính point truy vấn như ground truth
+        found = [point.id for point in response.points if point.id != ids[position]][:k]
+        recalls.append(len(set(found) & set(ids[expected].tolist())) / k)
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "recall": round(float(np.mean(recalls)), 4),
+        "mean_ms": round(float(latencies.mean()), 3),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "qps": round(1000 / float(latencies.mean()), 1),
+    }
+
+
+def sweep_search_params(qdrant_manager: QdrantManager, collection_name: str, vector_name: Optional[str],
+                        ids: np.ndarray, vectors: np.ndarray, query_positions: np.ndarray, truth: np.ndarray,
+                        k: int, ef_values: List[int]) -> List[Dict]:
+    """ Đo mọi giá trị hnsw_ef và tìm kiếm chính xác (exact) trên một collection """
+    rows = []
+    settings = [{"hnsw_ef": ef} for ef in ef_values] + [{"exact": True}]
+    # Truy vấn làm nóng (nạp vector trên đĩa vào page cache) trước khi đo
+    measure(qdrant_manager, collection_name, vector_name, ids, vectors, query_positions[:10], truth[:10], k, None)
+    for params in settings:
+        row = measure(qdrant_manager, collection_name, vector_name, ids, vectors, query_positions, truth, k,
+                      build_search_params(**params))
+        rows.append({"hnsw_ef": params.get("hnsw_ef"), "exact": params.get("exact", False), **row})
+    return rows
+
+
+def print_report(report: Dict):
+    print(f"\n{report['points']} vectors ({report['vector_version']}), {report['queries']} truy vấn, "
+          f"recall@{report['k']} so với brute force")
+    print(f"{'m':>4} {'ef_constr':>9} {'build s':>8} {'hnsw_ef':>8} {'recall':>8} {'mean ms':>9} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'qps':>9}")
+    for index in report["indexes"]:
+        # Đo trên collection hiện tại (--current): không có cấu hình chỉ mục và thời gian xây
+        m, ef_construct, build_seconds = ("-" if index[key] is None else index[key]
+                                          for key in ("m", "ef_construct", "build_seconds"))
+        for row in index["search"]:
+            hnsw_ef = "exact" if row["exact"] else row["hnsw_ef"]
+            print(f"{m:>4} {ef_construct:>9} {build_seconds:>8} "
+                  f"{hnsw_ef:>8} {row['recall']:>8.4f} {row['mean_ms']:>9} {row['p50_ms']:>9} {row['p95_ms']:>9} "
+                  f"{row['qps']:>9}")
+
+
+def main(args) -> Dict:
+    if QDRANT_LOCATION:
+        logger.warning("Qdrant local mode không có chỉ mục HNSW (luôn so sánh với mọi vector): recall luôn bằng 1, "
+                       "cần chạy với Qdrant server để có kết quả có ý nghĩa")
+    qdrant_manager = QdrantManager()
+    vector_name = qdrant_manager.resolve_vector_name(args.vector_version)
+    ids, vectors = load_vectors(qdrant_manager, args.vector_version)
+    if len(ids) <= args.k:
+        raise ValueError(f"Collection cần nhiều hơn {args.k} vectors để đo recall@{args.k}")
+
+    rng = np.random.default_rng(args.seed)
+    query_positions = np.sort(rng.choice(len(ids), size=min(args.queries, len(ids)), replace=False))
+    start_time = time.perf_counter()
+    truth = exact_ground_truth(vectors, query_positions, args.k)
+    logger.info(f"Đã tính top-{args.k} chính xác của {len(query_positions)} truy vấn trên {len(ids)} vectors "
+                f"trong {time.perf_counter() - start_time:.2f} giây")
+
+    report = {"points": int(len(ids)), "queries": int(len(query_positions)), "k": args.k,
+              "vector_version": args.vector_version, "indexes": []}
+    if args.current:
+        # Chỉ đo tham số tìm kiếm trên collection đang dùng (không xây lại chỉ mục)
+        rows = sweep_search_params(qdrant_manager, qdrant_manager.collection_name, vector_name, ids, vectors,
+                                   query_positions, truth, args.k, args.ef)
+        report["indexes"].append({"m": None, "ef_construct": None, "build_seconds": None, "search": rows})
+        return report
+
+    for m in args.m:
+        for ef_construct in args.ef_construct:
+            name = f"{qdrant_manager.collection_name}_hnsw_bench_m{m}_ef{ef_construct}"
+            hnsw_config = models.HnswConfigDiff(m=m, ef_construct=ef_construct,
+                                                full_scan_threshold=args.full_scan_threshold)
+            try:
+                build_seconds = create_bench_collection(qdrant_manager, name, vector_name, ids, vectors, hnsw_config)
+                logger.info(f"Đã xây chỉ mục m={m}, ef_construct={ef_construct} trong {build_seconds:.2f} giây")
+                rows = sweep_search_params(qdrant_manager, name, vector_name, ids, vectors, query_positions, truth,
+                                           args.k, args.ef)
+            finally:
+                if not args.keep:
+                    qdrant_manager.client.delete_collection(name)
+            report["indexes"].append({"m": m, "ef_construct": ef_construct, "build_seconds": round(build_seconds, 2),
+                                      "search": rows})
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Đo recall@k (so với top-k chính xác bằng brute force) và độ trễ của các cấu hình HNSW. "
+                    "Mỗi cặp m/ef_construct được xây trên một collection tạm chứa bản sao vector của collection")
+    parser.add_argument("--vector-version", type=str, default=SEARCH_VECTOR_VERSION, help="Phiên bản vector")
+    parser.add_argument("--k", type=int, default=10, help="Số kết quả so sánh (recall@k)")
+    parser.add_argument("--queries", type=int, default=200, help="Số point lấy ngẫu nhiên làm truy vấn")
+    parser.add_argument("--seed", type=int, default=0, help="Seed chọn truy vấn")
+    parser.add_argument("--m", type=parse_int_list, default=[8, HNSW_M, 32],
+                        help="Các giá trị m, phân tách bằng dấu phẩy")
+    parser.add_argument("--ef-construct", type=parse_int_list, default=[64, HNSW_EF_CONSTRUCT, 200],
+                        help="Các giá trị ef_construct, phân tách bằng dấu phẩy")
+    parser.add_argument("--ef", type=parse_int_list, default=[16, 32, 64, 128, 256, 512],
+                        help="Các giá trị hnsw_ef khi tìm kiếm, phân tách bằng dấu phẩy")
+    parser.add_argument("--full-scan-threshold", type=int, default=HNSW_FULL_SCAN_THRESHOLD,
+                        help="full_scan_threshold (KB) của các collection tạm")
+    parser.add_argument("--current", action="store_true",
+                        help="Chỉ đo hnsw_ef/exact trên collection hiện tại, không xây collection tạm")
+    parser.add_argument("--keep", action="store_true", help="Giữ lại các collection tạm sau khi đo")
+    parser.add_argument("--json", action="store_true", help="In kết quả dạng JSON")
+    args = parser.parse_args()
+
+    try:
+        report = main(args)
+    except Exception as e:
+        logger.error(f"Lỗi khi đo HNSW: {str(e)}")
+        sys.exit(1)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
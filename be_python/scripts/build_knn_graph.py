@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+# Đặt mã hóa stdout thành UTF-8 để tránh lỗi UnicodeEncodeError
+sys.stdout.reconfigure(encoding='utf-8')
+sys.stderr.reconfigure(encoding='utf-8')
+
+# Thêm thư mục gốc vào sys.path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.knn_graph import update_knn_graph
+from app.config import KNN_K, KNN_VECTOR_VERSION, KNN_BLOCK_SIZE
+
+# Cấu hình logging với mã hóa UTF-8
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler("build_knn_graph.log", encoding='utf-8')
+    ]
+)
+
+logger = logging.getLogger("build_knn_graph")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Tính đồ thị láng giềng gần nhất của collection cho /related (API tự nạp lại)")
+    parser.add_argument("--full", action="store_true", help="Tính lại toàn bộ thay vì cập nhật tăng dần")
+    parser.add_argument("--k", type=int, default=KNN_K, help="Số láng giềng mỗi point")
+    parser.add_argument("--vector-version", type=str, default=KNN_VECTOR_VERSION, help="Phiên bản vector")
+    parser.add_argument("--block-size", type=int, default=KNN_BLOCK_SIZE, help="Số dòng mỗi lần nhân ma trận")
+    args = parser.parse_args()
+
+    try:
+        stats = update_knn_graph(full=args.full, k=args.k, vector_version=args.vector_version,
+                                 block_size=args.block_size)
+        logger.info(f"Hoàn thành: {stats}")
+    except Exception as e:
+        logger.error(f"Lỗi khi tính đồ thị láng giềng: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+# Đặt mã hóa stdout thành UTF-8 để tránh lỗi UnicodeEncodeError
+sys.stdout.reconfigure(encoding='utf-8')
+sys.stderr.reconfigure(encoding='utf-8')
+
+# Thêm thư mục gốc vào sys.path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.indexing.backfill import backfill_landmarks
+from app.indexing.manifest import IndexManifest
+from app.landmark_index import build_landmark_index
+from app.config import AUDIO_DATASET_PATH, INDEX_MANIFEST_PATH
+
+# Cấu hình logging với mã hóa UTF-8
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler("build_landmark_index.log", encoding='utf-8')
+    ]
+)
+
+logger = logging.getLogger("build_landmark_index")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Gộp file landmark của các point trong collection thành index fingerprint (API tự nạp lại)")
+    parser.add_argument("--directory", type=str, default=AUDIO_DATASET_PATH, help="Thư mục dataset")
+    parser.add_argument("--manifest", type=str, default=str(INDEX_MANIFEST_PATH), help="Đường dẫn file manifest")
+    parser.add_argument("--backfill", action="store_true",
+                        help="Tạo trước file landmark cho các file trong manifest chưa có")
+    args = parser.parse_args()
+
+    try:
+        if args.backfill:
+            stats = backfill_landmarks(directory_path=args.directory, manifest=IndexManifest.load(Path(args.manifest)))
+        else:
+            stats = build_landmark_index()
+        logger.info(f"Hoàn thành: {stats}")
+    except Exception as e:
+        logger.error(f"Lỗi khi tạo index landmark: {str(e)}")
+        sys.exit(1)
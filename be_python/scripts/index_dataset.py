@@ -3,6 +3,7 @@ import sys
 import os
 import logging
 import time
+import argparse
 from pathlib import Path
 
 # Đặt mã hóa stdout thành UTF-8 để tránh lỗi UnicodeEncodeError
@@ -16,7 +17,14 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from app.feature_extractor import AudioFeatureExtractor
 from app.database.qdrant_manager import QdrantManager
-from app.config import AUDIO_DATASET_PATH
+from app.indexing.checkpoint import IndexCheckpoint
+from app.indexing.manifest import IndexManifest, scan_directory, file_sha1
+from app.utils.peaks_utils import get_peaks_path
+from app.utils.sequence_utils import get_sequence_path
+from app.utils.landmark_utils import get_landmarks_path
+from app.landmark_index import build_landmark_index
+from app.knn_graph import update_knn_graph
+from app.config import AUDIO_DATASET_PATH, QDRANT_COLLECTION_NAME, INDEX_BATCH_SIZE
 
 # Cấu hình logging với mã hóa UTF-8
 logging.basicConfig(
@@ -30,43 +38,101 @@ logging.basicConfig(
 
 logger = logging.getLogger("indexing")
 
-def index_audio_dataset():
+def build_collection_name() -> str:
+    """ Tên collection mới cho một lần build, API vẫn truy vấn qua alias QDRANT_COLLECTION_NAME """
+    return f"{QDRANT_COLLECTION_NAME}_{time.strftime('%Y%m%d_%H%M%S')}"
+
+
+def index_audio_dataset(resume: bool = False, batch_size: int = INDEX_BATCH_SIZE, keep_old: bool = False):
     """
-    Trích xuất đặc trưng từ tất cả các file audio trong dataset và lưu vào database
-    Collection sẽ được xóa và tạo lại.
+    Trích xuất đặc trưng từ tất cả các file audio trong dataset và lưu vào database.
+    Dữ liệu được ghi vào một collection mới theo batch (ghi checkpoint sau mỗi batch), collection
+    đang phục vụ vẫn được dùng cho đến khi build xong và alias được chuyển sang collection mới.
+
+    Args:
+        resume: Chạy tiếp từ checkpoint của lần chạy bị dừng giữa chừng
+        batch_size: Số file mỗi batch
+        keep_old: Giữ lại collection cũ sau khi chuyển alias
     """
     start_time = time.time()
 
     logger.info(f"Bắt đầu quá trình trích xuất đặc trưng từ {AUDIO_DATASET_PATH}")
 
     try:
-        # Khởi tạo các thành phần
-        feature_extractor = AudioFeatureExtractor()
-        qdrant_manager = QdrantManager()
-
         # Kiểm tra thư mục dataset
         if not os.path.exists(AUDIO_DATASET_PATH):
             logger.error(f"Thư mục dataset không tồn tại: {AUDIO_DATASET_PATH}")
             return
 
-        # Trích xuất đặc trưng từ các file audio
-        logger.info("Đang trích xuất đặc trưng và metadata từ files audio...")
-        feature_dict = feature_extractor.process_audio_directory(AUDIO_DATASET_PATH)
-
-        if not feature_dict:
+        # Khởi tạo các thành phần
+        feature_extractor = AudioFeatureExtractor()
+        alias_manager = QdrantManager()
+
+        checkpoint = IndexCheckpoint.load()
+        if resume and checkpoint is not None and checkpoint.dataset_path == str(AUDIO_DATASET_PATH) \
+                and QdrantManager(checkpoint.collection_name).client.collection_exists(checkpoint.collection_name):
+            logger.info(f"Chạy tiếp vào collection {checkpoint.collection_name}: "
+                        f"{len(checkpoint.completed)} file đã hoàn thành")
+        else:
+            if resume:
+                logger.warning("Không có checkpoint hợp lệ để chạy tiếp, bắt đầu lại từ đầu")
+            if checkpoint is not None and checkpoint.collection_name != alias_manager.get_alias_target(
+                    QDRANT_COLLECTION_NAME):
+                # Bỏ collection đang build dở của lần chạy trước
+                alias_manager.client.delete_collection(collection_name=checkpoint.collection_name)
+            checkpoint = IndexCheckpoint(build_collection_name(), AUDIO_DATASET_PATH)
+        build_manager = QdrantManager(checkpoint.collection_name)
+
+        files = scan_directory(AUDIO_DATASET_PATH)
+        pending = [rel_path for rel_path in sorted(files) if rel_path not in checkpoint.completed]
+        logger.info(f"Đang trích xuất đặc trưng, metadata và tạo bản preview, waveform peaks, chuỗi đặc trưng, "
+                    f"landmark từ {len(pending)}/{len(files)} files audio...")
+
+        next_id = checkpoint.next_id
+        for start in range(0, len(pending), batch_size):
+            points, entries = {}, {}
+            for rel_path in pending[start:start + batch_size]:
+                file_path = os.path.join(AUDIO_DATASET_PATH, rel_path)
+                try:
+                    file_name = os.path.basename(file_path)
+                    features = feature_extractor.extract_features(
+                        file_path, build_preview=True, peaks_path=get_peaks_path(file_name),
+                        sequence_path=get_sequence_path(file_name), landmarks_path=get_landmarks_path(file_name))
+                    size, mtime_ns = files[rel_path]
+                    entries[rel_path] = {"size": size, "mtime_ns": mtime_ns, "sha1": file_sha1(file_path),
+                                         "point_id": next_id}
+                    points[next_id] = features
+                    next_id += 1
+                except Exception as e:
+                    # File lỗi không được ghi vào checkpoint, --resume sẽ thử lại
+                    logger.error(f"Lỗi khi xử lý file {file_path}: {str(e)}")
+            build_manager.upsert_points(points)
+            checkpoint.mark_completed(entries, next_id)
+            logger.info(f"Checkpoint: {len(checkpoint.completed)}/{len(files)} file đã hoàn thành")
+
+        if not checkpoint.completed:
             logger.warning("Không tìm thấy file audio nào trong thư mục dataset")
             return
 
-        # Lưu vào database, xóa và tạo lại collection
-        logger.info(f"Đang xóa collection cũ và lưu {len(feature_dict)} vectors vào Qdrant database...")
-        qdrant_manager.insert_vectors(feature_dict, recreate_collection=True)
+        # Chuyển alias sang collection mới (nguyên tử), API không bị gián đoạn trong lúc build
+        build_manager.swap_alias(QDRANT_COLLECTION_NAME, delete_old=not keep_old)
+        # Index landmark và đồ thị láng giềng theo ID point của collection mới
+        build_landmark_index(alias_manager)
+        update_knn_graph(alias_manager, full=True)
+
+        # Manifest cho reindex tăng dần khớp với collection mới
+        manifest = IndexManifest()
+        manifest.entries = checkpoint.completed
+        manifest.next_id = checkpoint.next_id
+        manifest.save()
+        checkpoint.clear()
 
         # Lấy thông tin database sau khi thêm dữ liệu
         try:
-            db_info = qdrant_manager.get_collection_info()
+            db_info = alias_manager.get_collection_info()
             vectors_count = db_info.get('points_count', 'N/A')
             collection_name = db_info.get('name', 'N/A')
-            logger.info(f"Collection: {collection_name}")
+            logger.info(f"Collection: {collection_name} -> {checkpoint.collection_name}")
         except Exception as e:
             logger.error(f"Lỗi khi lấy thông tin collection: {str(e)}")
             vectors_count = 'N/A'
@@ -77,7 +143,15 @@ def index_audio_dataset():
         logger.info(f"Số vectors trong database: {vectors_count}")
 
     except Exception as e:
-        logger.error(f"Lỗi khi indexing dataset: {str(e)}")
+        logger.error(f"Lỗi khi indexing dataset (chạy lại với --resume để tiếp tục): {str(e)}")
 
 if __name__ == "__main__":
-    index_audio_dataset()
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description="Index toàn bộ dataset vào collection mới rồi chuyển alias (collection cũ vẫn phục vụ khi build)")
+    parser.add_argument("--resume", action="store_true", help="Chạy tiếp từ checkpoint của lần chạy trước")
+    parser.add_argument("--batch-size", type=int, default=INDEX_BATCH_SIZE,
+                        help="Số file mỗi batch (checkpoint được ghi sau mỗi batch)")
+    parser.add_argument("--keep-old", action="store_true", help="Giữ lại collection cũ sau khi chuyển alias")
+    args = parser.parse_args()
+
+    index_audio_dataset(resume=args.resume, batch_size=args.batch_size, keep_old=args.keep_old)
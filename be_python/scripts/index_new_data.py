@@ -15,6 +15,9 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from app.feature_extractor import AudioFeatureExtractor
 from app.database.qdrant_manager import QdrantManager
+from app.landmark_index import build_landmark_index
+from app.knn_graph import update_knn_graph
+from app.indexing.manifest import IndexManifest
 from app.config import AUDIO_DATASET_PATH
 
 # Cấu hình logging với mã hóa UTF-8
@@ -29,6 +32,32 @@ logging.basicConfig(
 
 logger = logging.getLogger("index_new_data")
 
+def record_external_points(qdrant_manager: QdrantManager, feature_dict: dict, existing_ids: set) -> int:
+    """
+    Ghi các point vừa chèn từ file nằm ngoài AUDIO_DATASET_PATH vào manifest.external
+    để Reindexer (scripts/reindex.py, watcher) không xóa chúng như point mồ côi.
+    File nằm trong dataset không cần ghi: Reindexer nhận lại point theo file_name.
+
+    Returns:
+        Số point đã ghi nhận
+    """
+    dataset_path = os.path.realpath(AUDIO_DATASET_PATH)
+    external_paths = {}
+    for file_path in feature_dict:
+        real_path = os.path.realpath(file_path)
+        if os.path.commonpath([real_path, dataset_path]) != dataset_path:
+            external_paths[os.path.basename(file_path)] = real_path
+    if not external_paths:
+        return 0
+    manifest = IndexManifest.load()
+    recorded = 0
+    for point_id, file_name in qdrant_manager.get_point_file_names().items():
+        if point_id not in existing_ids and file_name in external_paths:
+            manifest.add_external(point_id, external_paths[file_name])
+            recorded += 1
+    manifest.save()
+    return recorded
+
 def index_new_audio_data(directory_path: str):
     """
     Trích xuất đặc trưng từ các file audio mới trong thư mục và chèn vào Qdrant database
@@ -49,8 +78,10 @@ def index_new_audio_data(directory_path: str):
             return
 
         # Trích xuất đặc trưng từ các file audio
-        logger.info("Đang trích xuất đặc trưng và metadata từ files audio...")
-        feature_dict = feature_extractor.process_audio_directory(directory_path)
+        logger.info("Đang trích xuất đặc trưng, metadata và tạo bản preview, waveform peaks, chuỗi đặc trưng, "
+                    "landmark từ files audio...")
+        feature_dict = feature_extractor.process_audio_directory(directory_path, build_preview=True, build_peaks=True,
+                                                                 build_sequences=True, build_landmarks=True)
 
         if not feature_dict:
             logger.warning("Không tìm thấy file audio nào trong thư mục")
@@ -58,7 +89,13 @@ def index_new_audio_data(directory_path: str):
 
         # Chèn vào database, giữ nguyên collection
         logger.info(f"Đang kiểm tra và chèn {len(feature_dict)} vectors mới vào Qdrant database...")
+        existing_ids = set(qdrant_manager.get_point_file_names())
         qdrant_manager.insert_vectors(feature_dict, recreate_collection=False)
+        recorded = record_external_points(qdrant_manager, feature_dict, existing_ids)
+        if recorded:
+            logger.info(f"Đã ghi {recorded} point của file ngoài dataset vào manifest")
+        build_landmark_index(qdrant_manager)
+        update_knn_graph(qdrant_manager)
 
         # Lấy thông tin database sau khi thêm dữ liệu
         try:
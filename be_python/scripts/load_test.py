@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+import sys
+import os
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+# Đặt mã hóa stdout thành UTF-8 để tránh lỗi UnicodeEncodeError
+if hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8')
+if hasattr(sys.stderr, 'reconfigure'):
+    sys.stderr.reconfigure(encoding='utf-8')
+
+# Thêm thư mục gốc vào sys.path
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+import httpx
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac', '.ogg')
+DEFAULT_DATASET_DIR = ROOT_DIR.parent / "Dataset"
+DEFAULT_TESTSET_DIR = ROOT_DIR.parent / "Testset"
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger("load_test")
+
+
+def find_audio_files(*directories: Path) -> List[str]:
+    """ Lấy danh sách file audio trong các thư mục """
+    files = []
+    for directory in directories:
+        for root, _, names in os.walk(directory):
+            files.extend(os.path.join(root, name) for name in names if name.lower().endswith(AUDIO_EXTENSIONS))
+    return sorted(files)
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """ Percentile theo phương pháp nearest-rank """
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+class LoadTest:
+    """
+    Tạo tải đồng thời lên /api/search, /api/metadata và /api/stream, ghi nhận độ trễ và lỗi
+    """
+
+    def __init__(self, client: httpx.AsyncClient, query_files: List[str], dataset_files: List[str],
+                 weights: Dict[str, float]):
+        self.client = client
+        self.query_files = query_files
+        self.dataset_names = [os.path.basename(path) for path in dataset_files]
+        self.weights = weights
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.temp_files: List[str] = []
+        # Đọc sẵn nội dung file truy vấn để đo thời gian server, không đo đĩa của máy tạo tải
+        self.query_payloads = {path: Path(path).read_bytes() for path in query_files}
+
+    async def search(self):
+        path = random.choice(self.query_files)
+        response = await self.client.post(
+            "/api/search",
+            files={"file": (os.path.basename(path), self.query_payloads[path])}
+        )
+        if response.status_code == 200:
+            temp_file_name = response.json().get("temp_file_name")
+            if temp_file_name:
+                self.temp_files.append(temp_file_name)
+                del self.temp_files[:-100]
+        return response
+
+    async def metadata(self):
+        # Lấy một đoạn tên file có thật để truy vấn có kết quả
+        name = random.choice(self.dataset_names)
+        tokens = [token for token in os.path.splitext(name)[0].replace("-", "_").split("_") if len(token) > 3]
+        query_string = random.choice(tokens) if tokens else name
+        return await self.client.get("/api/metadata", params={"query_string": query_string})
+
+    async def stream(self):
+        if self.temp_files and random.random() < 0.2:
+            params = {"type": "temp"}
+            file_name = random.choice(self.temp_files)
+        else:
+            params = {"type": "result", "quality": random.choice(["original", "preview"])}
+            file_name = random.choice(self.dataset_names)
+        async with self.client.stream("GET", f"/api/stream/{file_name}", params=params) as response:
+            async for _ in response.aiter_raw():
+                pass
+        return response
+
+    async def worker(self, deadline: float, remaining: List[int]):
+        endpoints = list(self.weights)
+        weights = [self.weights[name] for name in endpoints]
+        while time.perf_counter() < deadline and remaining[0] != 0:
+            remaining[0] -= 1
+            endpoint = random.choices(endpoints, weights)[0]
+            start_time = time.perf_counter()
+            try:
+                response = await getattr(self, endpoint)()
+                ok = response.status_code < 400 or (endpoint == "metadata" and response.status_code == 404)
+            except Exception as e:
+                logger.warning(f"Lỗi khi gọi {endpoint}: {str(e)}")
+                ok = False
+            self.latencies[endpoint].append(time.perf_counter() - start_time)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    async def run(self, concurrency: int, duration: float, total_requests: int) -> Dict:
+        deadline = time.perf_counter() + duration
+        # Bộ đếm dùng chung giữa các worker, -1 nghĩa là không giới hạn số request
+        remaining = [total_requests if total_requests > 0 else -1]
+        start_time = time.perf_counter()
+        await asyncio.gather(*(self.worker(deadline, remaining) for _ in range(concurrency)))
+        return self.report(time.perf_counter() - start_time)
+
+    def report(self, elapsed: float) -> Dict:
+        rows = {}
+        all_latencies = []
+        for endpoint, latencies in sorted(self.latencies.items()):
+            all_latencies.extend(latencies)
+            rows[endpoint] = self._summarize(sorted(latencies), self.errors[endpoint], elapsed)
+        rows["total"] = self._summarize(sorted(all_latencies), sum(self.errors.values()), elapsed)
+        return {"elapsed_seconds": round(elapsed, 3), "endpoints": rows}
+
+    @staticmethod
+    def _summarize(latencies: List[float], errors: int, elapsed: float) -> Dict:
+        count = len(latencies)
+        return {
+            "requests": count,
+            "qps": round(count / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "error_rate": round(errors / count, 4) if count else 0.0,
+        }
+
+
+def print_report(report: Dict):
+    print(f"\nThời gian chạy: {report['elapsed_seconds']} giây")
+    print(f"{'endpoint':<10} {'requests':>9} {'qps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8}")
+    for endpoint, row in report["endpoints"].items():
+        print(f"{endpoint:<10} {row['requests']:>9} {row['qps']:>9} {row['p50_ms']:>9} {row['p95_ms']:>9} "
+              f"{row['p99_ms']:>9} {row['error_rate']:>8.2%}")
+
+
+def index_in_process(dataset_files: List[str]):
+    """ Trích xuất đặc trưng và nạp dataset vào vector store trong tiến trình """
+    from app.feature_extractor import AudioFeatureExtractor
+    from app.database.qdrant_manager import QdrantManager
+
+    feature_extractor = AudioFeatureExtractor()
+    feature_dict = {}
+    for file_path in dataset_files:
+        try:
+            feature_dict[file_path] = feature_extractor.extract_features(file_path)
+        except Exception as e:
+            logger.error(f"Lỗi khi xử lý file {file_path}: {str(e)}")
+    QdrantManager().insert_vectors(feature_dict, recreate_collection=True)
+    logger.info(f"Đã nạp {len(feature_dict)} vectors vào vector store trong tiến trình")
+
+
+async def main(args):
+    dataset_files = find_audio_files(Path(args.dataset))
+    query_files = find_audio_files(Path(args.testset)) + dataset_files[:args.query_files]
+    if not dataset_files or not query_files:
+        logger.error("Không tìm thấy file audio để tạo tải")
+        return
+    weights = {"search": args.search_weight, "metadata": args.metadata_weight, "stream": args.stream_weight}
+    weights = {name: weight for name, weight in weights.items() if weight > 0}
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+        logger.info(f"Tạo tải lên server: {args.url}")
+        async with client:
+            report = await LoadTest(client, query_files, dataset_files, weights).run(
+                args.concurrency, args.duration, args.requests)
+    else:
+        # Chạy app trong tiến trình; vector store là Qdrant local mode nếu dùng --memory
+        from app.main import app
+        if args.index_limit:
+            index_in_process(dataset_files[:args.index_limit])
+        await app.router.startup()
+        try:
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load-test",
+                                       timeout=args.timeout)
+            logger.info("Tạo tải lên app trong tiến trình (không qua mạng)")
+            async with client:
+                report = await LoadTest(client, query_files, dataset_files, weights).run(
+                    args.concurrency, args.duration, args.requests)
+        finally:
+            await app.router.shutdown()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Đo thông lượng và độ trễ của Audio Search API")
+    parser.add_argument("--url", type=str, default=None,
+                        help="URL của server (ví dụ http://localhost:8000); bỏ trống để chạy app trong tiến trình")
+    parser.add_argument("--memory", action="store_true",
+                        help="Chạy trong tiến trình với Qdrant trong bộ nhớ (không cần server Qdrant)")
+    parser.add_argument("--index-limit", type=int, default=None,
+                        help="Số file dataset nạp vào vector store trước khi chạy (mặc định: tất cả nếu --memory)")
+    parser.add_argument("--dataset", type=str, default=str(DEFAULT_DATASET_DIR), help="Thư mục dataset")
+    parser.add_argument("--testset", type=str, default=str(DEFAULT_TESTSET_DIR), help="Thư mục file truy vấn")
+    parser.add_argument("--query-files", type=int, default=5,
+                        help="Số file dataset dùng thêm làm file truy vấn")
+    parser.add_argument("--concurrency", type=int, default=8, help="Số request đồng thời")
+    parser.add_argument("--duration", type=float, default=30.0, help="Thời gian chạy tối đa (giây)")
+    parser.add_argument("--requests", type=int, default=0, help="Tổng số request tối đa (0 = không giới hạn)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Timeout của mỗi request (giây)")
+    parser.add_argument("--search-weight", type=float, default=1.0, help="Tỉ trọng request /api/search")
+    parser.add_argument("--metadata-weight", type=float, default=2.0, help="Tỉ trọng request /api/metadata")
+    parser.add_argument("--stream-weight", type=float, default=4.0, help="Tỉ trọng request /api/stream")
+    parser.add_argument("--json", action="store_true", help="In kết quả dạng JSON")
+    args = parser.parse_args()
+
+    if args.memory and not args.url:
+        # Phải đặt trước khi import app để QdrantManager dùng Qdrant trong bộ nhớ
+        os.environ["QDRANT_LOCATION"] = ":memory:"
+        os.environ.setdefault("AUDIO_DATASET_PATH", args.dataset)
+        if args.index_limit is None:
+            args.index_limit = len(find_audio_files(Path(args.dataset)))
+
+    asyncio.run(main(args))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+# Đặt mã hóa stdout thành UTF-8 để tránh lỗi UnicodeEncodeError
+sys.stdout.reconfigure(encoding='utf-8')
+sys.stderr.reconfigure(encoding='utf-8')
+
+# Thêm thư mục gốc vào sys.path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.indexing.manifest import IndexManifest
+from app.indexing.reindex import Reindexer
+from app.config import AUDIO_DATASET_PATH, INDEX_MANIFEST_PATH
+
+# Cấu hình logging với mã hóa UTF-8
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler("reindex.log", encoding='utf-8')
+    ]
+)
+
+logger = logging.getLogger("reindex")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reindex tăng dần: chỉ trích xuất file mới/thay đổi, xóa point của file đã bị xóa")
+    parser.add_argument("--directory", type=str, default=AUDIO_DATASET_PATH, help="Thư mục dataset")
+    parser.add_argument("--manifest", type=str, default=str(INDEX_MANIFEST_PATH), help="Đường dẫn file manifest")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ in khác biệt, không thay đổi gì")
+    parser.add_argument("--no-sidecars", action="store_true",
+                        help="Không tạo bản preview, waveform peaks, chuỗi đặc trưng, landmark "
+                             "(và không gộp lại index landmark)")
+    args = parser.parse_args()
+
+    if not Path(args.directory).exists():
+        logger.error(f"Thư mục không tồn tại: {args.directory}")
+        sys.exit(1)
+
+    try:
+        reindexer = Reindexer(args.directory, manifest=IndexManifest.load(Path(args.manifest)),
+                              build_sidecars=not args.no_sidecars)
+        stats = reindexer.sync(dry_run=args.dry_run)
+        logger.info(f"Mới: {stats['added']}, thay đổi: {stats['changed']}, đã xóa: {stats['removed']}, "
+                    f"nhận lại: {stats['adopted']}, point mồ côi đã xóa: {stats['orphans']}, "
+                    f"lỗi: {stats['failed']}")
+    except Exception as e:
+        logger.error(f"Lỗi khi reindex: {str(e)}")
+        sys.exit(1)
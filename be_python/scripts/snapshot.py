@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+# Đặt mã hóa stdout thành UTF-8 để tránh lỗi UnicodeEncodeError
+sys.stdout.reconfigure(encoding='utf-8')
+sys.stderr.reconfigure(encoding='utf-8')
+
+# Thêm thư mục gốc vào sys.path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database.qdrant_manager import QdrantManager
+from app.indexing.snapshot import export_snapshot, import_snapshot
+from app.config import QDRANT_COLLECTION_NAME
+
+# Cấu hình logging với mã hóa UTF-8
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+
+logger = logging.getLogger("snapshot")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Xuất/nạp snapshot vectors và payload của collection (không cần trích xuất lại đặc trưng)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Xuất collection ra thư mục snapshot")
+    export_parser.add_argument("directory", type=str, help="Thư mục snapshot")
+    export_parser.add_argument("--collection", type=str, default=QDRANT_COLLECTION_NAME,
+                               help="Collection hoặc alias cần xuất")
+
+    import_parser = subparsers.add_parser("import", help="Nạp snapshot vào collection mới rồi chuyển alias")
+    import_parser.add_argument("directory", type=str, help="Thư mục snapshot")
+    import_parser.add_argument("--alias", type=str, default=QDRANT_COLLECTION_NAME, help="Alias mà API truy vấn")
+    import_parser.add_argument("--batch-size", type=int, default=1024, help="Số point mỗi lần upsert")
+    import_parser.add_argument("--parallel", type=int, default=4, help="Số tiến trình upsert song song")
+    import_parser.add_argument("--force", action="store_true",
+                               help="Nạp kể cả khi cấu hình bộ trích xuất khác với snapshot")
+    import_parser.add_argument("--keep-old", action="store_true", help="Giữ lại collection cũ sau khi chuyển alias")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "export":
+            manifest = export_snapshot(args.directory, QdrantManager(args.collection))
+            logger.info(f"Snapshot: {manifest['count']} points, vectors: {manifest['vectors']}")
+        else:
+            collection_name = import_snapshot(args.directory, alias_name=args.alias, batch_size=args.batch_size,
+                                              parallel=args.parallel, force=args.force, keep_old=args.keep_old)
+            logger.info(f"Alias {args.alias} đang trỏ tới {collection_name}")
+    except Exception as e:
+        logger.error(f"Lỗi khi {'xuất' if args.command == 'export' else 'nạp'} snapshot: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+import sys
+import signal
+import logging
+import argparse
+from pathlib import Path
+
+# Đặt mã hóa stdout thành UTF-8 để tránh lỗi UnicodeEncodeError
+sys.stdout.reconfigure(encoding='utf-8')
+sys.stderr.reconfigure(encoding='utf-8')
+
+# Thêm thư mục gốc vào sys.path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.indexing.reindex import Reindexer
+from app.indexing.watcher import DatasetWatcher, start_status_server
+from app.config import AUDIO_DATASET_PATH, INGEST_DEBOUNCE_SECONDS, INGEST_POLL_INTERVAL, INGEST_BATCH_SIZE, \
+    INGEST_STATUS_PORT
+
+# Cấu hình logging với mã hóa UTF-8
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler("watch_dataset.log", encoding='utf-8')
+    ]
+)
+
+logger = logging.getLogger("watch_dataset")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Theo dõi thư mục dataset và index liên tục file mới/thay đổi/bị xóa "
+                    "(dùng watchdog nếu được cài, ngược lại quét định kỳ)",
+        epilog="watchdog có trong requirements.txt; nếu chưa cài (pip install watchdog) watcher sẽ ghi cảnh báo "
+               "và quét thư mục mỗi --poll-interval giây thay vì nhận sự kiện inotify/FSEvents")
+    parser.add_argument("--directory", type=str, default=AUDIO_DATASET_PATH, help="Thư mục dataset")
+    parser.add_argument("--debounce", type=float, default=INGEST_DEBOUNCE_SECONDS,
+                        help="Thời gian file phải ổn định trước khi được index (giây)")
+    parser.add_argument("--poll-interval", type=float, default=INGEST_POLL_INTERVAL,
+                        help="Chu kỳ quét thư mục ở chế độ polling (giây)")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Số file tối đa mỗi batch")
+    parser.add_argument("--polling", action="store_true", help="Luôn dùng polling kể cả khi có watchdog")
+    parser.add_argument("--status-host", type=str, default="127.0.0.1", help="Địa chỉ của status server")
+    parser.add_argument("--status-port", type=int, default=INGEST_STATUS_PORT,
+                        help="Cổng của status server (0 để tắt)")
+    parser.add_argument("--no-initial-sync", action="store_true",
+                        help="Không đồng bộ toàn bộ dataset trước khi bắt đầu theo dõi")
+    args = parser.parse_args()
+
+    if not Path(args.directory).exists():
+        logger.error(f"Thư mục không tồn tại: {args.directory}")
+        sys.exit(1)
+
+    reindexer = Reindexer(args.directory)
+    if not args.no_initial_sync:
+        # Bắt kịp các thay đổi xảy ra khi watcher không chạy
+        reindexer.sync()
+
+    watcher = DatasetWatcher(reindexer, debounce_seconds=args.debounce, poll_interval=args.poll_interval,
+                             batch_size=args.batch_size, use_watchdog=not args.polling)
+    if args.status_port:
+        start_status_server(watcher, args.status_host, args.status_port)
+
+    signal.signal(signal.SIGTERM, lambda *_: watcher.stop())
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+    logger.info("Đã dừng watcher")
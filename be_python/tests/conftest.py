@@ -0,0 +1,43 @@
+"""
+Fixture dùng chung cho các test cần Qdrant (chạy trong bộ nhớ, local mode)
+"""
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+
+from app.database import qdrant_manager as qdrant_manager_module
+from app.feature_extractor import FEATURE_VERSIONS
+
+
+@pytest.fixture
+def qdrant_client(monkeypatch):
+    """ Qdrant trong bộ nhớ, dùng làm client chung của mọi QdrantManager trong test """
+    client = QdrantClient(location=":memory:")
+    monkeypatch.setattr(qdrant_manager_module, "_client", client)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def make_features():
+    """ Tạo kết quả extract_features giả với vector cho trước (mặc định: vector ngẫu nhiên theo seed) """
+
+    def make(file_name: str, seed: int = 0, vector: np.ndarray = None, versions=tuple(FEATURE_VERSIONS),
+             duration: float = 1.0, sample_rate: int = 22050, category: str = None) -> dict:
+        values = np.random.default_rng(seed).normal(size=8) if vector is None else np.asarray(vector, dtype=float)
+        values = (values / np.linalg.norm(values)).astype(np.float32)
+        vectors = {version: values for version in versions}
+        return {
+            "file_name": file_name,
+            "file_type": file_name.rsplit(".", 1)[-1],
+            "file_size_kb": 1.0,
+            "sample_rate": sample_rate,
+            "channel": 1,
+            "samples": int(duration * sample_rate),
+            "duration": duration,
+            "subtype": "PCM_16",
+            "category": category,
+            "vectors": vectors,
+        }
+
+    return make
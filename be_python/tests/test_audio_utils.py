@@ -0,0 +1,43 @@
+"""
+Tests cho conditional request và Range của audio_utils
+"""
+from email.utils import formatdate
+
+import pytest
+
+from app.utils.audio_utils import is_not_modified, parse_byte_range
+
+ETAG = '"abc"'
+LAST_MODIFIED = 1_700_000_000.5
+
+
+def test_is_not_modified_matches_etag():
+    assert is_not_modified({"if-none-match": ETAG}, ETAG, LAST_MODIFIED)
+    assert is_not_modified({"if-none-match": f'"other", W/{ETAG}'}, ETAG, LAST_MODIFIED)
+    assert is_not_modified({"if-none-match": "*"}, ETAG, LAST_MODIFIED)
+    assert not is_not_modified({"if-none-match": '"other"'}, ETAG, LAST_MODIFIED)
+
+
+def test_is_not_modified_prefers_etag_over_date():
+    headers = {"if-none-match": '"other"', "if-modified-since": formatdate(LAST_MODIFIED + 60, usegmt=True)}
+    assert not is_not_modified(headers, ETAG, LAST_MODIFIED)
+
+
+def test_is_not_modified_by_date():
+    assert is_not_modified({"if-modified-since": formatdate(LAST_MODIFIED, usegmt=True)}, ETAG, LAST_MODIFIED)
+    assert not is_not_modified({"if-modified-since": formatdate(LAST_MODIFIED - 60, usegmt=True)},
+                               ETAG, LAST_MODIFIED)
+    assert not is_not_modified({"if-modified-since": "not a date"}, ETAG, LAST_MODIFIED)
+    assert not is_not_modified({}, ETAG, LAST_MODIFIED)
+
+
+def test_parse_byte_range():
+    assert parse_byte_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_byte_range("bytes=900-", 1000) == (900, 999)
+    assert parse_byte_range("bytes=-10", 1000) == (990, 999)
+    assert parse_byte_range("bytes=990-5000", 1000) == (990, 999)
+    # Nhiều khoảng hoặc sai cú pháp: bỏ qua header, trả về toàn bộ file
+    assert parse_byte_range("bytes=0-1,5-6", 1000) is None
+    assert parse_byte_range("items=0-1", 1000) is None
+    with pytest.raises(ValueError):
+        parse_byte_range("bytes=1000-", 1000)
@@ -0,0 +1,108 @@
+"""
+Tests cho named vector theo phiên bản: chuyển alias, thêm phiên bản vào collection đã có và backfill
+"""
+import numpy as np
+from qdrant_client.http import models
+
+from app.database.qdrant_manager import QdrantManager
+from app.indexing.backfill import add_vector_version, backfill_vectors
+from app.indexing.manifest import IndexManifest
+
+
+class FakeExtractor:
+    """ Mọi file có cùng một vector v2, file broken.wav không đọc được """
+
+    def load_audio(self, file_path):
+        if file_path.endswith("broken.wav"):
+            raise ValueError("File hỏng")
+        return np.zeros(4), 22050
+
+    def extract_vector(self, y, sr, version):
+        return np.ones(8, dtype=np.float32) / np.sqrt(8)
+
+    def vector_size(self, version):
+        return 8
+
+
+def collection_vectors(client, collection_name: str) -> dict:
+    points, _ = client.scroll(collection_name, limit=100, with_payload=True, with_vectors=True)
+    return {point.id: point for point in points}
+
+
+def test_swap_alias(qdrant_client, make_features):
+    for collection_name in ("audio_1", "audio_2", "audio_3"):
+        QdrantManager(collection_name).upsert_points({0: make_features("0.wav")}, dedup=False)
+
+    assert QdrantManager("audio_1").swap_alias("audio") is None
+    assert QdrantManager("audio_2").swap_alias("audio", delete_old=False) == "audio_1"
+    assert QdrantManager().get_alias_target("audio") == "audio_2"
+    assert qdrant_client.collection_exists("audio_1")
+
+    assert QdrantManager("audio_3").swap_alias("audio") == "audio_2"
+    assert QdrantManager().get_alias_target("audio") == "audio_3"
+    assert not qdrant_client.collection_exists("audio_2")
+
+
+def test_swap_alias_replaces_collection_with_same_name(qdrant_client, make_features):
+    # Collection kiểu cũ trùng tên alias
+    QdrantManager("audio").upsert_points({0: make_features("old.wav")}, dedup=False)
+    QdrantManager("audio_1").upsert_points({0: make_features("new.wav")}, dedup=False)
+
+    QdrantManager("audio_1").swap_alias("audio")
+    assert QdrantManager().get_alias_target("audio") == "audio_1"
+    assert collection_vectors(qdrant_client, "audio")[0].payload["file_name"] == "new.wav"
+
+
+def test_add_vector_version_migrates_legacy_collection(qdrant_client):
+    # Collection kiểu cũ: một vector không tên
+    qdrant_client.create_collection("legacy", vectors_config=models.VectorParams(size=4,
+                                                                                distance=models.Distance.COSINE))
+    qdrant_client.upsert("legacy", points=[
+        models.PointStruct(id=point_id, vector=[1.0, point_id, 0.0, 0.0], payload={"file_name": f"{point_id}.wav"})
+        for point_id in range(3)
+    ])
+    QdrantManager("legacy").swap_alias("audio")
+
+    manager = add_vector_version(QdrantManager("audio"), vector_size=8, vector_version="v2", batch_size=2)
+
+    assert manager.get_vector_sizes(refresh=True) == {"v1": 4, "v2": 8}
+    assert not qdrant_client.collection_exists("legacy")
+    points = collection_vectors(qdrant_client, "audio")
+    assert sorted(points) == [0, 1, 2]
+    for point_id, point in points.items():
+        assert point.payload == {"file_name": f"{point_id}.wav"}
+        # Vector không tên trở thành v1, v2 chưa có cho đến khi được backfill
+        assert set(point.vector) == {"v1"}
+        np.testing.assert_allclose(point.vector["v1"], np.asarray([1.0, point_id, 0, 0]) /
+                                   np.linalg.norm([1.0, point_id, 0, 0]), rtol=1e-6)
+
+
+def test_backfill_only_fills_missing_vectors(tmp_path, qdrant_client, make_features):
+    manager = QdrantManager("audio_1")
+    # Collection được tạo theo point đầu tiên nên có cả v1 và v2
+    manager.upsert_points({
+        1: make_features("b.wav", seed=1),
+        0: make_features("a.wav", seed=0, versions=("v1",)),
+        2: make_features("broken.wav", seed=2, versions=("v1",)),
+        3: make_features("unknown.wav", seed=3, versions=("v1",)),
+    }, dedup=False)
+    manager.swap_alias("audio")
+    b_vector = collection_vectors(qdrant_client, "audio")[1].vector["v2"]
+    manifest = IndexManifest(tmp_path / "manifest.json")
+    manifest.entries = {rel_path: {"point_id": point_id}
+                        for point_id, rel_path in enumerate(["x/a.wav", "x/b.wav", "x/broken.wav"])}
+
+    stats = backfill_vectors("v2", directory_path=str(tmp_path), manifest=manifest,
+                             feature_extractor=FakeExtractor(), qdrant_manager=QdrantManager("audio"), batch_size=2)
+
+    # b.wav đã có v2, unknown.wav không có trong manifest, broken.wav lỗi khi đọc
+    assert stats == {"updated": 1, "skipped": 1, "failed": 1, "migrated": 0}
+    points = collection_vectors(qdrant_client, "audio")
+    np.testing.assert_allclose(points[0].vector["v2"], np.ones(8) / np.sqrt(8), rtol=1e-6)
+    np.testing.assert_allclose(points[1].vector["v2"], b_vector)
+    assert "v2" not in points[2].vector and "v2" not in points[3].vector
+
+    # Chạy lại chỉ xử lý các point vẫn còn thiếu
+    stats = backfill_vectors("v2", directory_path=str(tmp_path), manifest=manifest,
+                             feature_extractor=FakeExtractor(), qdrant_manager=QdrantManager("audio"))
+    assert stats == {"updated": 0, "skipped": 1, "failed": 1, "migrated": 0}
@@ -0,0 +1,69 @@
+"""
+Tests cho script benchmark HNSW: top-k chính xác (brute force) và tham số tìm kiếm của từng lần đo
+"""
+from types import SimpleNamespace
+
+import numpy as np
+from qdrant_client.http import models
+
+from scripts.benchmark_hnsw import exact_ground_truth, sweep_search_params
+
+
+def test_exact_ground_truth_on_known_matrix():
+    angles = np.radians([0, 10, 30, 70, 180])
+    vectors = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+    queries = np.array([0, 2, 4])
+
+    # block_size nhỏ hơn số truy vấn để kiểm tra cả việc chia khối
+    truth = exact_ground_truth(vectors, queries, k=2, block_size=2)
+
+    # Chính point truy vấn bị bỏ, láng giềng xếp theo độ tương đồng giảm dần
+    assert truth.tolist() == [[1, 2], [1, 0], [3, 2]]
+    assert np.array_equal(exact_ground_truth(vectors, queries, k=2), truth)
+
+
+def test_exact_ground_truth_matches_full_sort():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 8))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = np.arange(0, 50, 7)
+
+    truth = exact_ground_truth(vectors, queries, k=5, block_size=3)
+
+    similarities = vectors[queries] @ vectors.T
+    similarities[np.arange(len(queries)), queries] = -np.inf
+    assert np.array_equal(truth, np.argsort(-similarities, axis=1)[:, :5])
+
+
+class RecordingClient:
+    """ Trả về đúng top-k chính xác và ghi lại search_params của từng truy vấn """
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+        self.search_params = []
+
+    def query_points(self, collection_name, query, using, limit, search_params, with_payload):
+        self.search_params.append(search_params)
+        order = np.argsort(-(self.vectors @ np.asarray(query)))[:limit]
+        return SimpleNamespace(points=[SimpleNamespace(id=int(position)) for position in order])
+
+
+def test_sweep_passes_hnsw_ef_and_exact_through():
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(30, 8))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = np.arange(30)
+    queries = np.arange(5)
+    truth = exact_ground_truth(vectors, queries, k=3)
+    client = RecordingClient(vectors)
+
+    rows = sweep_search_params(SimpleNamespace(client=client), "bench", None, ids, vectors, queries, truth,
+                               k=3, ef_values=[16, 64])
+
+    assert [(row["hnsw_ef"], row["exact"]) for row in rows] == [(16, False), (64, False), (None, True)]
+    assert all(row["recall"] == 1.0 for row in rows)
+    # 5 truy vấn làm nóng không có tham số, sau đó 5 truy vấn cho mỗi cấu hình
+    assert client.search_params[:5] == [None] * 5
+    assert client.search_params[5:] == ([models.SearchParams(hnsw_ef=16, exact=False)] * 5
+                                        + [models.SearchParams(hnsw_ef=64, exact=False)] * 5
+                                        + [models.SearchParams(hnsw_ef=None, exact=True)] * 5)
@@ -0,0 +1,59 @@
+"""
+Tests cho phát hiện bản gần trùng lặp khi index và chọn lại point chính của nhóm
+"""
+import numpy as np
+
+from app.database.qdrant_manager import QdrantManager
+
+BASE = np.random.default_rng(0).normal(size=8)
+OTHER = np.random.default_rng(1).normal(size=8)
+
+
+def groups(client, collection_name: str = "audio") -> dict:
+    """ ID -> (group_id, is_canonical) """
+    points, _ = client.scroll(collection_name, limit=100, with_payload=True)
+    return {point.id: (point.payload["group_id"], point.payload["is_canonical"]) for point in points}
+
+
+def test_assign_duplicate_groups_within_batch(qdrant_client, make_features):
+    manager = QdrantManager("audio")
+    manager.upsert_points({
+        0: make_features("a.wav", vector=BASE),
+        1: make_features("a_copy.mp3", vector=BASE + 1e-3),
+        2: make_features("b.wav", vector=OTHER),
+        # Cùng nội dung nhưng thời lượng khác xa: không phải bản trùng lặp
+        3: make_features("a_long.wav", vector=BASE, duration=2.0),
+    })
+
+    assert groups(qdrant_client) == {0: (0, True), 1: (0, False), 2: (2, True), 3: (3, True)}
+
+
+def test_assign_duplicate_groups_against_collection(qdrant_client, make_features):
+    manager = QdrantManager("audio")
+    manager.upsert_points({0: make_features("a.wav", vector=BASE), 1: make_features("b.wav", vector=OTHER)})
+    manager.upsert_points({5: make_features("a_copy.wav", vector=BASE + 1e-3, duration=1.05),
+                           6: make_features("c.wav", seed=6)})
+
+    assert groups(qdrant_client) == {0: (0, True), 1: (1, True), 5: (0, False), 6: (6, True)}
+
+
+def test_delete_canonical_promotes_smallest_member(qdrant_client, make_features):
+    manager = QdrantManager("audio")
+    manager.upsert_points({point_id: make_features(f"{point_id}.wav", vector=BASE + point_id * 1e-4)
+                           for point_id in (0, 3, 4, 7)})
+    assert groups(qdrant_client) == {0: (0, True), 3: (0, False), 4: (0, False), 7: (0, False)}
+
+    manager.delete_points([0])
+
+    assert groups(qdrant_client) == {3: (3, True), 4: (3, False), 7: (3, False)}
+
+
+def test_rewritten_canonical_hands_over_its_group(qdrant_client, make_features):
+    manager = QdrantManager("audio")
+    manager.upsert_points({0: make_features("a.wav", vector=BASE), 1: make_features("a_copy.wav", vector=BASE),
+                           2: make_features("a_copy2.wav", vector=BASE), 5: make_features("b.wav", vector=OTHER)})
+
+    # File của point 0 thay đổi thành bản sao của b.wav
+    manager.upsert_points({0: make_features("a.wav", vector=OTHER)})
+
+    assert groups(qdrant_client) == {0: (5, False), 1: (1, True), 2: (1, False), 5: (5, True)}
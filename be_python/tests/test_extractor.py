@@ -0,0 +1,35 @@
+"""
+Tests cho AudioFeatureExtractor
+"""
+import numpy as np
+
+from app.feature_extractor import AudioFeatureExtractor
+
+
+def test_compute_peaks_min_max_per_bin():
+    extractor = AudioFeatureExtractor()
+    y = np.concatenate([np.full(4, 0.5), np.full(4, -1.0), np.linspace(-0.25, 0.75, 4)]).astype(np.float32)
+    peaks = extractor.compute_peaks(y, bins=3)
+
+    assert peaks.dtype == np.int8
+    assert peaks.shape == (3, 2)
+    assert peaks.tolist() == [[64, 64], [-127, -127], [-32, 95]]
+
+
+def test_compute_peaks_clips_and_mixes_down():
+    extractor = AudioFeatureExtractor()
+    stereo = np.stack([np.full(8, 2.0), np.full(8, 0.0)]).astype(np.float32)
+    peaks = extractor.compute_peaks(stereo, bins=2)
+    # Trung bình hai kênh là 1.0, không vượt quá 127
+    assert peaks.tolist() == [[127, 127], [127, 127]]
+
+    clipped = extractor.compute_peaks(np.asarray([3.0, -3.0], dtype=np.float32), bins=2)
+    assert clipped.tolist() == [[127, 127], [-127, -127]]
+
+
+def test_compute_peaks_short_and_empty_signals():
+    extractor = AudioFeatureExtractor()
+    # Ít mẫu hơn số đoạn: mỗi mẫu là một đoạn
+    assert extractor.compute_peaks(np.asarray([0.5, -0.5], dtype=np.float32), bins=8).shape == (2, 2)
+    empty = extractor.compute_peaks(np.zeros(0, dtype=np.float32), bins=4)
+    assert empty.shape == (4, 2) and not empty.any()
@@ -0,0 +1,59 @@
+"""
+Tests cho tìm kiếm có lọc theo payload (category, thời lượng, tần số lấy mẫu, số kênh)
+"""
+import numpy as np
+import pytest
+import soundfile as sf
+
+from app.config import SAMPLE_RATE
+from app.database.qdrant_manager import QdrantManager, build_search_filter
+from app.feature_extractor import AudioFeatureExtractor
+
+
+def write_tone(path, seconds: float, sample_rate: int, channels: int = 1):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    y = 0.5 * np.sin(2 * np.pi * 440 * t)
+    sf.write(path, np.stack([y] * channels, axis=1) if channels > 1 else y, sample_rate)
+
+
+def test_extract_features_keeps_native_sample_rate(tmp_path):
+    path = tmp_path / "tone_44k.wav"
+    write_tone(path, 1.5, 44100, channels=2)
+    features = AudioFeatureExtractor().extract_features(str(path))
+
+    assert features["sample_rate"] == 44100
+    assert features["samples"] == int(1.5 * 44100)
+    assert features["channel"] == 2
+    assert features["duration"] == pytest.approx(1.5, abs=0.01)
+
+
+def test_filter_by_native_sample_rate(tmp_path, qdrant_client):
+    extractor = AudioFeatureExtractor()
+    points = {}
+    for point_id, (name, seconds, sample_rate) in enumerate([("a_48k.wav", 1.0, 48000),
+                                                             ("b_22k.wav", 1.0, SAMPLE_RATE),
+                                                             ("c_48k.wav", 3.0, 48000)]):
+        write_tone(tmp_path / name, seconds, sample_rate)
+        points[point_id] = extractor.extract_features(str(tmp_path / name))
+    manager = QdrantManager("filtered")
+    manager.upsert_points(points, dedup=False)
+    query = points[1]["vectors"]["v1"]
+
+    def search(**filters) -> list:
+        results = manager.search_similar(query, top_k=10, query_filter=build_search_filter(**filters),
+                                         vector_version="v1")
+        return sorted(result["file_name"] for result in results)
+
+    assert search(sample_rate=48000) == ["a_48k.wav", "c_48k.wav"]
+    assert search(sample_rate=SAMPLE_RATE) == ["b_22k.wav"]
+    assert search(sample_rate=48000, max_duration=2.0) == ["a_48k.wav"]
+    assert search(sample_rate=44100) == []
+
+
+def test_build_search_filter():
+    assert build_search_filter() is None
+    search_filter = build_search_filter(category=["Flute"], min_duration=1.0, sample_rate=48000, channel=2,
+                                        collapse_duplicates=True)
+    assert [condition.key for condition in search_filter.must] == ["category", "duration", "sample_rate", "channel"]
+    assert search_filter.must[1].range.gte == 1.0 and search_filter.must[1].range.lte is None
+    assert [condition.key for condition in search_filter.must_not] == ["is_canonical"]
@@ -0,0 +1,107 @@
+"""
+Tests cho index toàn bộ dataset có checkpoint: chạy tiếp (--resume) bỏ qua các batch đã hoàn thành
+"""
+import importlib
+
+import pytest
+
+from app.database.qdrant_manager import QdrantManager
+from app.indexing.checkpoint import IndexCheckpoint
+
+FILE_NAMES = [f"{index}.wav" for index in range(5)]
+
+
+class FakeExtractor:
+    def __init__(self, make_features):
+        self.make_features = make_features
+        self.calls = []
+
+    def extract_features(self, file_path, **kwargs):
+        file_name = file_path.rsplit("/", 1)[-1]
+        self.calls.append(file_name)
+        return self.make_features(file_name, seed=FILE_NAMES.index(file_name))
+
+
+@pytest.fixture
+def index_dataset(tmp_path, monkeypatch, qdrant_client, make_features):
+    # Script ghi indexing.log vào thư mục hiện tại khi được import
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("scripts.index_dataset")
+
+    dataset = tmp_path / "dataset"
+    dataset.mkdir()
+    for file_name in FILE_NAMES:
+        (dataset / file_name).write_bytes(file_name.encode())
+    checkpoint_path = tmp_path / "index_checkpoint.json"
+
+    class TmpCheckpoint(IndexCheckpoint):
+        def __init__(self, collection_name, dataset_path, path=checkpoint_path):
+            super().__init__(collection_name, dataset_path, path)
+
+        @classmethod
+        def load(cls, path=checkpoint_path):
+            return super().load(path)
+
+    class FakeManifest:
+        def save(self):
+            pass
+
+    extractor = FakeExtractor(make_features)
+    names = iter(["audio_features_1", "audio_features_2"])
+    monkeypatch.setattr(module, "AUDIO_DATASET_PATH", str(dataset))
+    monkeypatch.setattr(module, "IndexCheckpoint", TmpCheckpoint)
+    monkeypatch.setattr(module, "IndexManifest", FakeManifest)
+    monkeypatch.setattr(module, "AudioFeatureExtractor", lambda: extractor)
+    monkeypatch.setattr(module, "build_collection_name", lambda: next(names))
+    monkeypatch.setattr(module, "build_landmark_index", lambda qdrant_manager: None)
+    monkeypatch.setattr(module, "update_knn_graph", lambda qdrant_manager, full: None)
+    # Để test truy cập
+    monkeypatch.setattr(module, "extractor", extractor, raising=False)
+    monkeypatch.setattr(module, "checkpoint_path", checkpoint_path, raising=False)
+    return module
+
+
+def test_resume_skips_completed_batches(index_dataset, monkeypatch, qdrant_client):
+    upsert_points = QdrantManager.upsert_points
+    calls = []
+
+    def failing_upsert(self, points_data, *args, **kwargs):
+        calls.append(sorted(points_data))
+        if len(calls) == 2:
+            raise RuntimeError("Mất kết nối")
+        return upsert_points(self, points_data, *args, **kwargs)
+
+    monkeypatch.setattr(QdrantManager, "upsert_points", failing_upsert)
+    # Lần chạy đầu dừng ở batch thứ hai, checkpoint giữ batch đầu tiên
+    index_dataset.index_audio_dataset(batch_size=2)
+    checkpoint = IndexCheckpoint.load(index_dataset.checkpoint_path)
+    assert checkpoint.collection_name == "audio_features_1"
+    assert sorted(checkpoint.completed) == ["0.wav", "1.wav"]
+    assert checkpoint.next_id == 2
+
+    index_dataset.extractor.calls.clear()
+    index_dataset.index_audio_dataset(resume=True, batch_size=2)
+
+    # Chỉ các file chưa hoàn thành được trích xuất lại, ID tiếp nối checkpoint
+    assert index_dataset.extractor.calls == ["2.wav", "3.wav", "4.wav"]
+    assert calls[2:] == [[2, 3], [4]]
+    assert not index_dataset.checkpoint_path.exists()
+    manager = QdrantManager()
+    assert manager.get_alias_target(manager.collection_name) == "audio_features_1"
+    points, _ = qdrant_client.scroll("audio_features_1", limit=10)
+    assert sorted((point.id, point.payload["file_name"]) for point in points) == list(enumerate(FILE_NAMES))
+
+
+def test_without_resume_starts_a_new_collection(index_dataset, qdrant_client, make_features):
+    # Collection build dở của lần chạy trước
+    QdrantManager("audio_features_old").upsert_points({0: make_features("0.wav")}, dedup=False)
+    checkpoint = IndexCheckpoint("audio_features_old", index_dataset.AUDIO_DATASET_PATH,
+                                 index_dataset.checkpoint_path)
+    checkpoint.mark_completed({"0.wav": {"size": 5, "mtime_ns": 0, "sha1": "", "point_id": 0}}, 1)
+
+    index_dataset.index_audio_dataset(batch_size=2)
+
+    assert index_dataset.extractor.calls == FILE_NAMES
+    assert not qdrant_client.collection_exists("audio_features_old")
+    manager = QdrantManager()
+    assert manager.get_alias_target(manager.collection_name) == "audio_features_1"
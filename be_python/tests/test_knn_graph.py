@@ -0,0 +1,117 @@
+"""
+Tests cho đồ thị k láng giềng: gộp ứng viên, cập nhật khi xóa/thay đổi và cập nhật tăng dần qua Qdrant
+"""
+import numpy as np
+
+from app import knn_graph as knn_graph_module
+from app.knn_graph import graph_dtype, _compute_rows, _merge_rows, update_knn_graph, patch_knn_graph
+
+K = 3
+
+
+def normalized(rng: np.random.Generator, count: int, dims: int = 6) -> np.ndarray:
+    vectors = rng.standard_normal((count, dims)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_graph(ids: np.ndarray, vectors: np.ndarray, k: int = K) -> np.ndarray:
+    """ Đồ thị chính xác tính trên toàn bộ các point """
+    size = int(ids.max()) + 1
+    positions = np.full(size, -1, dtype=np.int64)
+    positions[ids] = np.arange(len(ids))
+    graph = np.zeros(size, dtype=graph_dtype(k))
+    graph["ids"] = -1
+    _compute_rows(graph, ids, ids, vectors, positions, block_size=4)
+    return graph
+
+
+def test_merge_rows_matches_full_computation():
+    rng = np.random.default_rng(0)
+    ids = np.arange(20, dtype=np.int64)
+    vectors = normalized(rng, 20)
+    old, candidates = ids[:15], ids[15:]
+    positions = np.arange(20, dtype=np.int64)
+
+    # Đồ thị của 15 point đầu, sau đó gộp 5 point mới làm ứng viên
+    graph = np.zeros(20, dtype=graph_dtype(K))
+    graph["ids"] = -1
+    old_positions = np.full(20, -1, dtype=np.int64)
+    old_positions[old] = old
+    _compute_rows(graph, old, old, vectors[old], old_positions, block_size=4)
+    _merge_rows(graph, old, candidates, vectors, positions, block_size=4)
+
+    expected = exact_graph(ids, vectors)
+    assert np.array_equal(graph["ids"][old], expected["ids"][old])
+    assert np.allclose(graph["scores"][old].astype(np.float32), expected["scores"][old].astype(np.float32),
+                       atol=1e-2)
+
+
+def test_update_knn_graph_handles_deletes_and_changes(tmp_path, monkeypatch):
+    rng = np.random.default_rng(1)
+    vectors = {point_id: vector for point_id, vector in enumerate(normalized(rng, 12))}
+
+    def load_vectors(qdrant_manager, vector_version):
+        ids = np.asarray(sorted(vectors), dtype=np.int64)
+        return ids, np.stack([vectors[point_id] for point_id in ids])
+
+    monkeypatch.setattr(knn_graph_module, "load_vectors", load_vectors)
+    update_knn_graph(object(), full=True, graph_path=tmp_path / "graph.npy", k=K)
+
+    # Xóa 2 và 5, thay đổi vector của 7, thêm point 12
+    del vectors[2], vectors[5]
+    vectors[7] = normalized(rng, 1)[0]
+    vectors[12] = normalized(rng, 1)[0]
+    stats = update_knn_graph(object(), changed_ids=[7], graph_path=tmp_path / "graph.npy", k=K)
+
+    graph = np.load(tmp_path / "graph.npy")
+    ids, matrix = load_vectors(None, None)
+    expected = exact_graph(ids, matrix)
+    assert stats["points"] == 11
+    assert np.array_equal(graph["ids"], expected["ids"])
+    assert np.all(graph["ids"][[2, 5]] == -1)
+    assert not np.isin(graph["ids"], [2, 5]).any()
+
+
+class FakeQdrantManager:
+    """ search_neighbors tính chính xác trên các vector hiện có (như truy vấn exact của Qdrant) """
+
+    def __init__(self, vectors: dict):
+        self.vectors = vectors
+        self.queried = []
+
+    def search_neighbors(self, point_ids, limit, vector_version, batch_size=256):
+        self.queried.extend(point_ids)
+        ids = sorted(self.vectors)
+        neighbors = {}
+        for point_id in point_ids:
+            scores = [(other, float(self.vectors[point_id] @ self.vectors[other])) for other in ids if other != point_id]
+            neighbors[point_id] = sorted(scores, key=lambda item: -item[1])[:limit]
+        return neighbors
+
+
+def test_patch_knn_graph_updates_affected_rows(tmp_path, monkeypatch):
+    rng = np.random.default_rng(2)
+    vectors = {point_id: vector for point_id, vector in enumerate(normalized(rng, 30))}
+    ids = np.arange(30, dtype=np.int64)
+    np.save(tmp_path / "graph.npy", exact_graph(ids, np.stack([vectors[i] for i in ids])))
+    # Không được tải vector của cả collection
+    monkeypatch.setattr(knn_graph_module, "load_vectors", None)
+
+    del vectors[4]
+    vectors[9] = normalized(rng, 1)[0]
+    vectors[30] = normalized(rng, 1)[0]
+    manager = FakeQdrantManager(vectors)
+    patch_knn_graph(manager, added_ids=[30], changed_ids=[9], removed_ids=[4], graph_path=tmp_path / "graph.npy",
+                    k=K)
+
+    graph = np.load(tmp_path / "graph.npy")
+    ids = np.asarray(sorted(vectors), dtype=np.int64)
+    expected = exact_graph(ids, np.stack([vectors[i] for i in ids]))
+    assert len(graph) == 31
+    assert np.all(graph["ids"][4] == -1)
+    assert not np.isin(graph["ids"], [4]).any()
+    assert set(manager.queried) < set(vectors)
+    # Dòng của point mới/thay đổi và dòng của các láng giềng của point mới là chính xác
+    rows = {30, 9, *expected["ids"][30].tolist()}
+    for row in rows:
+        assert np.array_equal(graph["ids"][row], expected["ids"][row]), row
@@ -0,0 +1,161 @@
+"""
+Tests cho index landmark: khớp đoạn trích và cập nhật tăng dần
+"""
+import numpy as np
+
+from app import landmark_index as landmark_index_module
+from app.config import HOP_LENGTH, SAMPLE_RATE
+from app.landmark_index import LandmarkIndex, INDEX_DTYPE, build_landmark_index, update_landmark_index
+from app.utils.landmark_utils import LANDMARK_DTYPE
+
+
+def random_landmarks(rng: np.random.Generator, count: int, frames: int = 1000) -> np.ndarray:
+    landmarks = np.zeros(count, dtype=LANDMARK_DTYPE)
+    landmarks["hash"] = rng.integers(0, 1 << 26, count)
+    landmarks["offset"] = np.sort(rng.integers(0, frames, count))
+    return landmarks
+
+
+def write_index(path, files: dict):
+    parts = []
+    for point_id, landmarks in files.items():
+        part = np.empty(len(landmarks), dtype=INDEX_DTYPE)
+        part["hash"], part["point_id"], part["offset"] = landmarks["hash"], point_id, landmarks["offset"]
+        parts.append(part)
+    index = np.concatenate(parts)
+    np.save(path, index[np.argsort(index["hash"], kind="stable")])
+
+
+def test_match_finds_excerpt_and_offset(tmp_path):
+    rng = np.random.default_rng(0)
+    files = {0: random_landmarks(rng, 2000), 1: random_landmarks(rng, 2000)}
+    write_index(tmp_path / "index.npy", files)
+    index = LandmarkIndex(tmp_path / "index.npy", min_matches=5, min_ratio=0.05)
+
+    # Đoạn trích từ frame 300 đến 600 của file 1, vị trí tính lại từ đầu đoạn trích
+    source = files[1]
+    excerpt = source[(source["offset"] >= 300) & (source["offset"] < 600)].copy()
+    excerpt["offset"] -= 300
+    matches = index.match(excerpt, limit=3)
+
+    assert [match["point_id"] for match in matches] == [1]
+    assert np.isclose(matches[0]["offset"], 300 * HOP_LENGTH / SAMPLE_RATE)
+    assert matches[0]["matches"] >= len(excerpt)
+    assert matches[0]["score"] == 1.0
+
+
+def test_match_rejects_unrelated_audio(tmp_path):
+    rng = np.random.default_rng(1)
+    write_index(tmp_path / "index.npy", {0: random_landmarks(rng, 2000)})
+    index = LandmarkIndex(tmp_path / "index.npy", min_matches=5, min_ratio=0.05)
+
+    assert index.match(random_landmarks(rng, 300)) == []
+    assert index.match(np.zeros(0, dtype=LANDMARK_DTYPE)) == []
+    assert LandmarkIndex(tmp_path / "missing.npy").match(random_landmarks(rng, 10)) == []
+
+
+class FakeQdrantManager:
+    def __init__(self, point_file_names: dict):
+        self.point_file_names = point_file_names
+
+    def get_point_file_names(self):
+        return dict(self.point_file_names)
+
+
+def test_update_matches_full_build(tmp_path, monkeypatch):
+    rng = np.random.default_rng(2)
+    landmarks = {f"file{i}.wav": random_landmarks(rng, 200) for i in range(6)}
+    monkeypatch.setattr(landmark_index_module, "get_landmarks_path", lambda file_name: file_name)
+    monkeypatch.setattr(landmark_index_module, "load_landmarks", lambda path: landmarks.get(path))
+    manager = FakeQdrantManager({i: f"file{i}.wav" for i in range(4)})
+    build_landmark_index(manager, tmp_path / "index.npy")
+
+    # Point 1 bị xóa, point 2 thay đổi nội dung, point 4 và 5 mới
+    landmarks["file2.wav"] = random_landmarks(rng, 150)
+    manager.point_file_names = {0: "file0.wav", 2: "file2.wav", 3: "file3.wav", 4: "file4.wav", 5: "file5.wav"}
+    stats = update_landmark_index({2: "file2.wav", 4: "file4.wav", 5: "file5.wav"}, removed_ids=[1],
+                                  qdrant_manager=manager, index_path=tmp_path / "index.npy")
+    build_landmark_index(manager, tmp_path / "full.npy")
+
+    updated, full = np.load(tmp_path / "index.npy"), np.load(tmp_path / "full.npy")
+    assert stats["points"] == 3
+    assert np.all(np.diff(updated["hash"].astype(np.int64)) >= 0)
+    order = ["hash", "point_id", "offset"]
+    assert np.array_equal(np.sort(updated, order=order), np.sort(full, order=order))
+
+
+class FakeFeatureExtractor:
+    """ Bỏ qua giải mã và trích xuất, luôn trả về cùng một vector truy vấn """
+
+    def __init__(self, query_vector: np.ndarray):
+        self.query_vector = query_vector
+
+    def load_audio(self, file_path):
+        return np.zeros(SAMPLE_RATE, dtype=np.float32), SAMPLE_RATE
+
+    def compute_landmarks(self, y):
+        return np.zeros(0, dtype=LANDMARK_DTYPE)
+
+    def extract_features(self, file_path, versions, **kwargs):
+        return {"vectors": {version: self.query_vector for version in versions}}
+
+
+class FakeLandmarkIndex:
+    def __init__(self, matches: list):
+        self.matches = matches
+
+    def match(self, landmarks, limit: int = 1):
+        return self.matches[:limit]
+
+
+def test_search_pages_fingerprint_hits_before_vector_hits(tmp_path, monkeypatch, qdrant_client, make_features):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api import router as router_module
+    from app.database.qdrant_manager import QdrantManager
+    from app.database.search_batcher import SearchBatcher
+    from app.utils import audio_utils
+
+    monkeypatch.setattr(audio_utils, "TEMP_DIR", tmp_path)
+    monkeypatch.setattr(router_module, "TEMP_DIR", tmp_path)
+    manager = QdrantManager("fingerprint")
+    manager.upsert_points({point_id: make_features(f"file{point_id}.wav", seed=point_id) for point_id in range(6)},
+                          dedup=False)
+    query_vector = make_features("query.wav", seed=0)["vectors"]["v1"]
+    # Point 4 và 2 khớp fingerprint, point 99 đã bị xóa khỏi collection
+    matches = [{"point_id": 4, "score": 0.9, "offset": 1.5, "matches": 40},
+               {"point_id": 99, "score": 0.8, "offset": 0.0, "matches": 30},
+               {"point_id": 2, "score": 0.3, "offset": 0.0, "matches": 12}]
+
+    app = FastAPI()
+    app.include_router(router_module.router, prefix="/api")
+    app.dependency_overrides[router_module.get_feature_extractor] = lambda: FakeFeatureExtractor(query_vector)
+    app.dependency_overrides[router_module.get_search_batcher] = lambda: SearchBatcher(manager, enabled=False)
+    app.dependency_overrides[router_module.get_landmark_index] = lambda: FakeLandmarkIndex(matches)
+    client = TestClient(app)
+
+    response = client.post("/api/search", params={"limit": 3, "fingerprint": True, "rerank": False},
+                           files={"file": ("query.wav", b"RIFF", "audio/wav")})
+    assert response.status_code == 200
+    first = response.json()
+    assert first["match_type"] == "fingerprint"
+    assert [result["file_name"] for result in first["results"]] == ["file4.wav", "file2.wav", "file0.wav"]
+    fingerprint_hit = first["results"][0]
+    assert fingerprint_hit["fingerprint_score"] == 0.9 and fingerprint_hit["match_offset"] == 1.5
+    # similarity vẫn là độ tương đồng cosine thật, không phải tỉ lệ landmark
+    assert np.isclose(fingerprint_hit["similarity"],
+                      np.dot(query_vector, make_features("file4.wav", seed=4)["vectors"]["v1"]), atol=1e-5)
+    assert first["results"][2]["fingerprint_score"] is None
+
+    second = client.get(f"/api/search/result/{first['query_id']}", params={"offset": 3, "limit": 3}).json()
+    # Trang đầu của kết quả đã cache cho cùng thứ tự, các trang sau không lặp lại file khớp fingerprint
+    again = client.get(f"/api/search/result/{first['query_id']}", params={"offset": 0, "limit": 3}).json()
+    assert again["results"] == first["results"]
+    names = [result["file_name"] for page in (first, second) for result in page["results"]]
+    assert sorted(names) == [f"file{point_id}.wav" for point_id in range(6)]
+    assert all(result["fingerprint_score"] is None for result in second["results"])
+
+    # Trang bắt đầu giữa các file khớp fingerprint
+    middle = client.get(f"/api/search/result/{first['query_id']}", params={"offset": 1, "limit": 2}).json()
+    assert [result["file_name"] for result in middle["results"]] == ["file2.wav", "file0.wav"]
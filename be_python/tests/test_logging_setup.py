@@ -0,0 +1,85 @@
+"""
+Tests cho logging qua hàng đợi: bỏ record khi đầy, định dạng JSON và các filter
+"""
+import json
+import logging
+import queue
+import sys
+
+from app.utils.logging_setup import DroppingQueueHandler, JsonFormatter, ContextFilter, SamplingFilter, \
+    LOG_RECORDS_DROPPED, parse_sampling, request_id_var
+
+
+def make_record(msg: str = "Đã xử lý %s", args=("q1",), level: int = logging.INFO, name: str = "app",
+                exc_info=None, **extra) -> logging.LogRecord:
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, exc_info)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_dropping_queue_handler_drops_when_full():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    dropped = LOG_RECORDS_DROPPED.value
+    for index in range(5):
+        handler.handle(make_record(args=(index,)))
+
+    assert handler.queue.qsize() == 2
+    assert LOG_RECORDS_DROPPED.value == dropped + 3
+    assert [handler.queue.get_nowait().getMessage() for _ in range(2)] == ["Đã xử lý 0", "Đã xử lý 1"]
+
+
+def test_json_formatter_fields():
+    record = make_record(duration_ms=12.5, request_id="r1", query_id=None)
+    data = json.loads(JsonFormatter().format(record))
+
+    assert data["level"] == "INFO"
+    assert data["logger"] == "app"
+    assert data["message"] == "Đã xử lý q1"
+    assert data["ts"].endswith("+00:00")
+    # Thuộc tính truyền qua extra được giữ, giá trị None và thuộc tính chuẩn bị bỏ
+    assert data["duration_ms"] == 12.5
+    assert data["request_id"] == "r1"
+    assert "query_id" not in data and "lineno" not in data and "exc_info" not in data
+
+
+def test_exception_survives_the_queue_in_its_own_field():
+    handler = DroppingQueueHandler(queue.Queue())
+    try:
+        raise ValueError("hỏng")
+    except ValueError:
+        logger = logging.getLogger("test_logging_setup")
+        record = logger.makeRecord(logger.name, logging.ERROR, __file__, 1, "Lỗi khi xử lý %s", ("q1",),
+                                   sys.exc_info())
+    handler.handle(record)
+    queued = handler.queue.get_nowait()
+
+    assert queued.exc_info is None
+    data = json.loads(JsonFormatter().format(queued))
+    assert data["message"] == "Lỗi khi xử lý q1"
+    assert data["exc_info"].startswith("Traceback")
+    assert "ValueError: hỏng" in data["exc_info"]
+    # Handler stdout vẫn in traceback sau message
+    plain = logging.Formatter("%(message)s").format(queued)
+    assert plain.startswith("Lỗi khi xử lý q1\nTraceback")
+
+
+def test_context_filter_attaches_request_id():
+    token = request_id_var.set("r42")
+    try:
+        record = make_record()
+        assert ContextFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+    assert record.request_id == "r42"
+    assert record.query_id is None
+
+
+def test_sampling_filter_keeps_warnings():
+    rates = parse_sampling(" app.stream=0.0 , app.search=1")
+    assert rates == {"app.stream": 0.0, "app.search": 1.0}
+    sampling = SamplingFilter(rates)
+
+    assert not sampling.filter(make_record(name="app.stream"))
+    assert sampling.filter(make_record(name="app.stream", level=logging.WARNING))
+    assert sampling.filter(make_record(name="app.search"))
+    assert sampling.filter(make_record(name="app.other"))
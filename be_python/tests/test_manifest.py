@@ -0,0 +1,68 @@
+"""
+Tests cho IndexManifest.diff
+"""
+import os
+
+from app.indexing.manifest import IndexManifest, file_sha1, scan_directory
+
+
+def write(path, data: bytes, mtime_ns: int = None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def record(manifest: IndexManifest, root, rel_path: str, point_id: int):
+    stat = os.stat(root / rel_path)
+    manifest.set(rel_path, stat.st_size, stat.st_mtime_ns, file_sha1(str(root / rel_path)), point_id)
+
+
+def test_diff_classifies_files(tmp_path):
+    root = tmp_path / "dataset"
+    for name in ("same.wav", "touched.wav", "changed.wav", "resized.wav", "removed.wav"):
+        write(root / "a" / name, b"0123456789", mtime_ns=1_000_000_000)
+    manifest = IndexManifest(tmp_path / "manifest.json")
+    for point_id, name in enumerate(("same.wav", "touched.wav", "changed.wav", "resized.wav", "removed.wav")):
+        record(manifest, root, f"a/{name}", point_id)
+
+    # Chỉ đổi mtime, nội dung giữ nguyên
+    write(root / "a" / "touched.wav", b"0123456789", mtime_ns=2_000_000_000)
+    # Cùng kích thước nhưng nội dung khác
+    write(root / "a" / "changed.wav", b"9876543210", mtime_ns=2_000_000_000)
+    write(root / "a" / "resized.wav", b"01234", mtime_ns=1_000_000_000)
+    os.remove(root / "a" / "removed.wav")
+    write(root / "b" / "added.mp3", b"new")
+    write(root / "b" / "notes.txt", b"not audio")
+
+    diff = manifest.diff(str(root))
+    assert diff.added == ["b/added.mp3"]
+    assert diff.changed == ["a/changed.wav", "a/resized.wav"]
+    assert diff.removed == ["a/removed.wav"]
+    assert diff.touched == {"a/touched.wav": file_sha1(str(root / "a" / "touched.wav"))}
+
+
+def test_diff_only_limits_removed(tmp_path):
+    root = tmp_path / "dataset"
+    write(root / "kept.wav", b"data")
+    manifest = IndexManifest(tmp_path / "manifest.json")
+    record(manifest, root, "kept.wav", 0)
+    manifest.set("gone.wav", 4, 0, "sha1", 1)
+    manifest.set("other.wav", 4, 0, "sha1", 2)
+
+    scanned = {rel_path: stat for rel_path, stat in scan_directory(str(root)).items() if rel_path == "kept.wav"}
+    diff = manifest.diff(str(root), scanned, only={"kept.wav", "gone.wav"})
+    assert diff.removed == ["gone.wav"]
+    assert diff.added == [] and diff.changed == []
+
+
+def test_manifest_round_trip(tmp_path):
+    manifest = IndexManifest(tmp_path / "manifest.json")
+    manifest.set("a.wav", 1, 2, "sha1", manifest.allocate_id())
+    manifest.add_external(7, "/elsewhere/b.wav")
+    manifest.save()
+
+    loaded = IndexManifest.load(tmp_path / "manifest.json")
+    assert loaded.entries == manifest.entries
+    assert loaded.external_ids() == {7}
+    assert loaded.next_id == 1
@@ -0,0 +1,67 @@
+"""
+Tests cho registry metric (Prometheus text format) và InFlightRequestsMiddleware
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils.metrics import MetricsRegistry, InFlightRequestsMiddleware, REQUESTS_IN_FLIGHT
+
+
+def test_render_counter_and_gauge_with_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter("cache_requests_total", "Số lần truy cập cache", labelnames=("cache", "result"))
+    counter.labels(cache="peaks", result="hit").inc()
+    counter.labels(cache="peaks", result="hit").inc(2)
+    counter.labels(cache="peaks", result="miss").inc()
+    registry.gauge("queue_size", "Kích thước hàng đợi", callback=lambda: 7)
+
+    assert registry.render().splitlines() == [
+        "# HELP cache_requests_total Số lần truy cập cache",
+        "# TYPE cache_requests_total counter",
+        'cache_requests_total{cache="peaks",result="hit"} 3.0',
+        'cache_requests_total{cache="peaks",result="miss"} 1.0',
+        "# HELP queue_size Kích thước hàng đợi",
+        "# TYPE queue_size gauge",
+        "queue_size 7",
+    ]
+
+
+def test_render_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("search_seconds", "Thời gian tìm kiếm", labelnames=("kind",),
+                                   buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.labels(kind="vector").observe(value)
+
+    assert registry.render().splitlines()[2:] == [
+        'search_seconds_bucket{kind="vector",le="0.1"} 2',
+        'search_seconds_bucket{kind="vector",le="1.0"} 3',
+        'search_seconds_bucket{kind="vector",le="+Inf"} 4',
+        'search_seconds_sum{kind="vector"} 3.65',
+        'search_seconds_count{kind="vector"} 4',
+    ]
+
+
+def test_register_rejects_duplicate_names():
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Số request")
+    with pytest.raises(ValueError):
+        registry.gauge("requests_total", "Trùng tên")
+
+
+def test_in_flight_middleware_counts_only_while_handling():
+    app = FastAPI()
+    app.add_middleware(InFlightRequestsMiddleware)
+
+    @app.get("/in-flight")
+    async def in_flight():
+        return {"value": REQUESTS_IN_FLIGHT.value}
+
+    before = REQUESTS_IN_FLIGHT.value
+    with TestClient(app) as client:
+        assert client.get("/in-flight").json()["value"] == before + 1
+        # Lifespan và request đã xong không được tính
+        assert REQUESTS_IN_FLIGHT.value == before
+        assert client.get("/missing").status_code == 404
+    assert REQUESTS_IN_FLIGHT.value == before
@@ -0,0 +1,66 @@
+"""
+Tests cho bản preview dung lượng thấp và route /api/stream?quality=preview
+"""
+import asyncio
+
+import numpy as np
+import pytest
+import soundfile as sf
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import router as router_module
+from app.config import PREVIEW_SAMPLE_RATE
+from app.utils import audio_utils, preview_utils
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    dataset_dir = tmp_path / "dataset"
+    preview_dir = tmp_path / "previews"
+    (dataset_dir / "Flute").mkdir(parents=True)
+    preview_dir.mkdir()
+    monkeypatch.setattr(audio_utils, "AUDIO_DATASET_PATH", str(dataset_dir))
+    monkeypatch.setattr(preview_utils, "PREVIEW_DIR", preview_dir)
+
+    sample_rate = 44100
+    t = np.arange(sample_rate) / sample_rate
+    stereo = np.stack([np.sin(2 * np.pi * 440 * t), np.sin(2 * np.pi * 660 * t)], axis=1) * 0.5
+    source = dataset_dir / "Flute" / "tone.wav"
+    sf.write(source, stereo, sample_rate)
+    return source
+
+
+def test_ensure_preview_renders_mono_low_rate_ogg(dataset):
+    preview_path = asyncio.run(preview_utils.ensure_preview(str(dataset)))
+
+    assert preview_path == str(preview_utils.get_preview_path("tone.wav"))
+    info = sf.info(preview_path)
+    assert info.format == "OGG"
+    assert info.samplerate == PREVIEW_SAMPLE_RATE
+    assert info.channels == 1
+    assert info.duration == pytest.approx(1.0, abs=0.05)
+
+
+def test_ensure_preview_reuses_fresh_preview(dataset, monkeypatch):
+    asyncio.run(preview_utils.ensure_preview(str(dataset)))
+
+    def fail(source_path):
+        raise AssertionError("Không được tạo lại bản preview còn mới")
+
+    monkeypatch.setattr(preview_utils, "build_preview", fail)
+    assert asyncio.run(preview_utils.ensure_preview(str(dataset))).endswith("tone.wav.ogg")
+
+
+def test_stream_route_serves_preview(dataset):
+    app = FastAPI()
+    app.include_router(router_module.router, prefix="/api")
+    with TestClient(app) as client:
+        preview = client.get("/api/stream/tone.wav", params={"type": "result", "quality": "preview"})
+        original = client.get("/api/stream/tone.wav", params={"type": "result"})
+
+    assert preview.status_code == 200
+    assert preview.headers["content-type"] == "audio/ogg"
+    assert preview.content == preview_utils.get_preview_path("tone.wav").read_bytes()
+    assert original.headers["content-type"] == "audio/wav"
+    assert len(preview.content) < len(original.content)
@@ -0,0 +1,60 @@
+"""
+Tests cho việc gắn ProfilingMiddleware và ProfileStore (lưu vòng tròn)
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.utils.profiling import ProfileStore, SamplingProfiler
+
+BE_PYTHON_DIR = Path(__file__).resolve().parent.parent
+
+
+def app_middlewares(tmp_path, **env) -> list:
+    """ Import app.main trong tiến trình riêng (cấu hình đọc lúc import) và trả về tên các middleware """
+    environment = {key: value for key, value in os.environ.items()
+                   if key not in ("ADMIN_TOKEN", "PROFILE_SAMPLE_RATE")}
+    environment.update(LOG_FILE=str(tmp_path / "app.log"), WARMUP_ENABLED="false", **env)
+    output = subprocess.run(
+        [sys.executable, "-c",
+         "from app.main import app; print(','.join(m.cls.__name__ for m in app.user_middleware))"],
+        cwd=BE_PYTHON_DIR, env=environment, capture_output=True, text=True, check=True
+    ).stdout
+    return output.strip().splitlines()[-1].split(",")
+
+
+@pytest.mark.parametrize("env, attached", [
+    ({}, False),
+    ({"ADMIN_TOKEN": "secret"}, True),
+    ({"PROFILE_SAMPLE_RATE": "0.01"}, True),
+])
+def test_profiling_middleware_only_attached_when_enabled(tmp_path, env, attached):
+    assert ("ProfilingMiddleware" in app_middlewares(tmp_path, **env)) == attached
+
+
+def save_profile(store: ProfileStore, profile_id: str) -> str:
+    profiler = SamplingProfiler(sys._getframe())
+    return store.save(profiler, {"id": profile_id, "path": "/api/search"})
+
+
+def test_profile_store_evicts_oldest(tmp_path):
+    store = ProfileStore(directory=tmp_path, ring_size=2)
+    for profile_id in ("1000-a", "2000-b", "3000-c"):
+        save_profile(store, profile_id)
+
+    assert [meta["id"] for meta in store.list()] == ["3000-c", "2000-b"]
+    # Mọi định dạng của profile bị loại đều bị xóa
+    assert not list(tmp_path.glob("1000-a*"))
+    assert store.get_path("2000-b", "collapsed") == tmp_path / "2000-b.collapsed"
+    assert store.get_path("1000-a") is None
+
+
+def test_profile_store_rejects_unknown_format_and_paths(tmp_path):
+    store = ProfileStore(directory=tmp_path, ring_size=2)
+    save_profile(store, "1000-a")
+
+    assert store.get_path("1000-a", "svg") is None
+    assert store.get_path("../1000-a") is None
@@ -0,0 +1,16 @@
+"""
+Tests cho các hàm tạo tham số truy vấn Qdrant
+"""
+from qdrant_client.http import models
+
+from app.database.qdrant_manager import build_search_params
+
+
+def test_build_search_params_default_is_none():
+    assert build_search_params() is None
+    assert build_search_params(hnsw_ef=None, exact=False) is None
+
+
+def test_build_search_params():
+    assert build_search_params(hnsw_ef=128) == models.SearchParams(hnsw_ef=128, exact=False)
+    assert build_search_params(exact=True) == models.SearchParams(hnsw_ef=None, exact=True)
@@ -0,0 +1,43 @@
+"""
+Tests cho banded_dtw
+"""
+import numpy as np
+
+from app.reranker import banded_dtw
+
+
+def naive_dtw(query: np.ndarray, candidate: np.ndarray) -> float:
+    """ DTW đầy đủ O(n·m) theo định nghĩa, cùng chuẩn hóa với banded_dtw """
+    cost = 1.0 - query @ candidate.T
+    n, m = cost.shape
+    table = np.full((n + 1, m + 1), np.inf)
+    table[0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            table[i, j] = cost[i - 1, j - 1] + min(table[i - 1, j - 1], table[i - 1, j], table[i, j - 1])
+    return float(table[n, m] / (n + m))
+
+
+def random_sequence(rng: np.random.Generator, length: int, dims: int = 8) -> np.ndarray:
+    frames = rng.standard_normal((length, dims)).astype(np.float32)
+    return frames / np.linalg.norm(frames, axis=1, keepdims=True)
+
+
+def test_full_band_matches_naive_dtw():
+    rng = np.random.default_rng(0)
+    for n, m in ((1, 1), (5, 5), (7, 12), (12, 7), (20, 3)):
+        query, candidate = random_sequence(rng, n), random_sequence(rng, m)
+        assert np.isclose(banded_dtw(query, candidate, band=1.0), naive_dtw(query, candidate), atol=1e-5)
+
+
+def test_narrow_band_is_never_better_than_naive():
+    rng = np.random.default_rng(1)
+    query, candidate = random_sequence(rng, 30), random_sequence(rng, 45)
+    banded = banded_dtw(query, candidate, band=0.05)
+    assert np.isfinite(banded)
+    assert banded >= naive_dtw(query, candidate) - 1e-5
+
+
+def test_identical_sequences_have_zero_distance():
+    sequence = random_sequence(np.random.default_rng(2), 16)
+    assert np.isclose(banded_dtw(sequence, sequence), 0.0, atol=1e-6)
@@ -0,0 +1,95 @@
+"""
+Tests cho cache kết quả tìm kiếm (bộ nhớ và SQLite dùng chung giữa các worker)
+"""
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from app.utils import result_cache as result_cache_module
+from app.utils.result_cache import MemoryResultCache, SQLiteResultCache
+
+BE_PYTHON_DIR = Path(__file__).resolve().parent.parent
+RESPONSE = {"query_id": "q1", "results": [{"file_name": "a.wav", "similarity": 0.9}]}
+
+
+def test_sqlite_cache_is_shared_between_connections(tmp_path):
+    path = tmp_path / "result_cache.sqlite3"
+    # Hai instance tương ứng với hai worker dùng chung một file
+    writer = SQLiteResultCache(path, ttl_seconds=60)
+    reader = SQLiteResultCache(path, ttl_seconds=60)
+    writer.set("q1", RESPONSE)
+
+    assert reader.get("q1") == RESPONSE
+    assert "q1" in reader
+    assert reader.get("q2") is None
+
+    # Connection riêng của thread khác cũng thấy dữ liệu
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(reader.get("q1")))
+    thread.start()
+    thread.join()
+    assert seen == [RESPONSE]
+
+
+def test_sqlite_cache_expires_entries(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache_module.time, "time", lambda: now[0])
+    cache = SQLiteResultCache(tmp_path / "result_cache.sqlite3", ttl_seconds=60)
+    cache.set("q1", RESPONSE)
+
+    now[0] += 59
+    assert cache.get("q1") == RESPONSE
+    now[0] += 2
+    assert cache.get("q1") is None
+    assert "q1" not in cache
+
+    cache.purge()
+    count = cache._connection().execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+    assert count == 0
+
+
+def test_sqlite_cache_purge_keeps_maxsize_newest(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache_module.time, "time", lambda: now[0])
+    cache = SQLiteResultCache(tmp_path / "result_cache.sqlite3", ttl_seconds=60, maxsize=2)
+    for key in ("q1", "q2", "q3"):
+        cache.set(key, RESPONSE)
+        now[0] += 1
+
+    cache.purge()
+    assert [key for key in ("q1", "q2", "q3") if key in cache] == ["q2", "q3"]
+
+
+def test_memory_cache():
+    cache = MemoryResultCache(ttl_seconds=60, maxsize=1)
+    cache.set("q1", RESPONSE)
+    assert cache.get("q1") == RESPONSE and "q1" in cache
+    cache.set("q2", RESPONSE)
+    assert cache.get("q1") is None
+
+
+def default_backend(**env) -> str:
+    environment = {key: value for key, value in os.environ.items()
+                   if key not in ("RESULT_CACHE_BACKEND", "APP_WORKERS", "WEB_CONCURRENCY", "SERVER_SOFTWARE")}
+    environment.update(env)
+    output = subprocess.run(
+        [sys.executable, "-c", "from app.config import RESULT_CACHE_BACKEND; print(RESULT_CACHE_BACKEND)"],
+        cwd=BE_PYTHON_DIR, env=environment, capture_output=True, text=True, check=True
+    ).stdout
+    return output.strip()
+
+
+@pytest.mark.parametrize("env, backend", [
+    ({}, "memory"),
+    ({"APP_WORKERS": "4"}, "sqlite"),
+    ({"WEB_CONCURRENCY": "4"}, "sqlite"),
+    # Worker do gunicorn fork vẫn có APP_WORKERS=1
+    ({"SERVER_SOFTWARE": "gunicorn/21.2.0"}, "sqlite"),
+    ({"APP_WORKERS": "4", "RESULT_CACHE_BACKEND": "Memory"}, "memory"),
+])
+def test_default_backend_follows_worker_count(env, backend):
+    assert default_backend(**env) == backend
@@ -0,0 +1,90 @@
+"""
+Tests cho SearchBatcher: gom truy vấn đồng thời và trả lỗi về đúng truy vấn
+"""
+import asyncio
+
+import numpy as np
+
+from app.database.qdrant_manager import VectorVersionNotFound
+from app.database.search_batcher import SearchBatcher
+
+
+class FakeQdrantManager:
+    def __init__(self, error: Exception = None):
+        self.batches = []
+        self.single = 0
+        self.error = error
+
+    def search_similar(self, **query):
+        self.single += 1
+        return [{"query": query["top_k"]}]
+
+    def search_similar_batch(self, queries, return_exceptions=False):
+        self.batches.append(len(queries))
+        if self.error is not None:
+            raise self.error
+        results = []
+        for query in queries:
+            if query["vector_version"] == "missing":
+                error = VectorVersionNotFound("missing")
+                if not return_exceptions:
+                    raise error
+                results.append(error)
+            else:
+                results.append([{"query": query["top_k"]}])
+        return results
+
+
+def run_concurrently(batcher: SearchBatcher, versions):
+    async def main():
+        return await asyncio.gather(*(
+            batcher.search_similar(np.zeros(4), top_k=top_k, vector_version=version)
+            for top_k, version in enumerate(versions, start=1)
+        ), return_exceptions=True)
+
+    return asyncio.run(main())
+
+
+def test_concurrent_queries_share_one_batch():
+    manager = FakeQdrantManager()
+    batcher = SearchBatcher(manager, enabled=True, window_ms=50, max_batch_size=16)
+    results = run_concurrently(batcher, ["v1"] * 5)
+
+    assert manager.batches == [5]
+    # Mỗi truy vấn nhận đúng kết quả của mình
+    assert results == [[{"query": top_k}] for top_k in range(1, 6)]
+
+
+def test_batches_respect_max_batch_size():
+    manager = FakeQdrantManager()
+    batcher = SearchBatcher(manager, enabled=True, window_ms=50, max_batch_size=2)
+    run_concurrently(batcher, ["v1"] * 5)
+
+    assert sum(manager.batches) == 5
+    assert max(manager.batches) <= 2
+
+
+def test_invalid_query_only_fails_its_own_future():
+    manager = FakeQdrantManager()
+    batcher = SearchBatcher(manager, enabled=True, window_ms=50)
+    results = run_concurrently(batcher, ["v1", "missing", "v1"])
+
+    assert manager.batches == [3]
+    assert results[0] == [{"query": 1}] and results[2] == [{"query": 3}]
+    assert isinstance(results[1], VectorVersionNotFound)
+
+
+def test_batch_error_fails_every_query():
+    manager = FakeQdrantManager(error=RuntimeError("qdrant down"))
+    batcher = SearchBatcher(manager, enabled=True, window_ms=50)
+    results = run_concurrently(batcher, ["v1", "v1"])
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_disabled_batcher_searches_directly():
+    manager = FakeQdrantManager()
+    batcher = SearchBatcher(manager, enabled=False)
+
+    assert asyncio.run(batcher.search_similar(np.zeros(4), top_k=7)) == [{"query": 7}]
+    assert manager.single == 1 and manager.batches == []
@@ -0,0 +1,109 @@
+"""
+Tests cho giao thức WebSocket của /api/search/stream
+"""
+import os
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.api import router as router_module
+from app.config import SAMPLE_RATE
+from app.database.qdrant_manager import payload_to_result
+from app.utils import peaks_utils
+
+PAYLOAD = {"file_name": "tone.wav", "file_type": "wav", "file_size_kb": 1.0, "sample_rate": SAMPLE_RATE,
+           "channel": 1, "samples": SAMPLE_RATE, "duration": 1.0, "subtype": "PCM_16"}
+
+
+class FakeBatcher:
+    def __init__(self):
+        self.queries = []
+
+    async def search_similar(self, query_vector, top_k=10, **kwargs):
+        self.queries.append({"vector": np.asarray(query_vector), "top_k": top_k, **kwargs})
+        return [payload_to_result(PAYLOAD, 0.9)]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(router_module, "TEMP_DIR", str(tmp_path))
+    monkeypatch.setattr(peaks_utils, "TEMP_DIR", tmp_path)
+    batcher = FakeBatcher()
+    app = FastAPI()
+    app.include_router(router_module.router, prefix="/api")
+    app.dependency_overrides[router_module.get_search_batcher] = lambda: batcher
+    with TestClient(app) as test_client:
+        test_client.batcher = batcher
+        yield test_client
+
+
+def tone(seconds: float, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+
+def test_stream_sends_progressive_and_final_results(client, tmp_path):
+    samples = tone(2.5)
+    chunk = SAMPLE_RATE // 2
+    with client.websocket_connect("/api/search/stream?limit=3") as websocket:
+        for start in range(0, len(samples), chunk):
+            websocket.send_bytes(samples[start:start + chunk].tobytes())
+        websocket.send_json({"type": "end"})
+        # Top-k không đổi giữa các lần tìm nên chỉ nhận một message "results" trước "final"
+        progress = websocket.receive_json()
+        final = websocket.receive_json()
+
+    assert progress["type"] == "results"
+    assert progress["seconds"] >= 1.0
+    assert [item["file_name"] for item in progress["results"]] == ["tone.wav"]
+    assert final["type"] == "final"
+    response = final["response"]
+    assert response["match_type"] == "vector"
+    assert response["limit"] == 3
+    assert response["temp_file_name"] == f"{response['query_id']}.wav"
+    assert os.path.exists(tmp_path / response["temp_file_name"])
+    assert os.path.exists(tmp_path / f"{response['temp_file_name']}.peaks")
+    # Kết quả cuối được cache cho /search/result
+    assert router_module.cache.get(response["query_id"])["response"] == response
+    assert client.batcher.queries[-1]["top_k"] == 3
+
+
+def test_stream_accepts_int16_stereo(client):
+    samples = (tone(1.5) * 32767).astype(np.int16)
+    stereo = np.stack([samples, samples], axis=1).reshape(-1)
+    with client.websocket_connect("/api/search/stream?pcm_format=int16&pcm_channels=2") as websocket:
+        websocket.send_bytes(stereo.tobytes())
+        websocket.send_json({"type": "end"})
+        messages = [websocket.receive_json(), websocket.receive_json()]
+
+    assert [message["type"] for message in messages] == ["results", "final"]
+
+
+def test_stream_rejects_invalid_parameters(client):
+    with client.websocket_connect("/api/search/stream?pcm_format=float64") as websocket:
+        message = websocket.receive_json()
+        assert message["type"] == "error"
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == 1008
+
+
+def test_stream_rejects_partial_frames(client):
+    with client.websocket_connect("/api/search/stream?pcm_channels=2") as websocket:
+        # 3 mẫu float32 không chia hết cho 2 kênh
+        websocket.send_bytes(np.zeros(3, dtype=np.float32).tobytes())
+        message = websocket.receive_json()
+        assert message["type"] == "error"
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == 1011
+
+
+def test_stream_requires_audio(client):
+    with client.websocket_connect("/api/search/stream") as websocket:
+        websocket.send_json({"type": "end"})
+        message = websocket.receive_json()
+    assert message["type"] == "error"
@@ -0,0 +1,67 @@
+"""
+Tests cho /search/similar: tìm file tương tự với một file đã có trong collection
+"""
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import router as router_module
+from app.database.qdrant_manager import QdrantManager
+from app.database.search_batcher import SearchBatcher
+
+
+@pytest.fixture
+def features(make_features) -> dict:
+    return {point_id: make_features(f"file{point_id}.wav", seed=point_id) for point_id in range(5)}
+
+
+@pytest.fixture
+def client(qdrant_client, features) -> TestClient:
+    manager = QdrantManager("similar")
+    manager.upsert_points(features, dedup=False)
+    app = FastAPI()
+    app.include_router(router_module.router, prefix="/api")
+    app.dependency_overrides[router_module.get_search_batcher] = lambda: SearchBatcher(manager, enabled=False)
+    return TestClient(app)
+
+
+def expected_order(features: dict, point_id: int) -> list:
+    query = features[point_id]["vectors"]["v1"]
+    others = [other for other in features if other != point_id]
+    others.sort(key=lambda other: -float(np.dot(query, features[other]["vectors"]["v1"])))
+    return [features[other]["file_name"] for other in others]
+
+
+def test_similar_by_point_id_and_file_name(client, features):
+    by_id = client.get("/api/search/similar", params={"point_id": 1, "limit": 10, "rerank": False})
+    by_name = client.get("/api/search/similar", params={"file_name": "file1.wav", "limit": 10, "rerank": False})
+
+    assert by_id.status_code == 200 and by_name.status_code == 200
+    assert by_id.json()["request_type"] == "point"
+    assert by_id.json()["query_string"] == "file1.wav"
+    # File truy vấn không có trong kết quả, thứ tự theo độ tương đồng với vector đã lưu của nó
+    names = [result["file_name"] for result in by_id.json()["results"]]
+    assert names == expected_order(features, 1)
+    assert [result["file_name"] for result in by_name.json()["results"]] == names
+
+
+def test_similar_pages_from_cache(client, features):
+    first = client.get("/api/search/similar", params={"point_id": 0, "limit": 2, "rerank": False}).json()
+    assert first["next_offset"] == 2
+    second = client.get(f"/api/search/result/{first['query_id']}", params={"offset": 2, "limit": 2}).json()
+
+    names = [result["file_name"] for page in (first, second) for result in page["results"]]
+    assert names == expected_order(features, 0)
+
+
+@pytest.mark.parametrize("params, status_code", [
+    ({"point_id": 42}, 404),
+    ({"file_name": "missing.wav"}, 404),
+    ({}, 400),
+    ({"point_id": 1, "file_name": "file1.wav"}, 400),
+])
+def test_similar_rejects_unknown_or_ambiguous_query(client, params, status_code):
+    response = client.get("/api/search/similar", params={**params, "rerank": False})
+    assert response.status_code == status_code
+    assert response.json()["detail"]
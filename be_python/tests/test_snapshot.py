@@ -0,0 +1,66 @@
+"""
+Tests cho xuất/nạp snapshot nhị phân của vectors và payload
+"""
+import json
+
+import numpy as np
+import pytest
+
+from app.database.qdrant_manager import QdrantManager
+from app.indexing import snapshot as snapshot_module
+from app.indexing.snapshot import export_snapshot, import_snapshot, MANIFEST_FILE
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch, qdrant_client, make_features):
+    monkeypatch.setattr(snapshot_module, "INDEX_MANIFEST_PATH", tmp_path / "index_manifest.json")
+    monkeypatch.setattr(snapshot_module, "QDRANT_LOCATION", ":memory:")
+    manager = QdrantManager("source")
+    points = {point_id: make_features(f"{point_id}.wav", seed=point_id, category="Flute")
+              for point_id in range(3)}
+    # Point chưa được backfill phiên bản v2
+    points[7] = make_features("7.wav", seed=7, versions=("v1",), duration=2.5)
+    manager.upsert_points(points, dedup=False)
+    return manager
+
+
+def read_points(client, collection_name: str) -> dict:
+    points, _ = client.scroll(collection_name, limit=100, with_payload=True, with_vectors=True)
+    return {point.id: point for point in points}
+
+
+def test_export_import_round_trip(tmp_path, source, qdrant_client):
+    manifest = export_snapshot(str(tmp_path / "snapshot"), source)
+    assert manifest["count"] == 4
+    assert set(manifest["vectors"]) == {"v1", "v2"}
+
+    collection_name = import_snapshot(str(tmp_path / "snapshot"), alias_name="restored")
+
+    assert QdrantManager("restored").get_alias_target("restored") == collection_name
+    original = read_points(qdrant_client, "source")
+    restored = read_points(qdrant_client, collection_name)
+    assert sorted(restored) == [0, 1, 2, 7]
+    for point_id, point in original.items():
+        # Dạng cột dùng null cho trường point không có, nên trường có giá trị None không được nạp lại
+        assert restored[point_id].payload == {key: value for key, value in point.payload.items() if value is not None}
+        assert set(restored[point_id].vector) == set(point.vector)
+        for version, vector in point.vector.items():
+            np.testing.assert_allclose(restored[point_id].vector[version], vector, rtol=1e-6)
+    assert set(restored[7].vector) == {"v1"}
+
+
+def test_import_rejects_extractor_mismatch(tmp_path, source, qdrant_client):
+    snapshot_dir = tmp_path / "snapshot"
+    export_snapshot(str(snapshot_dir), source)
+    manifest_path = snapshot_dir / MANIFEST_FILE
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    manifest["extractor"]["v2"]["hash"] = "0" * 40
+    manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        import_snapshot(str(snapshot_dir), alias_name="restored")
+    assert not qdrant_client.collection_exists("restored")
+
+    # --force bỏ qua kiểm tra
+    collection_name = import_snapshot(str(snapshot_dir), alias_name="restored", force=True)
+    assert len(read_points(qdrant_client, collection_name)) == 4
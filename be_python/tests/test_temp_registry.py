@@ -0,0 +1,125 @@
+"""
+Tests cho vòng đời file tạm của TempFileRegistry
+"""
+import asyncio
+import os
+import time
+
+from app.utils import temp_registry as temp_registry_module
+from app.utils.temp_registry import TempFileRegistry
+
+
+def make_file(tmp_path, name: str, mtime: float = None) -> str:
+    path = tmp_path / name
+    path.write_bytes(b"data")
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_pop_expired_only_returns_due_files(tmp_path):
+    registry = TempFileRegistry(ttl_seconds=10)
+    due = make_file(tmp_path, "due")
+    later = make_file(tmp_path, "later")
+    registry.register(due, query_id="q1", expires_at=100.0)
+    registry.register(later, expires_at=200.0)
+
+    assert registry.pop_expired(150.0) == [(due, 100.0, "q1", True)]
+    assert registry.next_expiry() == 200.0
+
+
+def test_pop_expired_skips_superseded_schedule(tmp_path):
+    registry = TempFileRegistry(ttl_seconds=10)
+    path = make_file(tmp_path, "file")
+    registry.register(path, expires_at=100.0)
+    # Đăng ký lại (ví dụ query mới dùng lại file): lịch cũ trong heap bị bỏ qua
+    registry.register(path, expires_at=300.0)
+
+    assert registry.pop_expired(150.0) == []
+    assert [item[0] for item in registry.pop_expired(300.0)] == [path]
+
+
+def test_pop_expired_reschedules_leased_file(tmp_path):
+    registry = TempFileRegistry(ttl_seconds=10, lease_timeout=5)
+    path = make_file(tmp_path, "file")
+    registry.register(path, expires_at=0.0)
+    assert registry.lease(path)
+
+    now = time.time()
+    assert registry.pop_expired(now) == []
+    # Gia hạn đến khi lease hết hạn (sớm hơn một TTL)
+    assert now < registry.next_expiry() <= now + 5
+
+    registry.release(path)
+    assert [item[0] for item in registry.pop_expired(now + 6)] == [path]
+
+
+def test_purge_expired_keeps_files_of_alive_queries(tmp_path):
+    registry = TempFileRegistry(ttl_seconds=10)
+    alive = make_file(tmp_path, "alive")
+    dead = make_file(tmp_path, "dead")
+    no_query = make_file(tmp_path, "no_query")
+    registry.register(alive, query_id="alive", expires_at=0.0)
+    registry.register(dead, query_id="dead", expires_at=0.0)
+    registry.register(no_query, expires_at=0.0)
+    registry.is_query_alive = lambda query_id: query_id == "alive"
+
+    assert asyncio.run(registry.purge_expired()) == 2
+    assert sorted(os.listdir(tmp_path)) == ["alive"]
+    assert len(registry) == 1
+    assert registry.next_expiry() > time.time()
+
+
+def test_resolve_expired_ignores_files_registered_again(tmp_path):
+    registry = TempFileRegistry(ttl_seconds=10)
+    path = make_file(tmp_path, "file")
+    registry.register(path, query_id="q1", expires_at=0.0)
+    due = registry.pop_expired(1.0)
+    # File được đăng ký lại trong lúc check_expired chạy trong thread pool
+    registry.register(path, query_id="q2")
+
+    assert registry.resolve_expired(due, {}, 1.0) == []
+    assert len(registry) == 1
+
+
+def test_foreign_files_follow_mtime(tmp_path, monkeypatch):
+    monkeypatch.setattr(temp_registry_module, "TEMP_DIR", tmp_path)
+    registry = TempFileRegistry(ttl_seconds=10)
+    now = time.time()
+    stale = make_file(tmp_path, "stale", mtime=now - 100)
+    fresh = make_file(tmp_path, "fresh", mtime=now - 15)
+    registry.scan_existing()
+
+    # File của tiến trình khác chỉ bị xóa khi mtime cũ hơn 2·TTL
+    assert asyncio.run(registry.purge_expired()) == 1
+    assert not os.path.exists(stale)
+    assert registry.next_expiry() == os.stat(fresh).st_mtime + 20
+
+    # purge_all không xóa file không do tiến trình này tạo
+    own = make_file(tmp_path, "own")
+    registry.register(own)
+    assert asyncio.run(registry.purge_all()) == 1
+    assert sorted(os.listdir(tmp_path)) == ["fresh"]
+
+
+def test_owner_touches_renewed_files(tmp_path):
+    registry = TempFileRegistry(ttl_seconds=10)
+    old = time.time() - 100
+    path = make_file(tmp_path, "file", mtime=old)
+    registry.register(path, query_id="q1", expires_at=0.0)
+    registry.is_query_alive = lambda query_id: True
+
+    assert asyncio.run(registry.purge_expired()) == 0
+    assert os.stat(path).st_mtime > old
+
+
+def test_purge_all_keeps_alive_queries_when_asked(tmp_path):
+    registry = TempFileRegistry(ttl_seconds=10)
+    alive = make_file(tmp_path, "alive")
+    dead = make_file(tmp_path, "dead")
+    registry.register(alive, query_id="alive")
+    registry.register(dead, query_id="dead")
+    registry.is_query_alive = lambda query_id: query_id == "alive"
+
+    assert asyncio.run(registry.purge_all(keep_alive_queries=True)) == 1
+    assert sorted(os.listdir(tmp_path)) == ["alive"]
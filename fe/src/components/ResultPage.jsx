@@ -112,7 +112,7 @@ const ResultPage = () => {
                         <audio
                           controls
                           className="w-full"
-                          src={`http://localhost:8000/api/stream/${result.file_name}?type=result`}
+                          src={`http://localhost:8000/api/stream/${result.file_name}?type=result&quality=preview`}
                         >
                           Your browser does not support the audio element.
                         </audio>